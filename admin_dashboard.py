@@ -8,6 +8,9 @@ import pandas as pd
 import os
 from PIL import Image
 from datetime import datetime
+from utils.metrics import metrics, METRICS_HOST, METRICS_PORT
+from utils.profiling import list_profiles, profiling_enabled, PROFILE_DIR
+from utils.static_server import result_source
 
 def render_admin_dashboard():
     """Render complete admin dashboard with user management"""
@@ -149,9 +152,11 @@ def render_admin_dashboard():
                     
                     with cols[idx % 4]:
                         try:
-                            if os.path.exists(image_path):
-                                img = Image.open(image_path)
-                                st.image(img, use_column_width=True)
+                            if os.path.exists(image_path) and image_path.lower().endswith(".mp4"):
+                                st.video(result_source(image_path))
+                                st.caption(f"{effect_name} - ₹{amount}")
+                            elif os.path.exists(image_path):
+                                st.image(result_source(image_path), use_container_width=True)
                                 st.caption(f"{effect_name} - ₹{amount}")
                             else:
                                 st.info(f"Image not found: {effect_name}")
@@ -237,6 +242,71 @@ def render_admin_dashboard():
     
     st.markdown("---")
     
+    # Performance Metrics (collected in this server process since startup)
+    st.markdown("### ⏱️ Performance Metrics")
+    st.caption(f"Prometheus endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    
+    stage_rows = metrics.summary()
+    if stage_rows:
+        df_stages = pd.DataFrame(stage_rows)
+        df_stages = df_stages[['stage', 'effect', 'resolution', 'count', 'mean_ms', 'p50_ms', 'p95_ms']]
+        df_stages.columns = ['Stage', 'Effect', 'Resolution', 'Count', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)']
+        st.dataframe(df_stages, use_container_width=True, hide_index=True)
+    else:
+        st.info("No processing timings recorded yet")
+    
+    counters = metrics.counters()
+    gauges = metrics.gauges()
+    cache_hits = sum(counters.get('toonify_cache_hits_total', {}).values())
+    cache_misses = sum(counters.get('toonify_cache_misses_total', {}).values())
+    payments = sum(counters.get('toonify_payments_total', {}).values())
+    queue_depth = sum(gauges.get('toonify_inference_queue_depth', {}).values())
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        hit_rate = cache_hits / (cache_hits + cache_misses) * 100 if (cache_hits + cache_misses) else 0
+        st.metric("Cache Hit Rate", f"{hit_rate:.0f}%")
+    with col2:
+        st.metric("Inference Queue", f"{queue_depth:.0f}")
+    with col3:
+        st.metric("Active Renders", f"{sum(gauges.get('toonify_processing_active', {}).values()):.0f}")
+    with col4:
+        st.metric("Payments (since start)", f"{payments:.0f}")
+    
+    st.markdown("---")
+    
+    # Slowest captured request profiles
+    st.markdown("### 🔬 Slowest Captured Profiles")
+    
+    profiles = list_profiles(limit=20)
+    if profiles:
+        df_profiles = pd.DataFrame([{
+            'Profile': p['id'],
+            'Kind': p['kind'],
+            'Duration (ms)': round(p['duration_s'] * 1000, 1),
+            'Details': ", ".join(f"{k}={v}" for k, v in p['metadata'].items()),
+            'Captured': p['created_at'][:19],
+        } for p in profiles])
+        st.dataframe(df_profiles, use_container_width=True, hide_index=True)
+        
+        selected_profile = st.selectbox("Inspect profile", [p['id'] for p in profiles])
+        record = next(p for p in profiles if p['id'] == selected_profile)
+        st.code(record.get('top_functions', ''), language="text")
+        if os.path.exists(record.get('profile_file', '')):
+            with open(record['profile_file'], 'rb') as f:
+                st.download_button(
+                    label="📥 Download Profile",
+                    data=f.read(),
+                    file_name=os.path.basename(record['profile_file']),
+                    key=f"download_profile_{record['id']}"
+                )
+    elif profiling_enabled():
+        st.info(f"No profiles captured yet in {PROFILE_DIR}/")
+    else:
+        st.info("Profiling is off. Set TOONIFY_PROFILE=1 or TOONIFY_PROFILE_SAMPLE_RATE=0.01 to capture profiles.")
+    
+    st.markdown("---")
+    
     # Footer
    # st.markdown("""
     #<div style="text-align: center; padding: 2rem; background: rgba(255,255,255,0.1); border-radius: 10px; margin-top: 2rem;">
@@ -0,0 +1,219 @@
+"""
+Toonify HTTP API - Headless access to the image effects
+Submit an image as a job, poll its status and fetch the result, without a
+Streamlit session. Uses the same ImageProcessor, models and inference server
+as the UI.
+
+Run with:  python api.py
+"""
+import ipaddress
+import json
+import math
+import os
+import sys
+import uuid
+from functools import wraps
+
+from flask import Flask, jsonify, request, send_file, url_for
+from werkzeug.exceptions import HTTPException
+
+from utils.image_processor import ImageProcessor
+from utils.color_lut import available_looks
+from utils.jobs import JobQueue, QueueFullError, DONE, JOB_TIMEOUT
+from utils.metrics import metrics
+from utils.upload_guard import decode_upload, UploadRejectedError
+from utils.encoding import ENCODE_PROFILES, MIME_TYPES, format_for_path, parse_profile, write_image
+from payment_system.payment_handler import PaymentHandler
+
+# Loopback by default; other hosts require TOONIFY_API_KEYS
+API_HOST = os.environ.get("TOONIFY_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("TOONIFY_API_PORT", 8600))
+API_MAX_UPLOAD_MB = float(os.environ.get("TOONIFY_API_MAX_UPLOAD_MB", 25))
+API_RESULT_DIR = os.environ.get("TOONIFY_API_RESULT_DIR", os.path.join("data", "api_results"))
+# HTTP threads (waitress); processing concurrency is bounded by the job queue
+API_THREADS = int(os.environ.get("TOONIFY_API_THREADS", 8))
+# Comma-separated keys accepted in the X-API-Key header; empty disables auth
+API_KEYS = {key.strip() for key in os.environ.get("TOONIFY_API_KEYS", "").split(",") if key.strip()}
+
+# Uploads are read in chunks so oversized bodies are rejected early
+_UPLOAD_CHUNK = 64 * 1024
+
+
+def _error(message, status):
+    return jsonify({'error': message}), status
+
+
+def _read_upload(max_bytes):
+    """Image bytes from a multipart "image" field or a raw request body"""
+    upload = request.files.get("image")
+    stream = upload.stream if upload is not None else request.stream
+    data = bytearray()
+    while True:
+        chunk = stream.read(_UPLOAD_CHUNK)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > max_bytes:
+            return None
+    return bytes(data)
+
+
+def _option(name, default=None):
+    """Job option from the form fields or the query string"""
+    return request.form.get(name, request.args.get(name, default))
+
+
+def create_app(processor=None, queue=None):
+    """Build the Flask app (one ImageProcessor and job queue per process)"""
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = int(API_MAX_UPLOAD_MB * 1024 * 1024)
+    processor = processor or ImageProcessor()
+    queue = queue or JobQueue()
+    style_prices = PaymentHandler().style_prices
+    os.makedirs(API_RESULT_DIR, exist_ok=True)
+
+    def require_key(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if API_KEYS and request.headers.get("X-API-Key") not in API_KEYS:
+                return _error("Missing or invalid API key", 401)
+            return view(*args, **kwargs)
+        return wrapper
+
+    def job_response(job, status=200):
+        data = job.to_dict()
+        data['status_url'] = url_for("job_status", job_id=job.id, _external=True)
+        if job.status == DONE:
+            data['result_url'] = url_for("job_result", job_id=job.id, _external=True)
+        return jsonify(data), status
+
+    @app.errorhandler(HTTPException)
+    def http_error(e):
+        return _error(e.description, e.code)
+
+    @app.get("/healthz")
+    def healthz():
+        return jsonify({'status': "ok", 'jobs': queue.stats()})
+
+    @app.get("/metrics")
+    def prometheus():
+        return metrics.render_prometheus(), 200, {'Content-Type': "text/plain; version=0.0.4"}
+
+    @app.get("/v1/effects")
+    @require_key
+    def list_effects():
+        effects = [{
+            'name': effect,
+            'price': style_prices.get(effect, 99.00),
+            'parameters': processor.get_effect_parameters(effect),
+        } for effect in processor.get_available_effects()]
+        return jsonify({'effects': effects, 'looks': available_looks()})
+
+    @app.post("/v1/jobs")
+    @require_key
+    def submit_job():
+        effect = _option("effect")
+        if not processor.is_available(effect):
+            return _error(f"Unknown or unavailable effect: {effect}", 400)
+        try:
+            params = processor.validate_effect_params(effect, json.loads(_option("params") or "{}"))
+            strength = float(_option("strength", 1.0))
+            preserve_detail = str(_option("preserve_detail", "false")).lower() in ("1", "true", "yes")
+            # Client deadline in seconds, capped by the server's job timeout
+            timeout = float(_option("timeout", JOB_TIMEOUT))
+        except ValueError as e:
+            return _error(f"Invalid option: {e}", 400)
+        if not math.isfinite(strength) or not 0.0 <= strength <= 1.0:
+            return _error("strength must be between 0 and 1", 400)
+        if not math.isfinite(timeout) or timeout <= 0:
+            return _error("timeout must be a positive number of seconds", 400)
+        timeout = min(timeout, JOB_TIMEOUT)
+        look = _option("look") or None
+        roi = _option("roi") or None
+        if roi not in (None, "faces"):
+            return _error("roi must be 'faces'", 400)
+        # Output profile, e.g. "webp:80" or "jpeg:90:progressive"
+        output_format = _option("format") or ENCODE_PROFILES['api']
+        try:
+            parse_profile(output_format)
+        except ValueError as e:
+            return _error(str(e), 400)
+
+        data = _read_upload(app.config['MAX_CONTENT_LENGTH'])
+        if data is None:
+            return _error(f"Upload larger than {API_MAX_UPLOAD_MB:g} MB", 413)
+        try:
+            image, _ = decode_upload(data, max_bytes=app.config['MAX_CONTENT_LENGTH'])
+        except UploadRejectedError as e:
+            return _error(str(e), 413 if e.reason in ("bytes", "pixels") else 400)
+        del data
+
+        def run():
+            result = processor.process_image(image, effect, params, strength, preserve_detail, look, roi)
+            if result is image:
+                raise RuntimeError(f"{effect} could not be applied")
+            return os.path.abspath(write_image(result, os.path.join(API_RESULT_DIR, uuid.uuid4().hex), output_format))
+
+        try:
+            job = queue.submit(run, timeout, effect=effect, width=image.shape[1], height=image.shape[0])
+        except QueueFullError:
+            return _error("Too many pending jobs, retry later", 503)
+        return job_response(job, 202)
+
+    @app.get("/v1/jobs/<job_id>")
+    @require_key
+    def job_status(job_id):
+        job = queue.get(job_id)
+        if job is None:
+            return _error("Unknown or expired job", 404)
+        return job_response(job)
+
+    @app.delete("/v1/jobs/<job_id>")
+    @require_key
+    def cancel_job(job_id):
+        job = queue.cancel(job_id)
+        if job is None:
+            return _error("Unknown or expired job", 404)
+        return job_response(job, 202)
+
+    @app.get("/v1/jobs/<job_id>/result")
+    @require_key
+    def job_result(job_id):
+        job = queue.get(job_id)
+        if job is None:
+            return _error("Unknown or expired job", 404)
+        if job.status != DONE:
+            return _error(f"Job is {job.status}", 409)
+        return send_file(job.result_path, mimetype=MIME_TYPES[format_for_path(job.result_path)], conditional=True)
+
+    return app
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    if not API_KEYS and not _is_loopback(API_HOST):
+        # Without keys anyone who can reach the port gets every paid effect
+        print(f"❌ Refusing to listen on {API_HOST} without TOONIFY_API_KEYS; set keys or use a loopback host")
+        sys.exit(1)
+    app = create_app()
+    print(f"🌐 Toonify API listening on http://{API_HOST}:{API_PORT}")
+    try:
+        # Production server with HTTP/1.1 keep-alive between submit and poll calls
+        from waitress import serve
+    except ImportError:
+        print("⚠️ waitress not installed; using Flask's development server (no keep-alive)")
+        app.run(host=API_HOST, port=API_PORT, threaded=True)
+        return
+    serve(app, host=API_HOST, port=API_PORT, threads=API_THREADS)
+
+
+if __name__ == "__main__":
+    main()
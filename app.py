@@ -7,8 +7,16 @@ from utils.auth import init_session_state, is_logged_in, logout_user
 from utils.database import Database
 from utils.validators import *
 from utils.image_processor import ImageProcessor
-from payment_system.payment_gateway import render_payment_gateway
+from payment_system.payment_gateway import render_payment_gateway, render_download_button
 from admin_dashboard import render_admin_dashboard
+from utils.metrics import observe_stage, start_metrics_server
+from utils.color_lut import available_looks
+from utils.static_server import start_static_server, result_source, static_serving, signed_url, resolve_path
+from utils.encoding import write_image
+from utils.upload_guard import decode_upload, UploadRejectedError
+from utils.artifact_store import get_artifact_store
+from utils.cancellation import CancelToken, DeadlineExceededError, RenderCancelledError, record_cancelled, run_with_heartbeat
+from utils.video import stylize_video, VIDEO_EXTENSIONS, VIDEO_MAX_FRAMES, VIDEO_KEYFRAME_INTERVAL
 
 import os
 from PIL import Image
@@ -16,6 +24,8 @@ import cv2
 import numpy as np
 from datetime import datetime
 import base64
+import uuid
+from collections import deque
 
 # =============================================================================
 # PAGE CONFIGURATION
@@ -70,8 +80,9 @@ st.markdown(
 # =============================================================================
 # HELPER FUNCTION FOR IMAGE ENCODING
 # =============================================================================
+@st.cache_data(show_spinner=False)
 def image_to_base64(img_path):
-    """Convert image to base64 for HTML display"""
+    """Convert image to base64 for HTML display (read once per process)"""
     try:
         with open(img_path, "rb") as f:
             return base64.b64encode(f.read()).decode()
@@ -83,7 +94,7 @@ def image_to_base64(img_path):
 # =============================================================================
 def set_page_background(page_name):
     """Set unique background for each page with brightness and contrast control"""
-    
+
     # Define background images for each page
     backgrounds = {
         "landing": None,  # Landing uses basic colors (no image)
@@ -94,7 +105,7 @@ def set_page_background(page_name):
         "admin_dashboard": "assets/backgrounds/admin_dashboard_bg.jpg",
         "payment": "assets/backgrounds/payment_bg.png",
     }
-    
+
     # ADJUST THESE VALUES TO CONTROL BRIGHTNESS AND CONTRAST
     page_settings = {
         "login": {
@@ -134,7 +145,7 @@ def set_page_background(page_name):
             "overlay": 0.3
         }
     }
-    
+
     # Get background for current page
     bg_image_path = backgrounds.get(page_name)
     settings = page_settings.get(page_name, {
@@ -143,7 +154,7 @@ def set_page_background(page_name):
         "blur": 0,
         "overlay": 0
     })
-    
+
     if page_name == "landing" or bg_image_path is None:
         # Landing page uses basic gradient colors
         st.markdown("""
@@ -154,9 +165,14 @@ def set_page_background(page_name):
             </style>
         """, unsafe_allow_html=True)
     else:
-        # Other pages use their specific background image with effects
-        bg_base64 = image_to_base64(bg_image_path)
-        if bg_base64:
+        # Other pages use their specific background image with effects. A URL
+        # keeps the image out of every rerun's payload; inline base64 otherwise
+        if static_serving() and resolve_path(bg_image_path):
+            bg_url = signed_url(bg_image_path)
+        else:
+            bg_base64 = image_to_base64(bg_image_path)
+            bg_url = f"data:image/jpeg;base64,{bg_base64}" if bg_base64 else None
+        if bg_url:
             st.markdown(f"""
                 <style>
                 /* Background image layer */
@@ -167,7 +183,7 @@ def set_page_background(page_name):
                     left: 0;
                     width: 100%;
                     height: 100%;
-                    background-image: url("data:image/jpeg;base64,{bg_base64}");
+                    background-image: url("{bg_url}");
                     background-size: cover;
                     background-position: center;
                     background-repeat: no-repeat;
@@ -228,7 +244,7 @@ st.markdown("""
         padding-bottom: 2rem;
         text-shadow: 1px 1px 2px rgba(0,0,0,0.2);
     }
-    
+
     .stForm {
         background: rgba(255, 255, 255, 0.95) !important;
         padding: 2rem;
@@ -236,7 +252,7 @@ st.markdown("""
         box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
         backdrop-filter: blur(10px);
     }
-    
+
     .stTextInput>div>div>input, 
     .stNumberInput>div>div>input, 
     .stSelectbox>div>div>select {
@@ -246,7 +262,7 @@ st.markdown("""
         background-color: white !important;
         color: #000000 !important;
     }
-    
+
     .stTextInput>div>div>input:focus, 
     .stNumberInput>div>div>input:focus, 
     .stSelectbox>div>div>select:focus {
@@ -255,28 +271,28 @@ st.markdown("""
         color: #000000 !important;
         box-shadow: 0 0 0 0.2rem rgba(102, 126, 234, 0.25);
     }
-    
+
     .stSelectbox>div>div>select option {
         background-color: white !important;
         color: #000000 !important;
     }
-    
+
     .stTextInput>label, 
     .stNumberInput>label, 
     .stSelectbox>label {
         color: #333333 !important;
         font-weight: 500;
     }
-    
+
     .stForm label {
         color: #333333 !important;
     }
-    
+
     input[type="password"] {
         background-color: white !important;
         color: #000000 !important;
     }
-    
+
     .info-box {
         padding: 2rem;
         border-radius: 20px;
@@ -285,18 +301,18 @@ st.markdown("""
         box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
         backdrop-filter: blur(10px);
     }
-    
+
     .info-box h3 {
         color: #333333 !important;
         margin: 0.8rem 0;
         padding: 0.5rem;
         border-bottom: 2px solid #E0E0E0;
     }
-    
+
     .info-box h3 strong {
         color: #667eea !important;
     }
-    
+
     .stButton>button {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
         color: white;
@@ -312,7 +328,7 @@ st.markdown("""
         box-shadow: 0 6px 20px rgba(0, 0, 0, 0.3);
         background: linear-gradient(135deg, #764ba2 0%, #667eea 100%);
     }
-    
+
     [data-testid="stSidebar"] {
         background: linear-gradient(180deg, #667eea 0%, #764ba2 100%);
     }
@@ -327,14 +343,14 @@ st.markdown("""
     [data-testid="stSidebar"] .stButton>button:hover {
         background: rgba(255, 255, 255, 0.3);
     }
-    
+
     .stDownloadButton>button {
         background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);
         color: white;
         border-radius: 25px;
         font-weight: bold;
     }
-    
+
     .hero-sub {
         font-size: 22px;
         text-align: center;
@@ -383,20 +399,20 @@ st.markdown("""
         color: #ffd700;
         font-size: 19px;
     }
-    
+
     .stMarkdown p {
         color: inherit;
     }
-    
+
     .streamlit-expanderHeader {
         background-color: rgba(255, 255, 255, 0.1);
         color: #333333;
     }
-    
+
     .stAlert {
         background-color: rgba(255, 255, 255, 0.95);
     }
-    
+
     @keyframes fadeIn {
         from { opacity: 0; transform: translateY(20px); }
         to { opacity: 1; transform: translateY(0); }
@@ -405,7 +421,7 @@ st.markdown("""
         from { opacity: 0; transform: translateY(20px); }
         to { opacity: 1; transform: translateY(0); }
     }
-    
+
     /* Card number formatting */
     .card-number-input {
         letter-spacing: 3px;
@@ -414,11 +430,496 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# =============================================================================
+# 🎨 DASHBOARD FRAGMENTS (rerun on their own instead of the whole script)
+# =============================================================================
+# Gallery images rendered per page
+GALLERY_PAGE_SIZE = int(os.environ.get("TOONIFY_GALLERY_PAGE_SIZE", 9))
+# Seconds one render in the editor may take before it is stopped
+RENDER_TIMEOUT = float(os.environ.get("TOONIFY_RENDER_TIMEOUT", 120))
+# Same for a whole video clip
+VIDEO_RENDER_TIMEOUT = float(os.environ.get("TOONIFY_VIDEO_RENDER_TIMEOUT", 1800))
+
+
+def render_cancellable(render, label, timeout=RENDER_TIMEOUT, on_update=None):
+    """
+    Run render() in the background while showing its elapsed time.
+
+    Clicking another style or leaving the page interrupts this script at the
+    next elapsed-time update, which cancels the render (ONNX Runtime included).
+    on_update() runs with every update, on the script thread, so it can draw
+    the render's partial results.
+    """
+    status = st.empty()
+    start = time.perf_counter()
+    token = CancelToken(timeout)
+
+    def heartbeat():
+        status.caption(f"⏱️ {label}: {time.perf_counter() - start:.0f}s")
+        if on_update is not None:
+            on_update()
+
+    try:
+        result = run_with_heartbeat(render, token, heartbeat)
+    except DeadlineExceededError:
+        record_cancelled("ui", token)
+        raise RenderCancelledError(f"{label} took longer than {timeout:g}s and was stopped")
+    status.empty()
+    return result
+
+
+@st.fragment
+def render_gallery(user):
+    """Paid images, one page at a time; paging reruns only this region"""
+    # Get user's image history
+    user_images = db.get_user_image_history(user['email'])
+
+    if user_images:
+        st.markdown(f"### 🎨 Total Images: {len(user_images)}")
+        
+        # Pager above the grid, so a click is handled before any image is drawn
+        pages = max(1, -(-len(user_images) // GALLERY_PAGE_SIZE))
+        page = min(st.session_state.get('gallery_page', 0), pages - 1)
+        if pages > 1:
+            col_prev, col_info, col_next = st.columns([1, 2, 1])
+            with col_prev:
+                if st.button("← Previous", use_container_width=True, disabled=page == 0, key="gallery_prev"):
+                    st.session_state.gallery_page = page - 1
+                    st.rerun(scope="fragment")
+            with col_info:
+                st.markdown(f"<p style='text-align: center;'>Page {page + 1} of {pages}</p>", unsafe_allow_html=True)
+            with col_next:
+                if st.button("Next →", use_container_width=True, disabled=page >= pages - 1, key="gallery_next"):
+                    st.session_state.gallery_page = page + 1
+                    st.rerun(scope="fragment")
+        page_images = user_images[page * GALLERY_PAGE_SIZE:(page + 1) * GALLERY_PAGE_SIZE]
+        
+        # Display images in grid
+        cols_per_row = 3
+        for idx in range(0, len(page_images), cols_per_row):
+            cols = st.columns(cols_per_row)
+            
+            for col_idx, img_data in enumerate(page_images[idx:idx+cols_per_row]):
+                effect_name, image_path, amount, transaction_id, created_at = img_data
+                
+                with cols[col_idx]:
+                    try:
+                        if os.path.exists(image_path):
+                            if image_path.lower().endswith(".mp4"):
+                                st.video(result_source(image_path))
+                            else:
+                                st.image(result_source(image_path), use_container_width=True)
+                            
+                            st.markdown(f"""
+                            <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); margin-bottom: 1rem;">
+                                <p style="color: #667eea; font-weight: bold; font-size: 1.1rem; margin: 0; text-align: center;">
+                                    {effect_name}
+                                </p>
+                                <p style="color: #28a745; font-size: 1.2rem; font-weight: bold; margin: 0.3rem 0; text-align: center;">
+                                    💰 ₹{amount}
+                                </p>
+                                <p style="color: #666; font-size: 0.85rem; margin: 0; text-align: center;">
+                                    📅 {created_at}
+                                </p>
+                            </div>
+                            """, unsafe_allow_html=True)
+                            
+                            # Download link for each image (served statically when possible)
+                            extension = os.path.splitext(image_path)[1] or ".png"
+                            render_download_button(
+                                image_path, "📥 Download",
+                                f"{effect_name}_{transaction_id[-8:]}{extension}",
+                                key=f"download_{transaction_id}"
+                            )
+                        else:
+                            st.warning(f"Image not found: {effect_name}")
+                    except Exception as e:
+                        st.error(f"Error loading image: {e}")
+        
+        # Total spent summary
+        total_spent = sum([img[2] for img in user_images])
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); 
+                    padding: 2rem; border-radius: 15px; text-align: center; margin-top: 2rem;">
+            <p style="color: white; font-size: 2rem; font-weight: bold; margin: 0;">
+                💰 Total Spent: ₹{total_spent}
+            </p>
+            <p style="color: white; font-size: 1.1rem; margin-top: 0.5rem;">
+                {len(user_images)} Images Processed
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.info("📷 You haven't edited any images yet. Start creating your first cartoon masterpiece!")
+        
+        if st.button("🎨 Start Editing", use_container_width=True):
+            st.session_state.show_gallery = False
+            st.rerun()
+
+
+@st.fragment
+def render_editor():
+    """Upload, style selection, previews and result; clicking a style reruns only this region"""
+    # Main Dashboard - Image Editor
+    st.markdown('<h1 class="main-header">🎨 Image Editor</h1>', unsafe_allow_html=True)
+    st.markdown('<h2 class="sub-header">Upload and transform your images</h2>', unsafe_allow_html=True)
+
+    # Image upload and effect selection in two columns
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("### 📤 Upload Image")
+        uploaded_file = st.file_uploader("Choose an image...", type=['jpg', 'jpeg', 'png'])
+        
+        if uploaded_file is not None:
+            # Create temp directory if not exists
+            temp_dir = "temp"
+            os.makedirs(temp_dir, exist_ok=True)
+            
+            # Inspect the header and decode within the pixel budget once per upload, not on every rerun
+            if st.session_state.get('upload_file_id') != uploaded_file.file_id:
+                st.session_state.upload_file_id = uploaded_file.file_id
+                st.session_state.upload_error = None
+                st.session_state.upload_notice = None
+                st.session_state.uploaded_image_path = None
+                try:
+                    image, info = decode_upload(uploaded_file.getvalue())
+                except UploadRejectedError as e:
+                    st.session_state.upload_error = str(e)
+                else:
+                    # Save uploaded file (never under the client's name: names collide between users)
+                    extension = os.path.splitext(uploaded_file.name)[1].lower()
+                    uploaded_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}{extension}")
+                    if image.shape[:2] == (info.height, info.width):
+                        with open(uploaded_path, "wb") as f:
+                            f.write(uploaded_file.getbuffer())
+                    else:
+                        # Keep the downscaled decode so every later read stays within the budget
+                        uploaded_path = write_image(image, uploaded_path, "png:1")
+                        st.session_state.upload_notice = (
+                            f"📐 Large photo ({info.width}x{info.height}): editing at "
+                            f"{image.shape[1]}x{image.shape[0]}.")
+                    del image
+                    
+                    # Store in session
+                    st.session_state.uploaded_image_path = uploaded_path
+            
+            if st.session_state.upload_error:
+                st.error(f"❌ {st.session_state.upload_error}")
+            elif st.session_state.uploaded_image_path:
+                if st.session_state.upload_notice:
+                    st.info(st.session_state.upload_notice)
+                # Display uploaded image
+                st.image(result_source(st.session_state.uploaded_image_path), caption="Uploaded Image",
+                         use_container_width=True)
+
+    with col2:
+        st.markdown("### 🎨 Select Style")
+        
+        # Initialize ImageProcessor
+        processor = ImageProcessor()
+        # Server-side home of result arrays; session state only holds handles
+        artifacts = get_artifact_store()
+        available_effects = processor.get_available_effects()
+        
+        # Display style cards with prices
+        selected_effect = None
+        cols = st.columns(2)
+        from payment_system.payment_handler import PaymentHandler
+        style_prices = PaymentHandler().style_prices
+        
+        for idx, effect in enumerate(available_effects):
+            with cols[idx % 2]:
+                # Get price for this effect
+                price = style_prices.get(effect, 99.00)
+                
+                if st.button(f"""
+                **{effect}**  
+                💰 ₹{price}
+                """, use_container_width=True, key=f"effect_{effect}"):
+                    selected_effect = effect
+                    st.session_state.selected_effect = effect
+        
+        if st.session_state.get('uploaded_image_path'):
+            if st.button("👀 Preview All Styles", use_container_width=True, key="preview_all_styles"):
+                st.session_state.preview_source = st.session_state.uploaded_image_path
+                st.session_state.style_previews = {}
+        
+        if selected_effect:
+            st.success(f"✅ Selected: {selected_effect}")
+            
+            if st.session_state.get('uploaded_image_path'):
+                # Process image
+                with st.spinner(f"🔄 Applying {selected_effect} style..."):
+                    try:
+                        # Read image
+                        decode_start = time.perf_counter()
+                        img = cv2.imread(st.session_state.uploaded_image_path)
+                        observe_stage("decode", time.perf_counter() - decode_start, selected_effect, img)
+                        
+                        # Process with selected effect (cancelled if the user moves on)
+                        result = render_cancellable(lambda: processor.process_image(img, selected_effect),
+                                                    selected_effect)
+                        if result is img:
+                            # process_image hands back its input when the effect failed
+                            raise RuntimeError(f"{selected_effect} could not be applied to this image")
+                        
+                        # Save processed image
+                        timestamp = int(time.time())
+                        # Preview profile: fast lossy encode; the paid download is re-encoded losslessly
+                        output_path = write_image(result, f"temp/processed_{timestamp}", "preview")
+                        
+                        # Store in session
+                        st.session_state.processed_handle = artifacts.put(
+                            st.session_state.session_id, result, "processed")
+                        st.session_state.processed_path = output_path
+                        st.session_state.effect_applied = selected_effect
+                        
+                        # Fresh render uses default settings; reset any old slider positions
+                        st.session_state.effect_settings_applied = None
+                        for name in processor.default_effect_params(selected_effect):
+                            st.session_state.pop(f"param_{selected_effect}_{name}", None)
+                        st.session_state.pop(f"strength_{selected_effect}", None)
+                        st.session_state.pop(f"detail_{selected_effect}", None)
+                        st.session_state.pop(f"look_{selected_effect}", None)
+                        st.session_state.pop(f"faces_{selected_effect}", None)
+                        
+                        st.success("✅ Style applied successfully!")
+                        
+                    except Exception as e:
+                        st.error(f"❌ Error processing image: {e}")
+
+    # Thumbnail previews of every style for the current upload
+    if (st.session_state.get('preview_source')
+            and st.session_state.preview_source == st.session_state.get('uploaded_image_path')):
+        st.markdown("---")
+        st.markdown("### 👀 Style Previews")
+        st.caption("Pick a style above to render it at full resolution.")
+        
+        previews = st.session_state.get('style_previews') or {}
+        grid_cols = st.columns(4)
+        tiles = {effect: grid_cols[idx % 4].empty() for idx, effect in enumerate(available_effects)}
+        
+        def show_preview(effect, preview):
+            if preview is None:
+                tiles[effect].warning(f"{effect}: preview unavailable")
+            else:
+                tiles[effect].image(preview, channels="BGR", caption=effect, use_container_width=True)
+        
+        # Thumbnails live in the artifact store; session state keeps their handles
+        pending = []
+        for effect in available_effects:
+            handle = previews.get(effect, "")
+            preview = artifacts.get(handle) if handle else None
+            if effect not in previews or (handle and preview is None):
+                pending.append(effect)
+            else:
+                show_preview(effect, preview)
+        
+        if pending:
+            img = cv2.imread(st.session_state.preview_source)
+            if img is not None:
+                # Rendered in the background (cancelled if the user moves on);
+                # tiles appear on the next update after each style finishes
+                finished = deque()
+
+                def render_previews():
+                    for item in processor.preview_all(img, pending):
+                        finished.append(item)
+
+                def show_finished():
+                    while finished:
+                        effect, preview = finished.popleft()
+                        previews[effect] = artifacts.put(st.session_state.session_id, preview, f"preview:{effect}") \
+                            if preview is not None else None
+                        show_preview(effect, preview)
+
+                try:
+                    render_cancellable(render_previews, "Style previews", on_update=show_finished)
+                    show_finished()
+                except RenderCancelledError as e:
+                    st.warning(f"⚠️ {e}")
+                finally:
+                    # Finished tiles are kept, so an interrupted pass resumes where it stopped
+                    st.session_state.style_previews = previews
+            else:
+                st.session_state.style_previews = previews
+
+    # Display processed image if available
+    if st.session_state.get('processed_handle'):
+        render_result(processor, artifacts)
+
+
+@st.fragment
+def render_result(processor, artifacts):
+    """Result view with live tuning; slider changes rerun only this region"""
+    st.markdown("---")
+    st.markdown("### 🖼️ Result")
+
+    # Live tuning; only stages depending on a changed value are recomputed,
+    # and strength is blended from the cached stylized result
+    effect_applied = st.session_state.effect_applied
+    effect_params = processor.get_effect_parameters(effect_applied)
+    if st.session_state.get('uploaded_image_path'):
+        with st.expander("🎛️ Adjust Style", expanded=False):
+            strength = st.slider("Style strength", 0, 100, 100, 5, key=f"strength_{effect_applied}") / 100.0
+            preserve_detail = st.checkbox(
+                "Keep original lighting and detail", key=f"detail_{effect_applied}",
+                help="Keeps the style's colors but takes most of the brightness and fine detail from your photo"
+            )
+            look = st.selectbox("Color look", ["None"] + available_looks(), key=f"look_{effect_applied}")
+            look = None if look == "None" else look
+            faces_only = st.checkbox("Stylize faces only", key=f"faces_{effect_applied}")
+            param_values = {}
+            for name, spec in effect_params.items():
+                param_values[name] = st.slider(
+                    spec['label'], spec['min'], spec['max'], spec['default'], spec['step'],
+                    key=f"param_{effect_applied}_{name}"
+                )
+        
+        settings = {'params': param_values, 'strength': strength, 'preserve_detail': preserve_detail, 'look': look,
+                    'faces_only': faces_only}
+        applied = st.session_state.get('effect_settings_applied') or {
+            'params': processor.default_effect_params(effect_applied), 'strength': 1.0,
+            'preserve_detail': False, 'look': None, 'faces_only': False
+        }
+        if settings != applied:
+            with st.spinner(f"🔄 Updating {effect_applied}..."):
+                img = cv2.imread(st.session_state.uploaded_image_path)
+                result = None
+                try:
+                    result = render_cancellable(
+                        lambda: processor.process_image(img, effect_applied, param_values, strength, preserve_detail,
+                                                        look, roi="faces" if faces_only else None),
+                        effect_applied)
+                    if result is img:
+                        # process_image hands back its input when the effect failed
+                        st.error(f"❌ {effect_applied} could not be applied with these settings")
+                        result = None
+                except RenderCancelledError as e:
+                    st.warning(f"⚠️ {e}")
+                if result is not None:
+                    st.session_state.processed_path = write_image(result, st.session_state.processed_path, "preview")
+                    st.session_state.processed_handle = artifacts.put(
+                        st.session_state.session_id, result, "processed")
+                    st.session_state.effect_settings_applied = settings
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if st.session_state.get('uploaded_image_path'):
+            st.image(result_source(st.session_state.uploaded_image_path), caption="Original", use_container_width=True)
+
+    with col2:
+        st.image(result_source(st.session_state.processed_path), caption=f"{st.session_state.effect_applied} Style", use_container_width=True)
+
+    # Payment button
+    st.markdown("---")
+    col1, col2, col3 = st.columns([1, 2, 1])
+
+    with col2:
+        # Get price for the applied effect
+        from payment_system.payment_handler import PaymentHandler
+        payment_handler = PaymentHandler()
+        price = payment_handler.style_prices.get(st.session_state.effect_applied, 99.00)
+        
+        st.markdown(f"""
+        <div style="background: #e8f5e8; padding: 1.5rem; border-radius: 15px; text-align: center; margin-bottom: 1.5rem; border: 2px solid #28a745;">
+            <p style="color: #000000; font-size: 1.5rem; font-weight: bold; margin: 0;">
+                Amount: ₹{price}
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        if st.button("💳 Proceed to Payment", use_container_width=True, type="primary"):
+            result = artifacts.get(st.session_state.processed_handle)
+            if result is None:
+                st.error("❌ This result has expired. Please apply the style again.")
+            else:
+                st.session_state.payment_image_path = write_image(
+                    result, f"{os.path.splitext(st.session_state.processed_path)[0]}_full", "download")
+                st.session_state.show_payment = True
+                st.rerun()
+
+
+@st.fragment
+def render_video_panel():
+    """Video clip upload and rendering"""
+    processor = ImageProcessor()
+    available_effects = processor.get_available_effects()
+    st.markdown("---")
+    with st.expander("🎬 Cartoonize a Video Clip", expanded=False):
+        st.caption(f"MP4, MOV or animated GIF, up to {VIDEO_MAX_FRAMES} frames. Audio is not kept.")
+        video_file = st.file_uploader("Choose a video...", type=VIDEO_EXTENSIONS, key="video_upload")
+        video_effect = st.selectbox("Style", available_effects, key="video_effect")
+        keyframe_interval = st.slider(
+            "Keyframe interval", 1, 12, VIDEO_KEYFRAME_INTERVAL, key="video_keyframes",
+            help="Stylize every Nth frame and carry it to the frames in between with optical flow. "
+                 "Higher is faster and steadier for AI styles; 1 renders every frame."
+        )
+        
+        if video_file is not None and st.button("🎬 Render Video", use_container_width=True, key="render_video"):
+            extension = os.path.splitext(video_file.name)[1].lower()
+            if extension.lstrip(".") not in VIDEO_EXTENSIONS:
+                st.error(f"❌ Unsupported video type: {extension or 'none'}")
+                return
+            # Never use the client's file name: temp/ is served, and names collide between users
+            os.makedirs("temp", exist_ok=True)
+            video_path = os.path.join("temp", f"{uuid.uuid4().hex}{extension}")
+            with open(video_path, "wb") as f:
+                f.write(video_file.getbuffer())
+            
+            output_path = os.path.join("temp", f"processed_{uuid.uuid4().hex}.mp4")
+            progress_bar = st.progress(0.0, text=f"🔄 Applying {video_effect} style...")
+            # Written by the render thread, drawn by this one
+            frames = {'done': 0, 'total': 0}
+            
+            def record_progress(done, total):
+                frames['done'], frames['total'] = done, total
+            
+            def update_progress():
+                if frames['total']:
+                    progress_bar.progress(min(1.0, frames['done'] / frames['total']),
+                                          text=f"🔄 {frames['done']}/{frames['total']} frames")
+            
+            try:
+                summary = render_cancellable(
+                    lambda: stylize_video(processor, video_path, output_path, video_effect, progress=record_progress,
+                                          keyframe_interval=keyframe_interval),
+                    f"{video_effect} video", timeout=VIDEO_RENDER_TIMEOUT, on_update=update_progress)
+                failed = f", {summary['failed_frames']} left unstyled" if summary['failed_frames'] else ""
+                progress_bar.progress(1.0, text=f"✅ {summary['frames']} frames{failed} in {summary['seconds']}s")
+                st.session_state.processed_video_path = output_path
+                st.session_state.video_effect_applied = video_effect
+            except RenderCancelledError as e:
+                st.warning(f"⚠️ {e}")
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            except Exception as e:
+                st.error(f"❌ Error processing video: {e}")
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            finally:
+                if os.path.exists(video_path):
+                    os.remove(video_path)
+        
+        if st.session_state.get('processed_video_path'):
+            st.video(result_source(st.session_state.processed_video_path))
+            if st.button("💳 Proceed to Payment", use_container_width=True, key="pay_video"):
+                st.session_state.payment_image_path = st.session_state.processed_video_path
+                st.session_state.selected_effect = st.session_state.video_effect_applied
+                st.session_state.show_payment = True
+                st.rerun()
+
+
 # =============================================================================
 # INITIALIZE SESSION STATE & DATABASE
 # =============================================================================
 init_session_state()
 db = Database()
+start_metrics_server()
+# Result images are fetched by the browser from here instead of through Streamlit
+start_static_server()
 
 # Initialize page routing
 if "page" not in st.session_state:
@@ -448,10 +949,10 @@ set_page_background(st.session_state.page)
 # 🏠 LANDING PAGE
 # =============================================================================
 if st.session_state.page == "landing":
-    
+
     st.markdown("<div class='main-header'>Toonify - AI Cartoon Generator</div>", unsafe_allow_html=True)
     st.markdown("<div class='sub-header'>Turn your photos into stunning cartoon-style artwork!</div>", unsafe_allow_html=True)
-    
+
     col_left, col_center, col_right = st.columns([4, 4, 1])
     with col_right:
         if st.button("Login →", key="landing_login"):
@@ -483,13 +984,13 @@ if st.session_state.page == "landing":
                 Your photos stay private and safe.
             </div>
         """, unsafe_allow_html=True)
-    
+
     st.divider()
 
     col1, col2 = st.columns([1, 1.5])
     with col1:
         try:
-            st.image(Image.open("assets/landing/prem.png"), use_column_width=True)
+            st.image(Image.open("assets/landing/prem.png"), use_container_width=True)
         except:
             st.info("📷 Image: assets/landing/prem.png")
     with col2:
@@ -502,7 +1003,7 @@ if st.session_state.page == "landing":
                 </h2>
             </div>
         """, unsafe_allow_html=True)
-    
+
     st.divider()
 
     col3, col4 = st.columns([1.5, 1])
@@ -518,16 +1019,16 @@ if st.session_state.page == "landing":
         """, unsafe_allow_html=True)
     with col4:
         try:
-            st.image(Image.open("assets/landing/portrait.png"), use_column_width=True)
+            st.image(Image.open("assets/landing/portrait.png"), use_container_width=True)
         except:
             st.info("📷 Image: assets/landing/portrait.png")
-    
+
     st.divider()
 
     col5, col6 = st.columns([1, 1.5])
     with col5:
         try:
-            st.image(Image.open("assets/landing/cartoon.png"), use_column_width=True)
+            st.image(Image.open("assets/landing/cartoon.png"), use_container_width=True)
         except:
             st.info("📷 Image: assets/landing/cartoon.png")
     with col6:
@@ -540,7 +1041,7 @@ if st.session_state.page == "landing":
                 </h2>
             </div>
         """, unsafe_allow_html=True)
-    
+
     st.divider()
 
     col7, col8 = st.columns([1.5, 1])
@@ -556,14 +1057,14 @@ if st.session_state.page == "landing":
         """, unsafe_allow_html=True)
     with col8:
         try:
-            st.image(Image.open("assets/landing/difstyle.png"), use_column_width=True)
+            st.image(Image.open("assets/landing/difstyle.png"), use_container_width=True)
         except:
             st.info("📷 Image: assets/landing/difstyle.png")
-    
+
     st.divider()
 
     st.markdown("# ⭐ Why Choose Our AI Cartoon Generator?")
-    
+
     img_base64 = image_to_base64("assets/picc.jpg")
     if img_base64:
         st.markdown(f"""
@@ -574,9 +1075,9 @@ if st.session_state.page == "landing":
         """, unsafe_allow_html=True)
     else:
         st.info("📷 Feature Image: assets/picc.jpg")
-    
+
     st.divider()
-    
+
     col_left, col_center, col_right = st.columns([3, 2, 3])
     with col_center:
         if st.button("🚀 Get Started Now", use_container_width=True, key="get_started_btn"):
@@ -591,23 +1092,23 @@ if st.session_state.page == "landing":
             © 2025 Toonify - All Rights Reserved
         </div>
     """, unsafe_allow_html=True)
-    
+
     st.stop()
 
 # =============================================================================
 # 🔐 LOGIN PAGE
 # =============================================================================
 elif st.session_state.page == 'login' and not is_logged_in():
-    
+
     st.markdown('<h1 class="main-header">🎨 Toonify</h1>', unsafe_allow_html=True)
     st.markdown('<h2 class="sub-header">Transform Your Images into Cartoons</h2>', unsafe_allow_html=True)
-    
+
     if st.button("← Back to Home", key="back_to_landing"):
         st.session_state.page = "landing"
         st.rerun()
-    
+
     col1, col2, col3 = st.columns([1, 2, 1])
-    
+
     with col2:
         st.markdown("## 🔐 Login to Your Account")
         
@@ -640,7 +1141,7 @@ elif st.session_state.page == 'login' and not is_logged_in():
             if register:
                 st.session_state.page = 'register'
                 st.rerun()
-    
+
     st.markdown("---")
     col1, col2, col3 = st.columns([1, 2, 1])
 
@@ -648,7 +1149,7 @@ elif st.session_state.page == 'login' and not is_logged_in():
         if st.button("👨‍💼 Admin Login", use_container_width=True, type="secondary"):
             st.session_state.page = "admin_login"
             st.rerun()
-    
+
     st.stop()
 
 # =============================================================================
@@ -714,12 +1215,12 @@ elif st.session_state.page == 'admin_dashboard' and is_logged_in():
 # 📝 REGISTRATION PAGE
 # =============================================================================
 elif st.session_state.page == 'register':
-    
+
     st.markdown('<h1 class="main-header">🎨 Toonify</h1>', unsafe_allow_html=True)
     st.markdown('<h2 class="sub-header">Create Your Account</h2>', unsafe_allow_html=True)
-    
+
     col1, col2, col3 = st.columns([1, 2, 1])
-    
+
     with col2:
         st.markdown("### 📝 Registration Form")
         
@@ -800,7 +1301,7 @@ elif st.session_state.page == 'register':
             if back:
                 st.session_state.page = 'login'
                 st.rerun()
-    
+
     st.stop()
 
 # =============================================================================
@@ -817,7 +1318,7 @@ elif st.session_state.get('show_payment', False) and is_logged_in():
         st.stop()
 
     effect_name = st.session_state.selected_effect
-    
+
     # Render payment gateway
     payment_success = render_payment_gateway(
         image_path,
@@ -838,9 +1339,9 @@ elif st.session_state.get('show_payment', False) and is_logged_in():
 # 🎨 DASHBOARD PAGE (with Gallery in Profile)
 # =============================================================================
 elif is_logged_in():
-    
+
     user = st.session_state.user_data
-    
+
     # Sidebar User Menu
     with st.sidebar:
         st.markdown("## 👤 User Profile")
@@ -864,7 +1365,7 @@ elif is_logged_in():
             logout_user()
             st.session_state.page = "login"
             st.rerun()
-    
+
     # Show Profile Modal
     if st.session_state.get('show_profile', False):
         col1, col2, col3 = st.columns([1, 4, 1])
@@ -886,7 +1387,7 @@ elif is_logged_in():
                 st.session_state.show_profile = False
                 st.rerun()
         st.stop()
-    
+
     # NEW: Show Gallery Modal
     if st.session_state.get('show_gallery', False):
         st.markdown('<h1 class="main-header">🖼️ My Gallery</h1>', unsafe_allow_html=True)
@@ -898,204 +1399,15 @@ elif is_logged_in():
         
         st.markdown("---")
         
-        # Get user's image history
-        user_images = db.get_user_image_history(user['email'])
-        
-        if user_images:
-            st.markdown(f"### 🎨 Total Images: {len(user_images)}")
-            
-            # Display images in grid
-            cols_per_row = 3
-            for idx in range(0, len(user_images), cols_per_row):
-                cols = st.columns(cols_per_row)
-                
-                for col_idx, img_data in enumerate(user_images[idx:idx+cols_per_row]):
-                    effect_name, image_path, amount, transaction_id, created_at = img_data
-                    
-                    with cols[col_idx]:
-                        try:
-                            if os.path.exists(image_path):
-                                img = Image.open(image_path)
-                                st.image(img, use_column_width=True)
-                                
-                                st.markdown(f"""
-                                <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); margin-bottom: 1rem;">
-                                    <p style="color: #667eea; font-weight: bold; font-size: 1.1rem; margin: 0; text-align: center;">
-                                        {effect_name}
-                                    </p>
-                                    <p style="color: #28a745; font-size: 1.2rem; font-weight: bold; margin: 0.3rem 0; text-align: center;">
-                                        💰 ₹{amount}
-                                    </p>
-                                    <p style="color: #666; font-size: 0.85rem; margin: 0; text-align: center;">
-                                        📅 {created_at}
-                                    </p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                                
-                                # Download button for each image
-                                with open(image_path, 'rb') as file:
-                                    file_data = file.read()
-                                    st.download_button(
-                                        label="📥 Download",
-                                        data=file_data,
-                                        file_name=f"{effect_name}_{transaction_id[-8:]}.png",
-                                        mime="image/png",
-                                        key=f"download_{transaction_id}",
-                                        use_container_width=True
-                                    )
-                            else:
-                                st.warning(f"Image not found: {effect_name}")
-                        except Exception as e:
-                            st.error(f"Error loading image: {e}")
-            
-            # Total spent summary
-            total_spent = sum([img[2] for img in user_images])
-            st.markdown(f"""
-            <div style="background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); 
-                        padding: 2rem; border-radius: 15px; text-align: center; margin-top: 2rem;">
-                <p style="color: white; font-size: 2rem; font-weight: bold; margin: 0;">
-                    💰 Total Spent: ₹{total_spent}
-                </p>
-                <p style="color: white; font-size: 1.1rem; margin-top: 0.5rem;">
-                    {len(user_images)} Images Processed
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.info("📷 You haven't edited any images yet. Start creating your first cartoon masterpiece!")
-            
-            if st.button("🎨 Start Editing", use_container_width=True):
-                st.session_state.show_gallery = False
-                st.rerun()
+        render_gallery(user)
         
         st.stop()
-    
-    # Main Dashboard - Image Editor
-    st.markdown('<h1 class="main-header">🎨 Image Editor</h1>', unsafe_allow_html=True)
-    st.markdown('<h2 class="sub-header">Upload and transform your images</h2>', unsafe_allow_html=True)
-    
-    # Image upload and effect selection in two columns
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("### 📤 Upload Image")
-        uploaded_file = st.file_uploader("Choose an image...", type=['jpg', 'jpeg', 'png'])
-        
-        if uploaded_file is not None:
-            # Save uploaded image
-            import tempfile
-            import os
-            
-            # Create temp directory if not exists
-            temp_dir = "temp"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Save uploaded file
-            uploaded_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(uploaded_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            # Display uploaded image
-            st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
-            
-            # Store in session
-            st.session_state.uploaded_image_path = uploaded_path
-    
-    with col2:
-        st.markdown("### 🎨 Select Style")
-        
-        # Initialize ImageProcessor
-        processor = ImageProcessor()
-        available_effects = processor.get_available_effects()
-        
-        # Display style cards with prices
-        selected_effect = None
-        cols = st.columns(2)
-        
-        for idx, effect in enumerate(available_effects):
-            with cols[idx % 2]:
-                # Get price for this effect
-                from payment_system.payment_handler import PaymentHandler
-                payment_handler = PaymentHandler()
-                price = payment_handler.style_prices.get(effect, 99.00)
-                
-                if st.button(f"""
-                **{effect}**  
-                💰 ₹{price}
-                """, use_container_width=True, key=f"effect_{effect}"):
-                    selected_effect = effect
-                    st.session_state.selected_effect = effect
-        
-        if selected_effect:
-            st.success(f"✅ Selected: {selected_effect}")
-            
-            if st.session_state.get('uploaded_image_path'):
-                # Process image
-                with st.spinner(f"🔄 Applying {selected_effect} style..."):
-                    try:
-                        # Load and process image
-                        import cv2
-                        from PIL import Image
-                        
-                        # Read image
-                        img = cv2.imread(st.session_state.uploaded_image_path)
-                        
-                        # Process with selected effect
-                        result = processor.process_image(img, selected_effect)
-                        
-                        # Save processed image
-                        import time
-                        timestamp = int(time.time())
-                        output_path = f"temp/processed_{timestamp}.png"
-                        cv2.imwrite(output_path, result)
-                        
-                        # Store in session
-                        st.session_state.processed_image = result
-                        st.session_state.processed_path = output_path
-                        st.session_state.effect_applied = selected_effect
-                        
-                        st.success("✅ Style applied successfully!")
-                        
-                    except Exception as e:
-                        st.error(f"❌ Error processing image: {e}")
-    
-    # Display processed image if available
-    if st.session_state.get('processed_image') is not None:
-        st.markdown("---")
-        st.markdown("### 🖼️ Result")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.session_state.get('uploaded_image_path'):
-                st.image(st.session_state.uploaded_image_path, caption="Original", use_column_width=True)
-        
-        with col2:
-            st.image(st.session_state.processed_path, caption=f"{st.session_state.effect_applied} Style", use_column_width=True)
-        
-        # Payment button
-        st.markdown("---")
-        col1, col2, col3 = st.columns([1, 2, 1])
-        
-        with col2:
-            # Get price for the applied effect
-            from payment_system.payment_handler import PaymentHandler
-            payment_handler = PaymentHandler()
-            price = payment_handler.style_prices.get(st.session_state.effect_applied, 99.00)
-            
-            st.markdown(f"""
-            <div style="background: #e8f5e8; padding: 1.5rem; border-radius: 15px; text-align: center; margin-bottom: 1.5rem; border: 2px solid #28a745;">
-                <p style="color: #000000; font-size: 1.5rem; font-weight: bold; margin: 0;">
-                    Amount: ₹{price}
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            if st.button("💳 Proceed to Payment", use_container_width=True, type="primary"):
-                st.session_state.payment_image_path = st.session_state.processed_path
-                st.session_state.show_payment = True
-                st.rerun()
-    
+
+    render_editor()
+
+    # Video mode: clips are streamed frame by frame through the same effects
+    render_video_panel()
+
     # Change Password Modal
     if st.session_state.get('show_change_password', False):
         col1, col2, col3 = st.columns([1, 3, 1])
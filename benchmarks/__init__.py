@@ -0,0 +1,4 @@
+"""
+Benchmarks Package - Offline performance, memory and quality harnesses
+Run from the project root, e.g. `python -m benchmarks.run_benchmarks`
+"""
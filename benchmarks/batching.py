@@ -0,0 +1,83 @@
+"""
+Batching Check - Achieved inference batch size under concurrent requests
+Sends simultaneous process_image calls for one ONNX style through the normal
+runtime policy (processing slots included) and reports how they were grouped
+by the inference server, so the default configuration can be shown to batch.
+
+Usage:
+    python -m benchmarks.batching
+    python -m benchmarks.batching --style Paprika --requests 16 --resolution hd
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fixtures import RESOLUTIONS, prepare_processor, test_image
+from utils.inference_server import get_inference_server
+
+
+def run_concurrent(processor, style, image, requests):
+    """Start all requests at once; returns (seconds, failures)"""
+    barrier = threading.Barrier(requests)
+    failures = []
+
+    def worker(seed):
+        source = image.copy()
+        source[0, 0, 0] = seed % 256  # distinct inputs, so no stage is shared
+        barrier.wait()
+        if processor.process_image(source, style) is source:
+            failures.append(seed)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(requests)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent ONNX requests are batched")
+    parser.add_argument("--style", default="Shinkai", choices=["Shinkai", "Paprika", "Ghibli Style"])
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--resolution", default="vga", choices=list(RESOLUTIONS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="toonify_batching_") as dummy_dir:
+        processor, dummy_styles = prepare_processor(dummy_dir)
+        if not processor.is_available(args.style):
+            print(f"❌ {args.style} is not available (no model and no onnx package for a dummy)")
+            return 1
+        image = test_image(args.resolution)
+        # Warm-up: session creation is not part of the measurement
+        processor.process_image(image, args.style)
+        server = get_inference_server()
+        before = server.get_stats()
+        seconds, failures = run_concurrent(processor, args.style, image, args.requests)
+        after = server.get_stats()
+
+    histogram = {size: after['batch_size_histogram'].get(size, 0) - before['batch_size_histogram'].get(size, 0)
+                 for size in after['batch_size_histogram']}
+    histogram = {size: count for size, count in histogram.items() if count}
+    batches = sum(histogram.values())
+    served = sum(size * count for size, count in histogram.items())
+    model = "dummy model" if args.style in dummy_styles else "real model"
+    print(f"{args.requests} concurrent {args.style} requests ({model}, {args.resolution}) in {seconds:.2f}s")
+    print(f"Slots: {processor.runtime_config.concurrent_slots}, runners: {after['max_concurrent']}, "
+          f"max batch: {after['max_batch_size']}, wait: {after['max_wait_ms']:g} ms")
+    print(f"Batches: {batches}, average size {served / batches if batches else 0:.2f}, histogram {histogram}")
+    if failures:
+        print(f"❌ {len(failures)} requests failed")
+        return 1
+    if max(histogram, default=1) > 1:
+        print("✅ Concurrent requests were batched")
+        return 0
+    print("⚠️ No request was batched")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
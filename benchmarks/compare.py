@@ -0,0 +1,71 @@
+"""
+Benchmark Comparison
+Compares two benchmark JSON files and fails when any result regressed by
+more than the threshold.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    """Map benchmark name -> result dict"""
+    with open(path, 'r') as f:
+        report = json.load(f)
+    return {r['name']: r for r in report.get('results', [])}, report.get('meta', {})
+
+
+def compare(baseline, candidate, threshold=0.10, metric='median_s'):
+    """
+    Compare two result maps.
+
+    Returns (rows, regressions) where each row is
+    (name, baseline_seconds, candidate_seconds, ratio).
+    """
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline) & set(candidate)):
+        old = baseline[name][metric]
+        new = candidate[name][metric]
+        ratio = new / old if old > 0 else float('inf')
+        rows.append((name, old, new, ratio))
+        if ratio > 1.0 + threshold:
+            regressions.append((name, old, new, ratio))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two Toonify benchmark runs")
+    parser.add_argument("baseline", help="Benchmark JSON from the reference commit")
+    parser.add_argument("candidate", help="Benchmark JSON from the commit under test")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Allowed slowdown as a fraction (0.10 = 10%%)")
+    parser.add_argument("--metric", choices=["median_s", "min_s"], default="median_s")
+    args = parser.parse_args()
+
+    baseline, base_meta = load_results(args.baseline)
+    candidate, cand_meta = load_results(args.candidate)
+    rows, regressions = compare(baseline, candidate, args.threshold, args.metric)
+
+    print(f"Baseline:  {base_meta.get('commit')}  ({args.baseline})")
+    print(f"Candidate: {cand_meta.get('commit')}  ({args.candidate})")
+    print(f"{'Benchmark':<50} {'Base ms':>10} {'New ms':>10} {'Change':>8}")
+    for name, old, new, ratio in rows:
+        flag = " ❌" if (name, old, new, ratio) in regressions else ""
+        print(f"{name:<50} {old * 1000:10.1f} {new * 1000:10.1f} {(ratio - 1) * 100:+7.1f}%{flag}")
+
+    missing = sorted(set(baseline) ^ set(candidate))
+    if missing:
+        print(f"⚠️ {len(missing)} benchmark(s) only present in one run: {', '.join(missing)}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"✅ No regressions above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
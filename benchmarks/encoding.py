@@ -0,0 +1,98 @@
+"""
+Encoding Benchmark - Time, size and fidelity of each output encoder profile
+Encodes the shipped photo and rendered effect outputs with every profile, so
+the preview and download profiles (utils/encoding.py) can be picked from
+measurements rather than guesses.
+
+Usage:
+    python -m benchmarks.encoding
+    python -m benchmarks.encoding --resolutions fhd 12mp --profiles png:1 jpeg:85 webp:80 --output encoding.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import RESOLUTIONS, prepare_processor, test_image
+from benchmarks.quality import psnr
+from utils.encoding import avif_supported, encode, parse_profile
+
+DEFAULT_PROFILES = [
+    "png:0", "png:1", "png:3", "png:6", "png:9",
+    "jpeg:85", "jpeg:85:progressive", "jpeg:95",
+    "webp:80", "webp:lossless", "avif:60",
+]
+DEFAULT_EFFECTS = ["Classic Cartoon", "Oil Painting", "Sketch"]
+
+
+def build_inputs(resolutions, effects):
+    """Photo plus rendered effect outputs at each resolution"""
+    photo = cv2.imread(os.path.join("assets", "picc.jpg"))
+    with tempfile.TemporaryDirectory() as dummy_dir:
+        processor, _ = prepare_processor(dummy_dir)
+        inputs = {}
+        for resolution in resolutions:
+            width, height = RESOLUTIONS[resolution]
+            source = cv2.resize(photo, (width, height), interpolation=cv2.INTER_CUBIC) if photo is not None \
+                else test_image(resolution)
+            inputs[f"photo/{resolution}"] = source
+            for effect in effects:
+                if processor.is_available(effect):
+                    inputs[f"{effect}/{resolution}"] = processor.process_image(source, effect)
+    return inputs
+
+
+def bench_profile(image, profile, repeat=3):
+    """Median encode time, encoded size and PSNR of one profile on one image"""
+    options = parse_profile(profile)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data, fmt = encode(image, options)
+        timings.append(time.perf_counter() - start)
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return {
+        'format': fmt,
+        'encode_ms': round(sorted(timings)[len(timings) // 2] * 1000, 1),
+        'kb': round(len(data) / 1024, 1),
+        'bits_per_pixel': round(len(data) * 8 / (image.shape[0] * image.shape[1]), 3),
+        'psnr': round(psnr(image, decoded), 2) if decoded is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark output encoders for Toonify results")
+    parser.add_argument("--resolutions", nargs="+", default=["fhd"], choices=list(RESOLUTIONS))
+    parser.add_argument("--profiles", nargs="+", default=DEFAULT_PROFILES)
+    parser.add_argument("--effects", nargs="+", default=DEFAULT_EFFECTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    profiles = [p for p in args.profiles if not p.startswith("avif") or avif_supported()]
+    if len(profiles) < len(args.profiles):
+        print("⚠️ AVIF encoder not available; skipping AVIF profiles")
+
+    rows = []
+    print(f"{'Image':<26} {'Profile':<22} {'Encode ms':>10} {'KB':>9} {'bpp':>7} {'PSNR':>7}")
+    for name, image in build_inputs(args.resolutions, args.effects).items():
+        for profile in profiles:
+            row = {'image': name, 'profile': profile, **bench_profile(image, profile, args.repeat)}
+            rows.append(row)
+            quality = "lossless" if row['psnr'] == float("inf") else f"{row['psnr']:.2f}"
+            print(f"{name:<26} {profile:<22} {row['encode_ms']:10.1f} {row['kb']:9.1f} "
+                  f"{row['bits_per_pixel']:7.3f} {quality:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'results': rows}, f, indent=2, default=str)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark Fixtures
+Synthetic test images and small dummy ONNX models so every harness can run
+offline on a plain CPU box without the real AnimeGAN weights
+"""
+import os
+
+import numpy as np
+
+import utils.Paprika as paprika_module
+import utils.Shinkai as shinkai_module
+import utils.ghibli as ghibli_module
+from utils.animegan_processor import AnimeGANManager
+from utils.autotune import synthetic_image
+from utils.effect_graph import StageCache
+from utils.image_processor import ImageProcessor
+
+try:
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    ONNX_BUILDER_AVAILABLE = True
+except ImportError:
+    ONNX_BUILDER_AVAILABLE = False
+
+# Named resolutions (width, height) from VGA up to 24 MP
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+}
+
+# Modules whose MODEL_PATH can be redirected to a dummy model
+STYLE_MODULES = {
+    "Shinkai": shinkai_module,
+    "Paprika": paprika_module,
+    "Ghibli Style": ghibli_module,
+}
+
+
+def test_image(resolution, seed=0):
+    """Deterministic synthetic BGR image for a named resolution"""
+    width, height = RESOLUTIONS[resolution]
+    return synthetic_image(width, height, seed=seed)
+
+
+def build_dummy_model(path, layout="nhwc", seed=0):
+    """
+    Write a small two-layer conv model with dynamic batch/height/width.
+
+    layout="nhwc" matches the style modules ([0, 1] NHWC input),
+    layout="nchw" matches AnimeGANManager's ONNXAnimeGAN ([-1, 1] NCHW input).
+    """
+    if not ONNX_BUILDER_AVAILABLE:
+        raise RuntimeError("The onnx package is required to build dummy models")
+
+    rng = np.random.default_rng(seed)
+    w1 = numpy_helper.from_array((rng.standard_normal((16, 3, 3, 3)) * 0.1).astype(np.float32), "w1")
+    b1 = numpy_helper.from_array(np.zeros(16, np.float32), "b1")
+    w2 = numpy_helper.from_array((rng.standard_normal((3, 16, 3, 3)) * 0.1).astype(np.float32), "w2")
+    b2 = numpy_helper.from_array(np.zeros(3, np.float32), "b2")
+
+    if layout == "nhwc":
+        shape = ["N", "H", "W", 3]
+        nodes = [helper.make_node("Transpose", ["input"], ["x"], perm=[0, 3, 1, 2])]
+        conv_in, conv_out, activation = "x", "z", "Sigmoid"
+        nodes_tail = [helper.make_node("Transpose", ["z"], ["output"], perm=[0, 2, 3, 1])]
+    else:
+        shape = ["N", 3, "H", "W"]
+        nodes = []
+        conv_in, conv_out, activation = "input", "output", "Tanh"
+        nodes_tail = []
+
+    nodes += [
+        helper.make_node("Conv", [conv_in, "w1", "b1"], ["c1"], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["c1"], ["r1"]),
+        helper.make_node("Conv", ["r1", "w2", "b2"], ["c2"], pads=[1, 1, 1, 1]),
+        helper.make_node(activation, ["c2"], [conv_out]),
+    ] + nodes_tail
+
+    graph = helper.make_graph(
+        nodes, "toonify_dummy",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, shape)],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, shape)],
+        [w1, b1, w2, b2],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    onnx.save(model, path)
+    return path
+
+
+def prepare_processor(dummy_dir):
+    """
+    ImageProcessor with every effect available.
+
+    Real models are used where present; missing ONNX styles are pointed at
+    dummy models written to dummy_dir. Returns (processor, dummy_styles).
+    """
+    processor = ImageProcessor()
+    dummy_styles = []
+
+    # Harnesses time and compare full pipelines, so stage outputs aren't cached
+    processor.graph = processor.build_effect_graph(StageCache(max_mb=0))
+
+    for style, module in STYLE_MODULES.items():
+        available = processor.ghibli_available if style == "Ghibli Style" else style in processor.available_onnx
+        if available or not ONNX_BUILDER_AVAILABLE:
+            continue
+        path = build_dummy_model(os.path.join(dummy_dir, f"{style.split()[0]}.onnx"))
+        module.MODEL_PATH = path
+        module.session = None
+        dummy_styles.append(style)
+        if style == "Ghibli Style":
+            processor.ghibli_available = True
+        else:
+            processor.onnx_styles[style] = path
+            processor.available_onnx.append(style)
+
+    # Hayao is a pure OpenCV style gated on its model file
+    if "Hayao" not in processor.available_onnx:
+        processor.available_onnx.insert(0, "Hayao")
+        dummy_styles.append("Hayao")
+
+    return processor, dummy_styles
+
+
+def prepare_manager(dummy_dir, models_dir="anime_models"):
+    """
+    AnimeGANManager over real models plus dummy ONNX stand-ins.
+
+    Returns (manager, dummy_styles). PyTorch .pt styles are only included
+    when the real weights exist.
+    """
+    os.makedirs(dummy_dir, exist_ok=True)
+    dummy_styles = []
+    for style, filename in AnimeGANManager(models_dir).model_files.items():
+        real_path = os.path.join(models_dir, filename)
+        target = os.path.join(dummy_dir, filename)
+        if os.path.exists(real_path):
+            if not os.path.exists(target):
+                os.symlink(os.path.abspath(real_path), target)
+        elif filename.endswith(".onnx") and ONNX_BUILDER_AVAILABLE:
+            build_dummy_model(target, layout="nchw")
+            dummy_styles.append(style)
+    return AnimeGANManager(dummy_dir), dummy_styles
@@ -0,0 +1,135 @@
+"""
+Memory Profiling Harness - Peak and retained memory per effect and resolution
+Each (effect, resolution) case runs in a fresh process so allocator caches
+from earlier cases don't hide the peak of later ones.
+
+Usage:
+    python -m benchmarks.memory --output memory.json
+    python -m benchmarks.memory --resolutions vga fhd 12mp --budget-mb 2048
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from benchmarks.fixtures import RESOLUTIONS
+
+
+def _profile_case(effect, resolution, dummy_dir):
+    """Run one effect on one synthetic image and return its memory report"""
+    from benchmarks.fixtures import prepare_processor, test_image
+    from utils.memory_profiler import MemoryProfiler
+
+    processor, dummy_styles = prepare_processor(dummy_dir)
+    image = test_image(resolution)
+
+    # Warm up once at a tiny size so model loading isn't counted as the effect's peak
+    processor.process_image(test_image("vga")[:64, :64].copy(), effect)
+
+    with MemoryProfiler(f"{effect}/{resolution}") as profiler:
+        result = processor.process_image(image, effect)
+        del result
+
+    report = dict(profiler.report)
+    width, height = RESOLUTIONS[resolution]
+    report.update({
+        'effect': effect,
+        'resolution': resolution,
+        'megapixels': round(width * height / 1_000_000, 2),
+        'input_mb': round(image.nbytes / (1024 * 1024), 2),
+        'dummy_model': effect in dummy_styles,
+    })
+    return report
+
+
+def _list_effects(dummy_dir):
+    from benchmarks.fixtures import prepare_processor
+    processor, _ = prepare_processor(dummy_dir)
+    return processor.get_available_effects()
+
+
+def suggest_caps(reports, budget_mb):
+    """
+    Suggest a per-effect megapixel cap that keeps the peak under budget_mb.
+
+    Fits peak memory as a linear function of megapixels per effect.
+    """
+    caps = {}
+    by_effect = {}
+    for r in reports:
+        peak = max(r['python_peak_mb'], r['rss_peak_delta_mb'])
+        by_effect.setdefault(r['effect'], []).append((r['megapixels'], peak))
+
+    for effect, points in by_effect.items():
+        points.sort()
+        if len(points) >= 2:
+            (x0, y0), (x1, y1) = points[0], points[-1]
+            slope = (y1 - y0) / (x1 - x0) if x1 != x0 else 0.0
+            intercept = y0 - slope * x0
+        else:
+            x0, y0 = points[0]
+            slope, intercept = (y0 / x0 if x0 else 0.0), 0.0
+        if slope < 0.01:
+            # Memory doesn't grow with resolution (e.g. fixed-size model input)
+            caps[effect] = None
+        else:
+            caps[effect] = round(max(0.0, (budget_mb - intercept) / slope), 1)
+    return caps
+
+
+def run_memory_profile(resolutions, effects=None):
+    """Profile every effect at every resolution, one spawned process per case"""
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    with tempfile.TemporaryDirectory(prefix="toonify_mem_") as dummy_dir:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            effects = effects or pool.submit(_list_effects, dummy_dir).result()
+
+        for resolution in resolutions:
+            for effect in effects:
+                # A fresh single-use process per case keeps peaks independent
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    try:
+                        report = pool.submit(_profile_case, effect, resolution, dummy_dir).result()
+                    except Exception as e:
+                        print(f"❌ {effect}/{resolution} failed: {e}")
+                        continue
+                reports.append(report)
+                print(f"  {effect:<16} {resolution:<5} peak py {report['python_peak_mb']:8.1f} MB  "
+                      f"peak rss +{report['rss_peak_delta_mb']:8.1f} MB  "
+                      f"retained {report['rss_retained_mb']:7.1f} MB")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile peak memory of every effect")
+    parser.add_argument("--output", default="memory_results.json")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--effects", nargs="+", help="Subset of effects (default: all available)")
+    parser.add_argument("--budget-mb", type=float, default=None,
+                        help="Suggest per-effect megapixel caps for this worker memory budget")
+    args = parser.parse_args()
+
+    print("🧠 Profiling memory per effect and resolution...")
+    reports = run_memory_profile(args.resolutions, args.effects)
+
+    output = {
+        'created_at': datetime.now().isoformat(),
+        'cpu_count': os.cpu_count(),
+        'results': reports,
+    }
+    if args.budget_mb:
+        output['budget_mb'] = args.budget_mb
+        output['suggested_megapixel_caps'] = suggest_caps(reports, args.budget_mb)
+        print(f"📏 Suggested caps for {args.budget_mb:.0f} MB: {output['suggested_megapixel_caps']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"✅ Memory profile written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
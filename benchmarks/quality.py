@@ -0,0 +1,260 @@
+"""
+Quality Regression Harness - Golden-image checks for every effect
+Records reference outputs for a fixed image set and compares later runs
+against them with PSNR, SSIM and CIE76 color difference (ΔE), so faster
+approximations can be accepted only when they stay within tolerance.
+
+Usage:
+    python -m benchmarks.quality record          # on the reference commit
+    python -m benchmarks.quality check           # after a change
+    python -m benchmarks.quality check --effects "Oil Painting" --output quality.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import prepare_processor
+from utils.autotune import synthetic_image
+
+GOLDEN_DIR = os.path.join("benchmarks", "golden")
+
+# Fixed input set: real photos shipped with the app plus synthetic scenes
+IMAGE_SET = {
+    "photo_wide": os.path.join("assets", "picc.jpg"),
+    "photo_portrait": os.path.join("assets", "landing", "portrait.png"),
+    "synthetic_a": 0,
+    "synthetic_b": 1,
+}
+SYNTHETIC_SIZE = (768, 512)
+MAX_SIDE = 768
+
+# Default acceptance thresholds for every effect
+DEFAULT_TOLERANCE = {
+    'psnr_min': 30.0,
+    'ssim_min': 0.95,
+    'delta_e_mean_max': 2.0,
+    'delta_e_p95_max': 6.0,
+}
+
+# Per-effect overrides; edge-heavy effects flip more pixels on small changes
+EFFECT_TOLERANCES = {
+    "Classic Cartoon": {'psnr_min': 24.0, 'ssim_min': 0.90},
+    "Sketch": {'psnr_min': 26.0, 'ssim_min': 0.90},
+    "Pencil Color": {'psnr_min': 26.0, 'ssim_min': 0.90},
+    # Oil Painting scales its smoothed image by 1.9, amplifying small differences
+    "Oil Painting": {'delta_e_p95_max': 8.0},
+}
+
+
+def load_image_set():
+    """Map image name -> BGR array for the fixed golden input set"""
+    images = {}
+    for name, source in IMAGE_SET.items():
+        if isinstance(source, int):
+            images[name] = synthetic_image(*SYNTHETIC_SIZE, seed=source)
+            continue
+        image = cv2.imread(source)
+        if image is None:
+            print(f"⚠️ Golden input missing: {source}")
+            continue
+        scale = MAX_SIDE / max(image.shape[:2])
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        images[name] = image
+    return images
+
+
+def psnr(reference, candidate):
+    """Peak signal-to-noise ratio in dB (inf for identical images)"""
+    mse = np.mean((reference.astype(np.float64) - candidate.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float('inf')
+    return float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def ssim(reference, candidate):
+    """Mean structural similarity over the luma channel (Gaussian window, sigma 1.5)"""
+    a = cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY).astype(np.float64)
+    b = cv2.cvtColor(candidate, cv2.COLOR_BGR2GRAY).astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a ** 2
+    var_b = blur(b * b) - mu_b ** 2
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def delta_e(reference, candidate):
+    """CIE76 color difference per pixel, returned as (mean, p95)"""
+    lab_a = cv2.cvtColor(reference.astype(np.float32) / 255.0, cv2.COLOR_BGR2Lab)
+    lab_b = cv2.cvtColor(candidate.astype(np.float32) / 255.0, cv2.COLOR_BGR2Lab)
+    distance = np.sqrt(np.sum((lab_a - lab_b) ** 2, axis=2))
+    return float(distance.mean()), float(np.percentile(distance, 95))
+
+
+def compare_images(reference, candidate):
+    """All quality metrics for one candidate output against its golden image"""
+    if reference.shape != candidate.shape:
+        return {'error': f"shape {candidate.shape} != golden {reference.shape}"}
+    de_mean, de_p95 = delta_e(reference, candidate)
+    return {
+        'psnr': round(psnr(reference, candidate), 2),
+        'ssim': round(ssim(reference, candidate), 4),
+        'delta_e_mean': round(de_mean, 3),
+        'delta_e_p95': round(de_p95, 3),
+    }
+
+
+def tolerance_for(effect):
+    tolerance = dict(DEFAULT_TOLERANCE)
+    tolerance.update(EFFECT_TOLERANCES.get(effect, {}))
+    return tolerance
+
+
+def check_tolerance(scores, tolerance):
+    """List of human-readable tolerance violations (empty when the output passes)"""
+    if 'error' in scores:
+        return [scores['error']]
+    failures = []
+    if scores['psnr'] < tolerance['psnr_min']:
+        failures.append(f"PSNR {scores['psnr']} < {tolerance['psnr_min']}")
+    if scores['ssim'] < tolerance['ssim_min']:
+        failures.append(f"SSIM {scores['ssim']} < {tolerance['ssim_min']}")
+    if scores['delta_e_mean'] > tolerance['delta_e_mean_max']:
+        failures.append(f"ΔE mean {scores['delta_e_mean']} > {tolerance['delta_e_mean_max']}")
+    if scores['delta_e_p95'] > tolerance['delta_e_p95_max']:
+        failures.append(f"ΔE p95 {scores['delta_e_p95']} > {tolerance['delta_e_p95_max']}")
+    return failures
+
+
+def _effect_dir(golden_dir, effect):
+    return os.path.join(golden_dir, effect.replace(" ", "_"))
+
+
+def _render(processor, image, effect):
+    source = image.copy()
+    result = processor.process_image(source, effect)
+    if result is source:
+        raise RuntimeError("effect returned its input unchanged")
+    return result
+
+
+def record_golden(golden_dir=GOLDEN_DIR, effects=None):
+    """Render every effect on the image set and store the outputs as golden images"""
+    images = load_image_set()
+    with tempfile.TemporaryDirectory(prefix="toonify_quality_") as dummy_dir:
+        processor, dummy_styles = prepare_processor(dummy_dir)
+        subset = bool(effects)
+        effects = effects or processor.get_available_effects()
+        manifest_path = os.path.join(golden_dir, "manifest.json")
+        manifest = {'effects': {}}
+        if subset and os.path.exists(manifest_path):
+            # Re-recording a subset keeps the other effects' entries
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        manifest.update({
+            'created_at': datetime.now().isoformat(),
+            'opencv': cv2.__version__,
+            'images': list(images),
+        })
+        for effect in effects:
+            os.makedirs(_effect_dir(golden_dir, effect), exist_ok=True)
+            for name, image in images.items():
+                result = _render(processor, image, effect)
+                cv2.imwrite(os.path.join(_effect_dir(golden_dir, effect), f"{name}.png"), result)
+            manifest['effects'][effect] = {'dummy_model': effect in dummy_styles}
+            print(f"✅ Recorded {effect} ({len(images)} images)")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def check_golden(golden_dir=GOLDEN_DIR, effects=None):
+    """
+    Compare current outputs against the golden images.
+
+    Returns (rows, failures) where each row holds the effect, image,
+    scores and any tolerance violations.
+    """
+    with open(os.path.join(golden_dir, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+
+    images = load_image_set()
+    rows, failures = [], []
+    with tempfile.TemporaryDirectory(prefix="toonify_quality_") as dummy_dir:
+        processor, dummy_styles = prepare_processor(dummy_dir)
+        for effect in effects or list(manifest['effects']):
+            recorded = manifest['effects'].get(effect)
+            if recorded is None:
+                print(f"⚠️ No golden images for {effect}; run 'record' first")
+                continue
+            if recorded['dummy_model'] != (effect in dummy_styles):
+                print(f"⚠️ Skipping {effect}: golden and current run disagree on using the real model")
+                continue
+
+            tolerance = tolerance_for(effect)
+            for name, image in images.items():
+                golden = cv2.imread(os.path.join(_effect_dir(golden_dir, effect), f"{name}.png"))
+                if golden is None:
+                    print(f"⚠️ Missing golden image {effect}/{name}")
+                    continue
+                try:
+                    scores = compare_images(golden, _render(processor, image, effect))
+                except Exception as e:
+                    scores = {'error': str(e)}
+                violations = check_tolerance(scores, tolerance)
+                row = {'effect': effect, 'image': name, **scores, 'violations': violations}
+                rows.append(row)
+                if violations:
+                    failures.append(row)
+    return rows, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-image quality checks for Toonify effects")
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument("--golden-dir", default=GOLDEN_DIR)
+    parser.add_argument("--effects", nargs="+", help="Subset of effects (default: all)")
+    parser.add_argument("--output", help="Write the check report as JSON")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_golden(args.golden_dir, args.effects)
+        print(f"✅ Golden images written to {args.golden_dir}")
+        return
+
+    rows, failures = check_golden(args.golden_dir, args.effects)
+    print(f"{'Effect':<18} {'Image':<16} {'PSNR':>7} {'SSIM':>7} {'ΔE mean':>8} {'ΔE p95':>8}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['effect']:<18} {row['image']:<16} ❌ {row['error']}")
+            continue
+        flag = " ❌" if row['violations'] else ""
+        print(f"{row['effect']:<18} {row['image']:<16} {row['psnr']:7.2f} {row['ssim']:7.4f} "
+              f"{row['delta_e_mean']:8.3f} {row['delta_e_p95']:8.3f}{flag}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'results': rows}, f, indent=2)
+
+    if failures:
+        for row in failures:
+            print(f"❌ {row['effect']}/{row['image']}: {'; '.join(row['violations'])}")
+        sys.exit(1)
+    print(f"✅ {len(rows)} outputs within tolerance")
+
+
+if __name__ == "__main__":
+    main()
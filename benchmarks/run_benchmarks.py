@@ -0,0 +1,207 @@
+"""
+Benchmark Suite - Effects, AnimeGAN styles and database operations
+Emits JSON results that can be compared between commits with
+`python -m benchmarks.compare`.
+
+Usage:
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --resolutions vga hd --repeats 5
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import RESOLUTIONS, prepare_manager, prepare_processor, test_image
+from utils.database import Database
+from utils.effect_graph import StageCache
+from utils.runtime_config import get_runtime_config, host_signature
+
+DB_ROW_COUNTS = (100, 1000, 10000)
+
+
+def measure(fn, repeats, warmup=1):
+    """Run fn warmup + repeats times and return timing samples in seconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _result(name, samples, **extra):
+    result = {
+        'name': name,
+        'median_s': statistics.median(samples),
+        'min_s': min(samples),
+        'max_s': max(samples),
+        'samples': samples,
+    }
+    result.update(extra)
+    print(f"  {name:<48} {result['median_s'] * 1000:10.1f} ms")
+    return result
+
+
+def bench_effects(processor, dummy_styles, resolutions, repeats):
+    """Benchmark every ImageProcessor effect at every resolution"""
+    results = []
+    for resolution in resolutions:
+        image = test_image(resolution)
+        for effect in processor.get_available_effects():
+            samples = measure(lambda: processor.process_image(image, effect), repeats)
+            results.append(_result(
+                f"effect/{effect}/{resolution}", samples,
+                group="effect", dummy_model=effect in dummy_styles,
+            ))
+
+        # Every style for one upload, sharing stages through a cold cache
+        graph = processor.build_effect_graph(StageCache())
+        effects = processor.get_available_effects()
+
+        def render_all():
+            graph.cache.clear()
+            for effect in effects:
+                graph.render(image, effect)
+
+        samples = measure(render_all, repeats)
+        results.append(_result(f"effect/all_styles/{resolution}", samples, group="effect",
+                               dummy_model=bool(dummy_styles)))
+    return results
+
+
+def bench_animegan(manager, dummy_styles, resolutions, repeats):
+    """Benchmark every AnimeGANManager style at every resolution"""
+    results = []
+    for resolution in resolutions:
+        image = test_image(resolution)
+        for style in manager.available_styles:
+            samples = measure(lambda: manager.convert(image, style), repeats)
+            results.append(_result(
+                f"animegan/{style}/{resolution}", samples,
+                group="animegan", dummy_model=style in dummy_styles,
+            ))
+    return results
+
+
+def bench_database(db_dir, row_counts, repeats):
+    """Benchmark Database writes and reads as the tables grow"""
+    results = []
+    db = Database(os.path.join(db_dir, "bench.db"))
+    db.create_user("Bench User", "bench@toonify.com", "Bench@123", "Other", 30, "0000000000", "Bench City")
+
+    inserted = 0
+    for target in row_counts:
+        # Grow the tables to the target size
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        for i in range(inserted, target):
+            cursor.execute(
+                "INSERT INTO transactions (order_id, transaction_id, user_email, effect_name, amount, payment_method) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (f"ORD{i}", f"TXN{i}", "bench@toonify.com", "Sketch", 59.0, "upi")
+            )
+            cursor.execute(
+                "INSERT INTO image_history (user_email, effect_name, original_path, cartoonized_path, amount, transaction_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ("bench@toonify.com", "Sketch", "", f"temp/{i}.png", 59.0, f"TXN{i}")
+            )
+        conn.commit()
+        conn.close()
+        inserted = target
+
+        counter = [0]
+
+        def write_transaction():
+            counter[0] += 1
+            tag = f"{target}_{counter[0]}_{time.perf_counter_ns()}"
+            db.save_transaction(f"ORDB{tag}", f"TXNB{tag}", "bench@toonify.com", "Sketch", 59.0, "upi")
+
+        def write_history():
+            db.save_image_history("bench@toonify.com", "Sketch", "", "temp/bench.png", 59.0, "TXNB")
+
+        operations = {
+            'save_transaction': write_transaction,
+            'save_image_history': write_history,
+            'get_user_image_history': lambda: db.get_user_image_history("bench@toonify.com"),
+            'get_admin_stats': db.get_admin_stats,
+            'get_all_users': db.get_all_users,
+            'authenticate_user': lambda: db.authenticate_user("bench@toonify.com", "Bench@123"),
+        }
+        for op_name, fn in operations.items():
+            samples = measure(fn, repeats)
+            results.append(_result(f"database/{op_name}/{target}_rows", samples, group="database", rows=target))
+    return results
+
+
+def git_commit():
+    """Current commit hash, if this is a git checkout"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(resolutions, repeats, row_counts=DB_ROW_COUNTS, groups=("effect", "animegan", "database")):
+    """Run the selected benchmark groups and return the JSON-ready report"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="toonify_bench_") as tmp_dir:
+        if "effect" in groups:
+            print("📊 Effects")
+            processor, dummy_styles = prepare_processor(os.path.join(tmp_dir, "styles"))
+            results += bench_effects(processor, dummy_styles, resolutions, repeats)
+        if "animegan" in groups:
+            print("📊 AnimeGAN styles")
+            manager, dummy_styles = prepare_manager(os.path.join(tmp_dir, "animegan"))
+            results += bench_animegan(manager, dummy_styles, resolutions, repeats)
+        if "database" in groups:
+            print("📊 Database")
+            results += bench_database(tmp_dir, row_counts, repeats)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'host': host_signature(),
+            'runtime': get_runtime_config().as_dict(),
+            'resolutions': {r: RESOLUTIONS[r] for r in resolutions},
+            'repeats': repeats,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Toonify benchmark suite")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file to write")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--rows", nargs="+", type=int, default=list(DB_ROW_COUNTS),
+                        help="Database table sizes to benchmark at")
+    parser.add_argument("--groups", nargs="+", choices=["effect", "animegan", "database"],
+                        default=["effect", "animegan", "database"])
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.resolutions, args.repeats, sorted(args.rows), args.groups)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ {len(report['results'])} benchmark results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
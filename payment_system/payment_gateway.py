@@ -1,6 +1,10 @@
 import streamlit as st
 import time
+import os
+import mimetypes
 from payment_system.payment_handler import PaymentHandler
+from utils.profiling import profiled
+from utils.static_server import static_serving, signed_url
 
 def render_payment_gateway(image_path, user_email, effect_name):
     """Main payment gateway interface"""
@@ -74,54 +78,60 @@ def render_payment_gateway(image_path, user_email, effect_name):
             else:
                 clear_payment_session()
 
-        # Payment method selection
-        st.markdown("""
-        <h3 style="text-align: center; color: #333; margin-bottom: 1.5rem;">
-            💰 Select Payment Method
-        </h3>
-        """, unsafe_allow_html=True)
-
-        col_upi, col_netbank, col_card = st.columns(3)
+        render_payment_methods(payment_handler, amount_details, user_email, image_path, effect_name)
 
-        with col_upi:
-            button_style = "primary" if st.session_state.get('payment_method') == "upi" else "secondary"
-            if st.button("💳 UPI", use_container_width=True, key="select_upi", type=button_style):
-                st.session_state.payment_method = "upi"
+        # ❌ Cancel payment
+        col_cancel1, col_cancel2, col_cancel3 = st.columns([1, 2, 1])
+        with col_cancel2:
+            if st.button("❌ Cancel Payment", use_container_width=True, type="secondary"):
+                clear_payment_session()
                 st.rerun()
 
-        with col_netbank:
-            button_style = "primary" if st.session_state.get('payment_method') == "netbanking" else "secondary"
-            if st.button("🏦 Net Banking", use_container_width=True, key="select_netbank", type=button_style):
-                st.session_state.payment_method = "netbanking"
-                st.rerun()
+    return False
 
-        with col_card:
-            button_style = "primary" if st.session_state.get('payment_method') == "card" else "secondary"
-            if st.button("💳 Card", use_container_width=True, key="select_card", type=button_style):
-                st.session_state.payment_method = "card"
-                st.rerun()
 
-        st.markdown("---")
+@st.fragment
+def render_payment_methods(payment_handler, amount_details, user_email, image_path, effect_name):
+    """Method picker and form; switching methods reruns only this region"""
+    # Payment method selection
+    st.markdown("""
+    <h3 style="text-align: center; color: #333; margin-bottom: 1.5rem;">
+        💰 Select Payment Method
+    </h3>
+    """, unsafe_allow_html=True)
 
-        if "payment_method" not in st.session_state:
+    col_upi, col_netbank, col_card = st.columns(3)
+
+    with col_upi:
+        button_style = "primary" if st.session_state.get('payment_method') == "upi" else "secondary"
+        if st.button("💳 UPI", use_container_width=True, key="select_upi", type=button_style):
             st.session_state.payment_method = "upi"
+            st.rerun(scope="fragment")
 
-        # Render selected payment UI
-        if st.session_state.payment_method == "upi":
-            render_upi_payment(payment_handler, amount_details, user_email, image_path, effect_name)
-        elif st.session_state.payment_method == "netbanking":
-            render_netbanking_payment(payment_handler, amount_details, user_email, image_path, effect_name)
-        elif st.session_state.payment_method == "card":
-            render_card_payment(payment_handler, amount_details, user_email, image_path, effect_name)
+    with col_netbank:
+        button_style = "primary" if st.session_state.get('payment_method') == "netbanking" else "secondary"
+        if st.button("🏦 Net Banking", use_container_width=True, key="select_netbank", type=button_style):
+            st.session_state.payment_method = "netbanking"
+            st.rerun(scope="fragment")
 
-        # ❌ Cancel payment
-        col_cancel1, col_cancel2, col_cancel3 = st.columns([1, 2, 1])
-        with col_cancel2:
-            if st.button("❌ Cancel Payment", use_container_width=True, type="secondary"):
-                clear_payment_session()
-                st.rerun()
+    with col_card:
+        button_style = "primary" if st.session_state.get('payment_method') == "card" else "secondary"
+        if st.button("💳 Card", use_container_width=True, key="select_card", type=button_style):
+            st.session_state.payment_method = "card"
+            st.rerun(scope="fragment")
 
-    return False
+    st.markdown("---")
+
+    if "payment_method" not in st.session_state:
+        st.session_state.payment_method = "upi"
+
+    # Render selected payment UI
+    if st.session_state.payment_method == "upi":
+        render_upi_payment(payment_handler, amount_details, user_email, image_path, effect_name)
+    elif st.session_state.payment_method == "netbanking":
+        render_netbanking_payment(payment_handler, amount_details, user_email, image_path, effect_name)
+    elif st.session_state.payment_method == "card":
+        render_card_payment(payment_handler, amount_details, user_email, image_path, effect_name)
 
 
 def render_upi_payment(payment_handler, amount_details, user_email, image_path, effect_name):
@@ -175,7 +185,8 @@ def render_upi_payment(payment_handler, amount_details, user_email, image_path,
             else:
                 # Process payment directly (no OTP)
                 try:
-                    with st.spinner("🔄 Processing payment..."):
+                    with profiled("payment", method="upi", effect=effect_name, amount=amount_details['total']), \
+                            st.spinner("🔄 Processing payment..."):
                         time.sleep(1.5)
                         
                         payment_details = {'upi_id': upi_id, 'upi_app': upi_app}
@@ -243,7 +254,8 @@ def render_netbanking_payment(payment_handler, amount_details, user_email, image
             else:
                 # Process payment directly (no OTP)
                 try:
-                    with st.spinner("🔄 Processing payment..."):
+                    with profiled("payment", method="netbanking", effect=effect_name, amount=amount_details['total']), \
+                            st.spinner("🔄 Processing payment..."):
                         time.sleep(1.5)
                         
                         payment_details = {'bank': bank, 'customer_id': customer_id}
@@ -378,7 +390,8 @@ def render_card_payment(payment_handler, amount_details, user_email, image_path,
             else:
                 # Process payment directly (no OTP)
                 try:
-                    with st.spinner("🔄 Processing payment..."):
+                    with profiled("payment", method="card", effect=effect_name, amount=amount_details['total']), \
+                            st.spinner("🔄 Processing payment..."):
                         time.sleep(1.5)
                         
                         payment_details = {
@@ -418,16 +431,33 @@ def render_card_payment(payment_handler, amount_details, user_email, image_path,
                     st.error(f"❌ Error: {str(e)}")
 
 
+def render_download_button(path, label, file_name, key, mime=None):
+    """Download via a signed static URL; falls back to sending the bytes through Streamlit"""
+    if static_serving():
+        st.link_button(label, signed_url(path, download_name=file_name), use_container_width=True, type="primary")
+        return
+    with open(path, 'rb') as file:
+        st.download_button(
+            label=label,
+            data=file.read(),
+            file_name=file_name,
+            mime=mime or mimetypes.guess_type(file_name)[0] or "image/png",
+            use_container_width=True,
+            type="primary",
+            key=key
+        )
+
+
 def show_payment_success_page(image_path, effect_name, transaction_id, amount):
     """Show payment success page (outside form context)"""
     
     try:
-        # Read the file
-        with open(image_path, 'rb') as file:
-            file_data = file.read()
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(image_path)
         
-        # Generate filename
-        file_name = f"toonify_{effect_name}_{transaction_id[-8:]}.png"
+        # Generate filename (video orders download as .mp4)
+        extension = os.path.splitext(image_path)[1] or ".png"
+        file_name = f"toonify_{effect_name}_{transaction_id[-8:]}{extension}"
         
         # Show success message
         st.markdown(f"""
@@ -462,15 +492,7 @@ def show_payment_success_page(image_path, effect_name, transaction_id, amount):
         # Download button (outside form, so it's allowed)
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            st.download_button(
-                label="📥 Download Your Image",
-                data=file_data,
-                file_name=file_name,
-                mime="image/png",
-                use_container_width=True,
-                type="primary",
-                key=f"download_{transaction_id}"
-            )
+            render_download_button(image_path, "📥 Download Your Image", file_name, key=f"download_{transaction_id}")
         
         # Auto-redirect message
         st.info("🔄 Redirecting to dashboard in 5 seconds...")
@@ -10,6 +10,8 @@ from datetime import datetime
 import os
 import json
 
+from utils.metrics import record_payment
+
 class PaymentHandler:
     """Handles all payment-related operations"""
     
@@ -95,6 +97,7 @@ class PaymentHandler:
                 }
                 
                 self.save_transaction(transaction_data)
+                record_payment(payment_method, "success", amount_details['total'])
                 
                 return True, {
                     'order_id': order_id,
@@ -102,9 +105,11 @@ class PaymentHandler:
                     'message': 'Payment successful!'
                 }
             else:
+                record_payment(payment_method, "failed")
                 return False, "Failed to save transaction to database"
         
         except Exception as e:
+            record_payment(payment_method, "error")
             print(f"Payment processing error: {e}")
             return False, f"Payment error: {str(e)}"
     
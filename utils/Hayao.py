@@ -1,19 +1,30 @@
 import cv2
 import numpy as np
 
+from utils.smoothing import edge_preserving_smooth
+from utils.color_lut import get_lut
+
 def apply_hayao_style(image_data):
-    """Hayao Miyazaki style - soft, dreamy colors"""
-    nparr = np.frombuffer(image_data, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    
+    """
+    Hayao Miyazaki style - soft, dreamy colors
+
+    Accepts a BGR image (numpy array) or encoded image bytes and returns the
+    same kind: a BGR array for array input, PNG bytes for bytes input.
+    """
+    if isinstance(image_data, np.ndarray):
+        img = image_data
+    else:
+        nparr = np.frombuffer(image_data, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
     # Soften the image
-    img = cv2.bilateralFilter(img, 9, 75, 75)
-    
-    # Adjust colors for dreamy effect
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    hsv[:, :, 1] = hsv[:, :, 1] * 0.8  # Reduce saturation
-    hsv[:, :, 2] = np.clip(hsv[:, :, 2] * 1.2, 0, 255)  # Increase brightness
-    img = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-    
+    img = edge_preserving_smooth(img, 9, 75, 75, effect="Hayao")
+
+    # Adjust colors for dreamy effect (reduced saturation, increased brightness)
+    img = get_lut("Dreamy").apply(img)
+
+    if isinstance(image_data, np.ndarray):
+        return img
+
     _, buffer = cv2.imencode('.png', img)
-    return buffer.tobytes()
\ No newline at end of file
+    return buffer.tobytes()
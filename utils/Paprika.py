@@ -4,9 +4,13 @@ Surreal, dreamlike anime art effect
 """
 import cv2
 import numpy as np
-import onnxruntime as ort
 import os
 
+from utils.inference_server import get_inference_server
+from utils.runtime_config import create_onnx_session
+from utils.metrics import time_stage, record_cache
+from utils.cancellation import RenderCancelledError
+
 MODEL_PATH = "anime_models/Paprika.onnx"
 
 # Initialize session globally to avoid reloading
@@ -15,14 +19,12 @@ session = None
 def load_model():
     """Load ONNX model once"""
     global session
+    record_cache("model", hit=session is not None)
     if session is None:
         if not os.path.exists(MODEL_PATH):
             raise FileNotFoundError(f"Model not found: {MODEL_PATH}")
         
-        session = ort.InferenceSession(
-            MODEL_PATH,
-            providers=["CPUExecutionProvider"]
-        )
+        session = create_onnx_session(MODEL_PATH)
         print(f"✅ Paprika model loaded from {MODEL_PATH}")
     return session
 
@@ -78,29 +80,33 @@ def apply_paprika_style(image):
         
     Returns:
         Styled BGR image
+        
+    Raises on failure, so a failed render is never cached or shown as styled
     """
     try:
         # Load model
         model = load_model()
         
         # Preprocess
-        input_tensor, original_size = preprocess(image)
-        
-        # Run inference
-        input_name = model.get_inputs()[0].name
-        output_name = model.get_outputs()[0].name
+        with time_stage("preprocess", "Paprika", image):
+            input_tensor, original_size = preprocess(image)
         
+        # Run inference (batched with concurrent requests for the same shape bucket)
         print(f"🔄 Paprika: Processing {original_size[0]}x{original_size[1]} image...")
-        output = model.run([output_name], {input_name: input_tensor})[0]
+        with time_stage("inference", "Paprika", image):
+            output = get_inference_server().run("Paprika", model, input_tensor)
         
         # Postprocess
-        result = postprocess(output, original_size)
+        with time_stage("postprocess", "Paprika", image):
+            result = postprocess(output, original_size)
         
         print(f"✅ Paprika: Style applied successfully")
         return result
         
+    except RenderCancelledError:
+        raise
     except Exception as e:
         print(f"❌ Error applying Paprika style: {e}")
         import traceback
         traceback.print_exc()
-        return image
\ No newline at end of file
+        raise
\ No newline at end of file
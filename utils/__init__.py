@@ -34,6 +34,53 @@ from .Paprika import apply_paprika_style
 from .ghibli import apply_ghibli_style
 from .cartoon import apply_cartoon_filter
 
+# Import batched inference server
+from .inference_server import InferenceServer, get_inference_server
+
+# Import shared threading policy
+from .runtime_config import RuntimeConfig, get_runtime_config, create_onnx_session
+
+# Import instrumentation
+from .metrics import metrics, time_stage, observe_stage, start_metrics_server
+from .memory_profiler import MemoryProfiler
+from .profiling import profiled, profile_call, list_profiles
+
+# Import edge-preserving smoothing backends
+from .smoothing import edge_preserving_smooth
+
+# Import memoized effect stage graph
+from .effect_graph import EffectGraph, StageCache, get_stage_cache
+from .blending import blend_strength
+
+# Import LUT color grading
+from .color_lut import ColorLUT, apply_look, available_looks
+
+# Import region-of-interest stylization
+from .roi import stylize_regions, regions_from_boxes, regions_from_mask
+from .face_detection import FaceDetector, get_face_detector, detect_faces
+
+# Import streaming video pipeline
+from .video import stylize_video, read_frames, video_info
+from .temporal import FlowPropagator
+
+# Import background job queue (HTTP API)
+from .jobs import JobQueue, QueueFullError
+
+# Import signed static result serving
+from .static_server import start_static_server, signed_url, result_source
+
+# Import per-purpose output encoders
+from .encoding import encode, write_image, profile_for
+
+# Import upload inspection and bounded decoding
+from .upload_guard import inspect_image, decode_upload, UploadRejectedError
+
+# Import server-side session artifact store
+from .artifact_store import ArtifactStore, get_artifact_store
+
+# Import cancellation tokens and deadlines for long renders
+from .cancellation import CancelToken, RenderCancelledError, DeadlineExceededError, cancel_scope
+
 # Optional: Import animegan_processor if you're using it
 try:
     from .animegan_processor import AnimeGANManager, ONNXAnimeGAN, PyTorchAnimeGAN
@@ -67,6 +114,54 @@ __all__ = [
     'apply_paprika_style',
     'apply_ghibli_style',
     'apply_cartoon_filter',
+    'InferenceServer',
+    'get_inference_server',
+    'RuntimeConfig',
+    'get_runtime_config',
+    'create_onnx_session',
+    'metrics',
+    'time_stage',
+    'observe_stage',
+    'start_metrics_server',
+    'MemoryProfiler',
+    'profiled',
+    'profile_call',
+    'list_profiles',
+    'edge_preserving_smooth',
+    'EffectGraph',
+    'StageCache',
+    'get_stage_cache',
+    'blend_strength',
+    'ColorLUT',
+    'apply_look',
+    'available_looks',
+    'stylize_regions',
+    'regions_from_boxes',
+    'regions_from_mask',
+    'FaceDetector',
+    'get_face_detector',
+    'detect_faces',
+    'stylize_video',
+    'read_frames',
+    'video_info',
+    'FlowPropagator',
+    'JobQueue',
+    'QueueFullError',
+    'start_static_server',
+    'signed_url',
+    'result_source',
+    'encode',
+    'write_image',
+    'profile_for',
+    'inspect_image',
+    'decode_upload',
+    'UploadRejectedError',
+    'ArtifactStore',
+    'get_artifact_store',
+    'CancelToken',
+    'RenderCancelledError',
+    'DeadlineExceededError',
+    'cancel_scope',
 ]
 
 # Add AnimeGAN to exports if available
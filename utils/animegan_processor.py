@@ -6,11 +6,12 @@ import numpy as np
 import cv2
 import os
 from PIL import Image
-import onnxruntime as ort
+
+from utils.runtime_config import create_onnx_session, get_runtime_config
 
 # Try importing ONNX Runtime
 try:
-    
+    import onnxruntime as ort
     ONNX_AVAILABLE = True
 except ImportError:
     ONNX_AVAILABLE = False
@@ -37,10 +38,7 @@ class ONNXAnimeGAN:
             raise FileNotFoundError(f"Model not found: {model_path}")
         
         # Create ONNX session (CPU only)
-        self.session = ort.InferenceSession(
-            model_path,
-            providers=['CPUExecutionProvider']
-        )
+        self.session = create_onnx_session(model_path)
         
         self.input_name = self.session.get_inputs()[0].name
         self.output_name = self.session.get_outputs()[0].name
@@ -112,6 +110,9 @@ class PyTorchAnimeGAN:
         
         self.device = torch.device('cpu')
         
+        # Apply the shared torch thread count before running any ops
+        get_runtime_config()
+        
         try:
             # Try loading as TorchScript
             self.model = torch.jit.load(model_path, map_location=self.device)
@@ -0,0 +1,265 @@
+"""
+Artifact Store - Server-side home for session images, referenced by handle
+Streamlit session state keeps only short string handles; the arrays live here
+in a memory LRU bounded per session and per process. Arrays pushed out of
+memory are spilled to disk as .npy files and reloaded on the next access, and
+sessions that go idle are spilled as a whole. With TOONIFY_ARTIFACT_DIR on
+shared storage and write-through enabled, any node can resolve a handle.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.metrics import metrics, record_cache
+
+ARTIFACT_DIR = os.environ.get("TOONIFY_ARTIFACT_DIR", os.path.join("temp", "artifacts"))
+# Arrays held in memory across all sessions of this process
+ARTIFACT_MEMORY_MB = float(os.environ.get("TOONIFY_ARTIFACT_MEMORY_MB", 512))
+# Arrays one session may hold in memory; older ones are spilled to disk
+ARTIFACT_SESSION_MB = float(os.environ.get("TOONIFY_ARTIFACT_SESSION_MB", 64))
+# Sessions untouched this long are moved out of memory
+ARTIFACT_IDLE_SECONDS = int(os.environ.get("TOONIFY_ARTIFACT_IDLE_SECONDS", 600))
+# Spilled artifacts untouched this long are deleted
+ARTIFACT_DISK_TTL = int(os.environ.get("TOONIFY_ARTIFACT_DISK_TTL", 24 * 3600))
+# Write every artifact to disk on put, so other nodes can load it
+ARTIFACT_WRITE_THROUGH = os.environ.get("TOONIFY_ARTIFACT_WRITE_THROUGH", "0") == "1"
+
+# Idle sweeps run at most this often, piggybacked on put()
+_SWEEP_INTERVAL = 30
+
+
+class _Artifact:
+    __slots__ = ("session", "name", "array", "nbytes", "on_disk", "last_used")
+
+    def __init__(self, session, name, array):
+        self.session = session
+        self.name = name
+        self.array = array
+        self.nbytes = array.nbytes
+        self.on_disk = False
+        self.last_used = time.time()
+
+
+class ArtifactStore:
+    """Memory LRU of session arrays with per-session budgets and spill-to-disk"""
+
+    def __init__(self, directory=ARTIFACT_DIR, memory_mb=ARTIFACT_MEMORY_MB, session_mb=ARTIFACT_SESSION_MB,
+                 idle_seconds=ARTIFACT_IDLE_SECONDS, disk_ttl=ARTIFACT_DISK_TTL, write_through=ARTIFACT_WRITE_THROUGH):
+        self.directory = directory
+        self.max_bytes = int(memory_mb * 1024 * 1024)
+        self.session_max_bytes = int(session_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.disk_ttl = disk_ttl
+        self.write_through = write_through
+        # handle -> _Artifact, least recently used first (in-memory and spilled)
+        self._artifacts = OrderedDict()
+        self._session_bytes = {}
+        self._session_seen = {}
+        self._bytes = 0
+        self._last_sweep = time.time()
+        self._lock = threading.RLock()
+
+    def _path(self, handle):
+        session, _, artifact_id = handle.partition("/")
+        return os.path.join(self.directory, session, f"{artifact_id}.npy")
+
+    def put(self, session, array, name=None):
+        """
+        Store an array for a session and return its handle.
+
+        A named artifact replaces the session's previous artifact of that name,
+        so e.g. re-rendering a result doesn't accumulate copies. The array is
+        made read-only because later get() calls return the same object.
+        """
+        array = np.asarray(array)
+        array.flags.writeable = False
+        handle = f"{session}/{uuid.uuid4().hex}"
+        artifact = _Artifact(session, name, array)
+        if self.write_through:
+            self._write(handle, artifact)
+        with self._lock:
+            replaced = []
+            if name is not None:
+                replaced = [h for h, a in self._artifacts.items() if a.session == session and a.name == name]
+                for old in replaced:
+                    self._remove(old)
+            self._artifacts[handle] = artifact
+            self._account(artifact, artifact.nbytes)
+            self._session_seen[session] = artifact.last_used
+            self._enforce(session)
+            sweep = time.time() - self._last_sweep > _SWEEP_INTERVAL
+        for old in replaced:
+            self._unlink(old)
+        if sweep:
+            self.evict_idle()
+        return handle
+
+    def get(self, handle):
+        """Array for a handle (reloaded from disk if spilled), or None if unknown or expired"""
+        if not handle:
+            return None
+        with self._lock:
+            artifact = self._artifacts.get(handle)
+            if artifact is not None:
+                self._artifacts.move_to_end(handle)
+                artifact.last_used = time.time()
+                self._session_seen[artifact.session] = artifact.last_used
+                if artifact.array is not None:
+                    record_cache("artifacts", True)
+                    return artifact.array
+        record_cache("artifacts", False)
+
+        # Spilled here, or written by another node
+        path = self._path(handle)
+        try:
+            array = np.load(path, allow_pickle=False)
+            # Keeps the file clear of the disk TTL sweep
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        array.flags.writeable = False
+        with self._lock:
+            artifact = self._artifacts.get(handle)
+            if artifact is None:
+                session = handle.partition("/")[0]
+                artifact = _Artifact(session, None, array)
+                artifact.on_disk = True
+                self._artifacts[handle] = artifact
+                self._account(artifact, artifact.nbytes)
+            elif artifact.array is None:
+                artifact.array = array
+                self._account(artifact, artifact.nbytes)
+            else:
+                array = artifact.array
+            self._session_seen[artifact.session] = time.time()
+            self._enforce(artifact.session, keep=handle)
+        return array
+
+    def delete(self, handle):
+        with self._lock:
+            self._remove(handle)
+        self._unlink(handle)
+
+    def drop_session(self, session):
+        """Forget every artifact of a session (e.g. on logout)"""
+        with self._lock:
+            for handle in [h for h, a in self._artifacts.items() if a.session == session]:
+                self._remove(handle)
+            self._session_bytes.pop(session, None)
+            self._session_seen.pop(session, None)
+        shutil.rmtree(os.path.join(self.directory, session), ignore_errors=True)
+
+    def evict_idle(self, now=None):
+        """Spill sessions idle longer than idle_seconds; delete expired spill files"""
+        now = now or time.time()
+        with self._lock:
+            self._last_sweep = now
+            idle = {s for s, seen in self._session_seen.items() if now - seen > self.idle_seconds}
+            for artifact_handle, artifact in list(self._artifacts.items()):
+                if artifact.session in idle and artifact.array is not None:
+                    self._spill(artifact_handle, artifact)
+            expired = [h for h, a in self._artifacts.items() if a.array is None and now - a.last_used > self.disk_ttl]
+            for handle in expired:
+                self._remove(handle)
+            for session in idle:
+                # Fully spilled; tracked again on its next access
+                self._session_bytes.pop(session, None)
+                self._session_seen.pop(session, None)
+        for handle in expired:
+            self._unlink(handle)
+        self._sweep_disk(now)
+
+    def stats(self):
+        with self._lock:
+            in_memory = sum(1 for a in self._artifacts.values() if a.array is not None)
+            return {
+                'artifacts': len(self._artifacts),
+                'in_memory': in_memory,
+                'spilled': len(self._artifacts) - in_memory,
+                'memory_mb': round(self._bytes / (1024 * 1024), 1),
+                'sessions': len(self._session_seen),
+            }
+
+    def _enforce(self, session, keep=None):
+        """Spill least recently used arrays until the session and global budgets hold"""
+        for handle, artifact in list(self._artifacts.items()):
+            if self._session_bytes.get(session, 0) <= self.session_max_bytes:
+                break
+            if artifact.session == session and artifact.array is not None and handle != keep:
+                self._spill(handle, artifact)
+        for handle, artifact in list(self._artifacts.items()):
+            if self._bytes <= self.max_bytes:
+                break
+            if artifact.array is not None and handle != keep:
+                self._spill(handle, artifact)
+
+    def _spill(self, handle, artifact):
+        if not artifact.on_disk:
+            self._write(handle, artifact)
+        self._account(artifact, -artifact.nbytes)
+        artifact.array = None
+        metrics.inc("toonify_artifacts_spilled_total", help_text="Session arrays moved from memory to disk")
+
+    def _write(self, handle, artifact):
+        path = self._path(handle)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers on other nodes never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, artifact.array, allow_pickle=False)
+        os.replace(tmp_path, path)
+        artifact.on_disk = True
+
+    def _remove(self, handle):
+        artifact = self._artifacts.pop(handle, None)
+        if artifact is None:
+            return
+        if artifact.array is not None:
+            self._account(artifact, -artifact.nbytes)
+
+    def _unlink(self, handle):
+        try:
+            os.remove(self._path(handle))
+        except OSError:
+            pass
+
+    def _account(self, artifact, delta):
+        self._bytes += delta
+        self._session_bytes[artifact.session] = self._session_bytes.get(artifact.session, 0) + delta
+        metrics.set_gauge("toonify_artifact_memory_bytes", self._bytes, help_text="Session arrays held in memory")
+
+    def _sweep_disk(self, now):
+        """Delete spill files nobody touched within the disk TTL (e.g. from restarted processes)"""
+        if not os.path.isdir(self.directory):
+            return
+        for session in os.listdir(self.directory):
+            session_dir = os.path.join(self.directory, session)
+            try:
+                names = os.listdir(session_dir)
+                for name in names:
+                    path = os.path.join(session_dir, name)
+                    if now - os.path.getmtime(path) > self.disk_ttl:
+                        os.remove(path)
+                if not os.listdir(session_dir):
+                    os.rmdir(session_dir)
+            except OSError:
+                continue
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Process-wide artifact store shared by all Streamlit sessions"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
@@ -1,8 +1,12 @@
 """
 Authentication utilities for session management
 """
+import uuid
+
 import streamlit as st
 
+from utils.artifact_store import get_artifact_store
+
 def init_session_state():
     """Initialize session state variables"""
     if 'logged_in' not in st.session_state:
@@ -23,6 +27,9 @@ def init_session_state():
         st.session_state.payment_image_path = None
     if 'selected_effect' not in st.session_state:
         st.session_state.selected_effect = None
+    if 'session_id' not in st.session_state:
+        # Owner id for this session's arrays in the artifact store
+        st.session_state.session_id = uuid.uuid4().hex
 
 def login_user(user_data):
     """Login user and store data in session"""
@@ -34,8 +41,12 @@ def logout_user():
     st.session_state.logged_in = False
     st.session_state.user_data = None
     # Clear any cached data
-    if 'processed_image' in st.session_state:
-        del st.session_state.processed_image
+    if 'session_id' in st.session_state:
+        get_artifact_store().drop_session(st.session_state.session_id)
+    if 'processed_handle' in st.session_state:
+        del st.session_state.processed_handle
+    if 'style_previews' in st.session_state:
+        del st.session_state.style_previews
     if 'processed_path' in st.session_state:
         del st.session_state.processed_path
     if 'effect_applied' in st.session_state:
@@ -0,0 +1,292 @@
+"""
+Runtime Auto-Tuner
+Benchmarks every available effect and model on the local CPU across thread
+counts, ONNX Runtime execution modes and graph optimization levels, then
+writes a tuned profile that RuntimeConfig loads at startup.
+
+Usage:
+    python -m utils.autotune [--size 1024x768] [--repeats 3] [--objective throughput]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from utils.effect_graph import StageCache
+from utils.image_processor import ImageProcessor
+from utils.runtime_config import (
+    PROFILE_PATH, RuntimeConfig, host_signature, ONNX_AVAILABLE, TORCH_AVAILABLE
+)
+
+if ONNX_AVAILABLE:
+    import onnxruntime as ort
+
+if TORCH_AVAILABLE:
+    import torch
+
+EXECUTION_MODES = ["sequential", "parallel"]
+OPTIMIZATION_LEVELS = ["basic", "extended", "all"]
+
+
+def candidate_thread_counts():
+    """Powers of two up to the core count, plus the core count itself"""
+    total = os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < total:
+        counts.append(n)
+        n *= 2
+    counts.append(total)
+    return counts
+
+
+def synthetic_image(width, height, seed=0):
+    """Deterministic photo-like test image (gradients + shapes + noise)"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.stack([
+        np.broadcast_to(x, (height, width)),
+        np.broadcast_to(y, (height, width)),
+        (x + y) / 2,
+    ], axis=2)
+    image = image + rng.normal(0, 12, image.shape)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+    for _ in range(12):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(10, max(11, min(width, height) // 6)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(image, center, radius, color, -1)
+    return image
+
+
+def time_call(fn, repeats):
+    """Median wall time of fn() over repeats, after one warm-up call"""
+    fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def tune_opencv_effects(processor, image, thread_counts, repeats):
+    """Time each OpenCV effect at every thread count"""
+    model_effects = set(processor.available_onnx) | {"Ghibli Style"}
+    effects = [e for e in processor.get_available_effects() if e not in model_effects]
+    # Every repeat must render; a shared stage cache would turn them into hits
+    graph = processor.build_effect_graph(StageCache(max_mb=0))
+
+    results = {}
+    for effect in effects:
+        results[effect] = {}
+        for n in thread_counts:
+            cv2.setNumThreads(n)
+            try:
+                seconds = time_call(lambda: processor._apply_effect(image, effect, graph=graph), repeats)
+            except Exception as e:
+                print(f"⚠️ {effect} failed with {n} threads: {e}")
+                continue
+            results[effect][n] = seconds
+            print(f"  {effect:<18} threads={n:<3} {seconds * 1000:8.1f} ms")
+    return results
+
+
+def onnx_model_paths(processor):
+    """Collect every ONNX model the processing layer can use"""
+    paths = {style: processor.onnx_styles[style] for style in processor.available_onnx}
+    if processor.ghibli_available:
+        paths["Ghibli Style"] = os.path.join("anime_models", "Ghibli.onnx")
+    try:
+        from utils.animegan_processor import AnimeGANManager
+        manager = AnimeGANManager()
+        for style in manager.available_styles:
+            filename = manager.model_files[style]
+            if filename.endswith('.onnx'):
+                paths.setdefault(style, os.path.join(manager.models_dir, filename))
+    except Exception as e:
+        print(f"⚠️ AnimeGAN manager unavailable: {e}")
+    return paths
+
+
+def model_input(session, image):
+    """Build an input tensor matching the model's declared layout"""
+    shape = session.get_inputs()[0].shape
+    h, w = image.shape[:2]
+
+    if len(shape) == 4 and shape[1] == 3:
+        # NCHW in [-1, 1] (AnimeGANManager models)
+        th = shape[2] if isinstance(shape[2], int) else h
+        tw = shape[3] if isinstance(shape[3], int) else w
+        resized = cv2.resize(image, (tw, th))
+        tensor = resized.astype(np.float32) / 127.5 - 1.0
+        return np.expand_dims(np.transpose(tensor, (2, 0, 1)), 0)
+
+    # NHWC in [0, 1] (style modules)
+    th = shape[1] if len(shape) == 4 and isinstance(shape[1], int) else h
+    tw = shape[2] if len(shape) == 4 and isinstance(shape[2], int) else w
+    resized = cv2.resize(image, (tw, th))
+    return np.expand_dims(resized.astype(np.float32) / 255.0, 0)
+
+
+def tune_onnx_models(paths, image, thread_counts, repeats):
+    """Time each ONNX model across threads, execution modes and optimization levels"""
+    results = {}
+    if not ONNX_AVAILABLE:
+        return results
+
+    for style, path in paths.items():
+        results[style] = []
+        for n in thread_counts:
+            for mode in EXECUTION_MODES:
+                for level in OPTIMIZATION_LEVELS:
+                    config = RuntimeConfig(concurrent_slots=1, cores_per_request=n, profile={
+                        'ort_execution_mode': mode,
+                        'ort_graph_optimization': level,
+                        'ort_inter_op_threads': 2 if mode == "parallel" else 1,
+                    })
+                    try:
+                        session = ort.InferenceSession(
+                            path, sess_options=config.session_options(),
+                            providers=["CPUExecutionProvider"]
+                        )
+                        feed = {session.get_inputs()[0].name: model_input(session, image)}
+                        seconds = time_call(lambda: session.run(None, feed), repeats)
+                    except Exception as e:
+                        print(f"⚠️ {style} failed ({n} threads, {mode}, {level}): {e}")
+                        continue
+                    results[style].append({
+                        'threads': n, 'execution_mode': mode,
+                        'graph_optimization': level, 'seconds': seconds,
+                    })
+                    print(f"  {style:<18} threads={n:<3} {mode:<10} {level:<8} {seconds * 1000:8.1f} ms")
+    return results
+
+
+def tune_torch_models(image, thread_counts, repeats):
+    """Time each PyTorch AnimeGAN model at every thread count"""
+    results = {}
+    if not TORCH_AVAILABLE:
+        return results
+    try:
+        from utils.animegan_processor import AnimeGANManager
+        manager = AnimeGANManager()
+    except Exception as e:
+        print(f"⚠️ AnimeGAN manager unavailable: {e}")
+        return results
+
+    for style in manager.available_styles:
+        if not manager.model_files[style].endswith('.pt'):
+            continue
+        model = manager.get_model(style)
+        results[style] = {}
+        for n in thread_counts:
+            torch.set_num_threads(n)
+            seconds = time_call(lambda: model.convert(image), repeats)
+            results[style][n] = seconds
+            print(f"  {style:<18} threads={n:<3} {seconds * 1000:8.1f} ms")
+    return results
+
+
+def choose_settings(opencv_results, onnx_results, torch_results, thread_counts, objective):
+    """
+    Pick cores per request and ORT settings from the measurements.
+
+    objective="latency" minimizes total single-image latency; "throughput"
+    minimizes core-seconds per image, which is what matters with many
+    concurrent users sharing the machine.
+    """
+    def latency_at(n):
+        total = 0.0
+        for timings in list(opencv_results.values()) + list(torch_results.values()):
+            if n in timings:
+                total += timings[n]
+        for runs in onnx_results.values():
+            at_n = [r['seconds'] for r in runs if r['threads'] == n]
+            if at_n:
+                total += min(at_n)
+        return total
+
+    costs = {}
+    for n in thread_counts:
+        latency = latency_at(n)
+        if latency > 0:
+            costs[n] = latency * n if objective == "throughput" else latency
+    best_threads = min(costs, key=costs.get) if costs else max(1, (os.cpu_count() or 1) // 2)
+
+    # ORT mode / level that is fastest across all models at the chosen thread count
+    combo_totals = {}
+    for runs in onnx_results.values():
+        for r in runs:
+            if r['threads'] == best_threads:
+                key = (r['execution_mode'], r['graph_optimization'])
+                combo_totals[key] = combo_totals.get(key, 0.0) + r['seconds']
+    mode, level = min(combo_totals, key=combo_totals.get) if combo_totals else ("sequential", "all")
+
+    return {
+        'cores_per_request': best_threads,
+        'ort_execution_mode': mode,
+        'ort_graph_optimization': level,
+        'ort_inter_op_threads': 2 if mode == "parallel" else 1,
+    }
+
+
+def run_autotune(size=(1024, 768), repeats=3, objective="throughput", output_path=PROFILE_PATH):
+    """Benchmark the local machine and write a tuned runtime profile"""
+    print("🔧 Auto-tuning runtime settings...")
+    processor = ImageProcessor()
+    image = synthetic_image(*size)
+    thread_counts = candidate_thread_counts()
+
+    print("📊 OpenCV effects")
+    opencv_results = tune_opencv_effects(processor, image, thread_counts, repeats)
+    print("📊 ONNX models")
+    onnx_results = tune_onnx_models(onnx_model_paths(processor), image, thread_counts, repeats)
+    print("📊 PyTorch models")
+    torch_results = tune_torch_models(image, thread_counts, repeats)
+
+    settings = choose_settings(opencv_results, onnx_results, torch_results, thread_counts, objective)
+
+    profile = {
+        'created_at': datetime.now().isoformat(),
+        'host': host_signature(),
+        'objective': objective,
+        'image_size': list(size),
+        'settings': settings,
+        'results': {
+            'opencv': opencv_results,
+            'onnx': onnx_results,
+            'torch': torch_results,
+        },
+    }
+
+    dir_path = os.path.dirname(output_path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(profile, f, indent=4)
+
+    print(f"✅ Tuned profile written to {output_path}: {settings}")
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune Toonify runtime settings for this machine")
+    parser.add_argument("--size", default="1024x768", help="Benchmark image size WIDTHxHEIGHT")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per configuration")
+    parser.add_argument("--objective", choices=["throughput", "latency"], default="throughput")
+    parser.add_argument("--output", default=PROFILE_PATH, help="Profile file to write")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    run_autotune((width, height), args.repeats, args.objective, args.output)
+
+
+if __name__ == "__main__":
+    main()
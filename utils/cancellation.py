@@ -0,0 +1,159 @@
+"""
+Cancellation - Deadlines and cancel tokens for long-running renders
+A CancelToken is bound to the current render with cancel_scope(); effects
+call checkpoint() between stages, and ONNX Runtime calls are started with
+RunOptions whose terminate flag is raised when the token is cancelled or its
+deadline passes, so even a running session.run stops early.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+from utils.metrics import metrics
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+class RenderCancelledError(RuntimeError):
+    """Raised inside a render whose token was cancelled"""
+
+
+class DeadlineExceededError(RenderCancelledError):
+    """Raised inside a render that ran past its deadline"""
+
+
+class CancelToken:
+    """Cancellation flag with an optional deadline, shared by everything one render starts"""
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._lock = threading.Lock()
+        self._run_options = set()
+        self.started = time.monotonic()
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the render; running ONNX Runtime calls are terminated"""
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            for options in self._run_options:
+                options.terminate = True
+
+    @property
+    def cancelled(self):
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        return self.reason is not None
+
+    def remaining(self):
+        """Seconds until the deadline (None if there is none)"""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """Raise if cancelled or past the deadline"""
+        if self.cancelled:
+            error = DeadlineExceededError if self.reason == "deadline" else RenderCancelledError
+            raise error(f"Render {self.reason} after {time.monotonic() - self.started:.1f}s")
+
+    @contextmanager
+    def run_options(self):
+        """onnxruntime.RunOptions terminated on cancel or when the deadline passes"""
+        self.check()
+        if not ONNX_AVAILABLE:
+            yield None
+            return
+        options = ort.RunOptions()
+        timer = None
+        with self._lock:
+            self._run_options.add(options)
+        remaining = self.remaining()
+        if remaining is not None:
+            # session.run blocks this thread, so the deadline is enforced from a timer
+            timer = threading.Timer(remaining, self.cancel, args=("deadline",))
+            timer.daemon = True
+            timer.start()
+        try:
+            yield options
+        except Exception:
+            # ORT reports a terminated run as a generic failure
+            self.check()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                self._run_options.discard(options)
+
+
+_current = contextvars.ContextVar("toonify_cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token):
+    """Make token the current one for this thread's render"""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def current_token():
+    """Token of the render running in this context, or None"""
+    return _current.get()
+
+
+def checkpoint():
+    """Stop the current render here if it was cancelled (no-op without a token)"""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def submit_in_context(pool, func, *args):
+    """pool.submit that carries the current token into the worker thread"""
+    return pool.submit(contextvars.copy_context().run, func, *args)
+
+
+def record_cancelled(where, token):
+    """Count a cancelled render and the seconds it had already used"""
+    reason = token.reason or "cancelled"
+    metrics.inc("toonify_renders_cancelled_total", help_text="Renders stopped by cancellation or deadline",
+                where=where, reason=reason)
+    metrics.inc("toonify_cancelled_seconds_total", time.monotonic() - token.started,
+                help_text="Time spent on renders that were later cancelled", where=where)
+
+
+def run_with_heartbeat(func, token, heartbeat, interval=0.25):
+    """
+    Run func() on a worker thread under token while this thread calls heartbeat().
+
+    For Streamlit: heartbeat() updates an element, which is where Streamlit
+    interrupts a script whose user clicked something else or left. The
+    interruption cancels the token, so the abandoned render stops too.
+    """
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="toonify-render")
+    future = None
+    try:
+        with cancel_scope(token):
+            future = submit_in_context(pool, func)
+        while True:
+            try:
+                return future.result(timeout=interval)
+            except FutureTimeout:
+                heartbeat()
+    except BaseException:
+        # Includes Streamlit's rerun/stop control-flow exceptions
+        if future is not None and not future.done():
+            token.cancel("interrupted")
+            record_cancelled("ui", token)
+        raise
+    finally:
+        pool.shutdown(wait=False)
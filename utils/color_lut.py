@@ -0,0 +1,194 @@
+"""
+Color Grading - 3D LUT engine for color-only transforms
+Any per-pixel color transform is baked once into a 3D lookup table (or loaded
+from an Adobe/Resolve .cube file) and applied with trilinear interpolation in
+one vectorized pass, so color looks cost the same regardless of how complex
+the original transform was.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+
+LUT_DIR = os.environ.get("TOONIFY_LUT_DIR", "luts")
+DEFAULT_LUT_SIZE = 33
+
+# Pixels interpolated per chunk; bounds temporary memory on large images
+_CHUNK_PIXELS = 1 << 20
+
+
+class ColorLUT:
+    """
+    A 3D color lookup table.
+
+    table has shape (N, N, N, 3) indexed [b, g, r] and holds BGR output
+    values in 0..255.
+    """
+
+    def __init__(self, table, title=""):
+        table = np.asarray(table, dtype=np.float32)
+        if table.ndim != 4 or table.shape[:3] != (table.shape[0],) * 3 or table.shape[3] != 3:
+            raise ValueError(f"LUT table must have shape (N, N, N, 3), got {table.shape}")
+        self.size = table.shape[0]
+        self.table = table
+        self.title = title
+        # [g, b * N + r] layout: each blue level is an N x N (g, r) tile
+        self._slices = np.ascontiguousarray(table.transpose(1, 0, 2, 3).reshape(self.size, self.size * self.size, 3))
+
+        # Per-uint8-value lattice coordinates, looked up with cv2.LUT
+        position = np.arange(256, dtype=np.float32) * np.float32((self.size - 1) / 255.0)
+        slice_index = np.minimum(position.astype(np.int32), self.size - 2)
+        self._position = position
+        self._slice_offset = (slice_index * self.size).astype(np.float32)
+        self._slice_frac = (position - slice_index).astype(np.float32)
+
+    @classmethod
+    def bake(cls, transform, size=DEFAULT_LUT_SIZE, title=""):
+        """Sample a BGR uint8 image -> BGR uint8 image transform on an N^3 lattice"""
+        levels = np.round(np.linspace(0, 255, size)).astype(np.uint8)
+        b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+        lattice = np.stack([b, g, r], axis=-1).reshape(size * size, size, 3)
+        graded = transform(lattice)
+        return cls(graded.reshape(size, size, size, 3).astype(np.float32), title)
+
+    @classmethod
+    def from_cube(cls, path):
+        """Load a .cube file (LUT_3D_SIZE, optional DOMAIN_MIN/MAX, red varies fastest)"""
+        size = None
+        title = os.path.splitext(os.path.basename(path))[0]
+        domain_min = np.zeros(3, np.float32)
+        domain_max = np.ones(3, np.float32)
+        values = []
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                keyword = line.split()[0].upper()
+                if keyword == "TITLE":
+                    title = line[len("TITLE"):].strip().strip('"') or title
+                elif keyword == "LUT_3D_SIZE":
+                    size = int(line.split()[1])
+                elif keyword == "DOMAIN_MIN":
+                    domain_min = np.array(line.split()[1:4], np.float32)
+                elif keyword == "DOMAIN_MAX":
+                    domain_max = np.array(line.split()[1:4], np.float32)
+                elif keyword == "LUT_1D_SIZE":
+                    raise ValueError("1D .cube LUTs are not supported")
+                elif keyword[0].isdigit() or keyword[0] in "-.":
+                    values.append([float(v) for v in line.split()[:3]])
+
+        if size is None or len(values) != size ** 3:
+            raise ValueError(f"{path}: expected {size}^3 entries, found {len(values)}")
+
+        rgb = (np.array(values, np.float32) - domain_min) / (domain_max - domain_min)
+        # Entries run r fastest, then g, then b -> index [b, g, r]; store as BGR 0..255
+        table = rgb.reshape(size, size, size, 3)[..., ::-1] * 255.0
+        return cls(np.clip(table, 0, 255), title)
+
+    def apply(self, image):
+        """
+        Grade a BGR uint8 image with trilinear interpolation.
+
+        The table is laid out as a 2D image of blue slices side by side, so
+        each pixel is two cv2.remap bilinear lookups (red/green) in adjacent
+        slices followed by one lerp along blue.
+        """
+        h, w = image.shape[:2]
+        out = np.empty((h, w, 3), np.uint8)
+        rows = max(1, _CHUNK_PIXELS // max(1, w))
+        for top in range(0, h, rows):
+            blue, green, red = cv2.split(image[top:top + rows])
+            map_x = cv2.add(cv2.LUT(red, self._position), cv2.LUT(blue, self._slice_offset))
+            map_y = cv2.LUT(green, self._position)
+            lower = cv2.remap(self._slices, map_x, map_y, cv2.INTER_LINEAR)
+            upper = cv2.remap(self._slices, map_x + np.float32(self.size), map_y, cv2.INTER_LINEAR)
+            frac = cv2.merge([cv2.LUT(blue, self._slice_frac)] * 3)
+            graded = cv2.add(lower, cv2.multiply(cv2.subtract(upper, lower), frac))
+            out[top:top + rows] = cv2.convertScaleAbs(graded)
+        return out
+
+
+# =============================================================================
+# Built-in looks
+# =============================================================================
+
+def dreamy_grade(image):
+    """Soft, dreamy grade: 80% saturation, 120% brightness"""
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
+    hsv[:, :, 1] *= 0.8
+    hsv[:, :, 2] = np.minimum(hsv[:, :, 2] * 1.2, 255)
+    return cv2.cvtColor(np.round(hsv).astype(np.uint8), cv2.COLOR_HSV2BGR)
+
+
+def warm_grade(image):
+    """Warmer whites and slightly lifted shadows"""
+    graded = image.astype(np.float32)
+    graded[:, :, 2] = graded[:, :, 2] * 1.08 + 6   # red
+    graded[:, :, 0] = graded[:, :, 0] * 0.92       # blue
+    return np.clip(graded, 0, 255).astype(np.uint8)
+
+
+def cool_grade(image):
+    """Cooler, cleaner tones"""
+    graded = image.astype(np.float32)
+    graded[:, :, 0] = graded[:, :, 0] * 1.08 + 6   # blue
+    graded[:, :, 2] = graded[:, :, 2] * 0.93       # red
+    return np.clip(graded, 0, 255).astype(np.uint8)
+
+
+def vintage_grade(image):
+    """Faded blacks, muted colors and a gentle sepia tint"""
+    graded = image.astype(np.float32)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32)[..., None]
+    graded = graded * 0.7 + gray * 0.3
+    graded = graded * 0.85 + 30
+    graded *= np.array([0.88, 1.0, 1.08], np.float32)
+    return np.clip(graded, 0, 255).astype(np.uint8)
+
+
+BUILTIN_LOOKS = {
+    "Dreamy": dreamy_grade,
+    "Warm": warm_grade,
+    "Cool": cool_grade,
+    "Vintage": vintage_grade,
+}
+
+_luts = {}
+_luts_lock = threading.Lock()
+
+
+def available_looks():
+    """Built-in look names plus any .cube files in LUT_DIR"""
+    looks = list(BUILTIN_LOOKS)
+    if os.path.isdir(LUT_DIR):
+        looks += sorted(os.path.splitext(f)[0] for f in os.listdir(LUT_DIR) if f.lower().endswith(".cube"))
+    return looks
+
+
+def get_lut(name):
+    """Baked or loaded LUT for a look (cached after the first use)"""
+    lut = _luts.get(name)
+    if lut is None:
+        with _luts_lock:
+            lut = _luts.get(name)
+            if lut is None:
+                if name in BUILTIN_LOOKS:
+                    lut = ColorLUT.bake(BUILTIN_LOOKS[name], title=name)
+                else:
+                    lut = ColorLUT.from_cube(os.path.join(LUT_DIR, f"{name}.cube"))
+                _luts[name] = lut
+                print(f"✅ Color look ready: {name} ({lut.size}^3 LUT)")
+    return lut
+
+
+def apply_look(image, name):
+    """Grade an image with a named look; returns the input unchanged on error"""
+    if not name:
+        return image
+    try:
+        return get_lut(name).apply(image)
+    except Exception as e:
+        print(f"⚠️ Could not apply look '{name}': {e}")
+        return image
@@ -8,6 +8,9 @@ import os
 from datetime import datetime
 import json
 
+from utils.metrics import time_stage
+from utils.profiling import profile_call
+
 class Database:
     def __init__(self, db_path="data/toonify.db"):
         self.db_path = db_path
@@ -85,6 +88,7 @@ class Database:
         conn.commit()
         conn.close()
     
+    @profile_call("database")
     def create_user(self, name, email, password, gender, age, mobile, city):
         """Create new user"""
         try:
@@ -107,6 +111,7 @@ class Database:
         except Exception as e:
             return False, f"Error: {str(e)}"
     
+    @profile_call("database")
     def authenticate_user(self, email, password):
         """Authenticate user"""
         try:
@@ -140,6 +145,7 @@ class Database:
         except Exception as e:
             return False, f"Error: {str(e)}"
     
+    @profile_call("database")
     def authenticate_admin(self, email, password):
         """Authenticate admin"""
         try:
@@ -173,6 +179,7 @@ class Database:
         except Exception as e:
             return False, f"Error: {str(e)}"
     
+    @profile_call("database")
     def update_password(self, email, current_password, new_password):
         """Update user password"""
         try:
@@ -199,44 +206,49 @@ class Database:
         except Exception as e:
             return False, f"Error: {str(e)}"
     
+    @profile_call("database")
     def save_transaction(self, order_id, transaction_id, user_email, effect_name, amount, payment_method):
         """Save transaction"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO transactions (order_id, transaction_id, user_email, effect_name, amount, payment_method)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (order_id, transaction_id, user_email, effect_name, amount, payment_method))
-            
-            conn.commit()
-            conn.close()
+            with time_stage("db_write", effect_name, resolution="n/a"):
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO transactions (order_id, transaction_id, user_email, effect_name, amount, payment_method)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (order_id, transaction_id, user_email, effect_name, amount, payment_method))
+                
+                conn.commit()
+                conn.close()
             return True
             
         except Exception as e:
             print(f"Transaction save error: {e}")
             return False
     
+    @profile_call("database")
     def save_image_history(self, user_email, effect_name, original_path, cartoonized_path, amount, transaction_id):
         """Save image processing history"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO image_history (user_email, effect_name, original_path, cartoonized_path, amount, transaction_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_email, effect_name, original_path, cartoonized_path, amount, transaction_id))
-            
-            conn.commit()
-            conn.close()
+            with time_stage("db_write", effect_name, resolution="n/a"):
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO image_history (user_email, effect_name, original_path, cartoonized_path, amount, transaction_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (user_email, effect_name, original_path, cartoonized_path, amount, transaction_id))
+                
+                conn.commit()
+                conn.close()
             return True
             
         except Exception as e:
             print(f"Image history save error: {e}")
             return False
     
+    @profile_call("database")
     def get_user_image_history(self, user_email):
         """Get user's image processing history"""
         try:
@@ -258,6 +270,7 @@ class Database:
             print(f"Error fetching history: {e}")
             return []
     
+    @profile_call("database")
     def get_all_users(self):
         """Get all users (excluding admin)"""
         try:
@@ -279,6 +292,7 @@ class Database:
             print(f"Error fetching users: {e}")
             return []
     
+    @profile_call("database")
     def get_user_by_id(self, user_id):
         """Get user details by ID"""
         try:
@@ -336,6 +350,7 @@ class Database:
             return False, str(e)
 
     
+    @profile_call("database")
     def get_admin_stats(self):
         """Get admin dashboard statistics"""
         try:
@@ -0,0 +1,197 @@
+"""
+Effect Graph - Effects as a DAG of named, memoized stages
+Stages such as grayscale conversion or edge detection are shared between
+effects. Their outputs are cached per input image (and per stage parameters),
+so rendering several styles for one upload computes the shared prefix once.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.metrics import metrics, record_cache
+from utils.cancellation import checkpoint
+
+# Memory budget for cached stage outputs across all sessions in this process
+STAGE_CACHE_MB = float(os.environ.get("TOONIFY_STAGE_CACHE_MB", 512))
+
+SOURCE = "source"
+
+
+def image_key(image):
+    """Content hash identifying an input image"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((image.shape, image.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One node of the graph.
+
+    func is called with the outputs of `inputs` (in order) followed by the
+    stage's parameters as keyword arguments; `defaults` lists every parameter
+    the stage depends on, so cached outputs are keyed by exactly those values.
+    """
+
+    def __init__(self, name, func, inputs=(SOURCE,), defaults=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.defaults = dict(defaults or {})
+
+    def resolve_params(self, params):
+        return {k: params.get(k, v) for k, v in self.defaults.items()}
+
+
+class StageCache:
+    """Thread-safe LRU of stage outputs bounded by total array size"""
+
+    def __init__(self, max_mb=STAGE_CACHE_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = getattr(value, "nbytes", 0)
+        if size > self.max_bytes:
+            return
+        if isinstance(value, np.ndarray):
+            # Shared between callers, so nobody may modify it in place
+            value.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= getattr(evicted, "nbytes", 0)
+            metrics.set_gauge("toonify_stage_cache_bytes", self._bytes,
+                              help_text="Bytes held by cached effect stages")
+
+    def compute(self, key, func):
+        """Return the cached value for key, computing it once even under concurrency"""
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value, True
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+            if not owner:
+                # Another thread is computing this stage; wait and re-check
+                event.wait()
+                continue
+            try:
+                value = func()
+                self.put(key, value)
+                return value, False
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'mb': round(self._bytes / (1024 * 1024), 1),
+                    'max_mb': round(self.max_bytes / (1024 * 1024), 1)}
+
+
+class EffectGraph:
+    """Named stages plus a mapping from effect name to its output stage"""
+
+    def __init__(self, cache=None):
+        self.stages = {}
+        self.effects = {}
+        self.cache = cache if cache is not None else get_stage_cache()
+
+    def add_stage(self, name, func, inputs=(SOURCE,), defaults=None):
+        self.stages[name] = Stage(name, func, inputs, defaults)
+        return self
+
+    def add_effect(self, effect, output_stage):
+        self.effects[effect] = output_stage
+        return self
+
+    def has_effect(self, effect):
+        return effect in self.effects
+
+    def render(self, image, effect, params=None, key=None):
+        """
+        Render an effect, reusing any cached stages for this image.
+
+        The returned array is a private copy the caller may modify.
+        """
+        key = key or image_key(image)
+        value = self._resolve(self.effects[effect], image, key, params or {}, {})[0]
+        return value.copy() if isinstance(value, np.ndarray) else value
+
+    def stage_output(self, stage, image, params=None, key=None):
+        """Cached (read-only) output of a single stage"""
+        key = key or image_key(image)
+        return self._resolve(stage, image, key, params or {}, {})[0]
+
+    def _resolve(self, name, image, key, params, memo):
+        if name == SOURCE:
+            return image, (SOURCE,)
+        if name in memo:
+            return memo[name]
+
+        stage = self.stages[name]
+        resolved = [self._resolve(dep, image, key, params, memo) for dep in stage.inputs]
+        stage_params = stage.resolve_params(params)
+        # A stage's identity covers its own parameters and everything upstream
+        signature = (name, tuple(sorted(stage_params.items())), tuple(sig for _, sig in resolved))
+
+        def run():
+            # Stages are the cancellation points of OpenCV pipelines
+            checkpoint()
+            args = [value for value, _ in resolved]
+            result = stage.func(*args, **stage_params)
+            if any(result is arg for arg in args):
+                # A stage that swallowed an error hands back its input; fail
+                # the render rather than cache the unstyled image as its output
+                raise RuntimeError(f"Stage '{name}' returned its input unchanged")
+            return result
+
+        value, hit = self.cache.compute((key, signature), run)
+        record_cache("stage", hit)
+        memo[name] = (value, signature)
+        return memo[name]
+
+
+# Shared cache for all Streamlit sessions in this process
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_stage_cache():
+    """Get the process-wide stage cache (created on first use)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StageCache()
+    return _cache
@@ -0,0 +1,137 @@
+"""
+Output Encoding - Format and quality per purpose (preview vs. paid download)
+Previews are shown in the browser after every render, so they use a fast
+lossy format; paid downloads stay lossless. Profiles are "format:quality"
+strings, e.g. "webp:80", "jpeg:90:progressive", "webp:lossless", "png:3".
+"""
+import io
+import os
+
+import cv2
+
+from utils.metrics import metrics, time_stage
+
+# Per-purpose profiles (override with TOONIFY_ENCODE_<PURPOSE>)
+ENCODE_PROFILES = {
+    'preview': os.environ.get("TOONIFY_ENCODE_PREVIEW", "jpeg:85"),
+    'download': os.environ.get("TOONIFY_ENCODE_DOWNLOAD", "png:3"),
+    'api': os.environ.get("TOONIFY_ENCODE_API", "png:3"),
+}
+
+# Quality used when a profile names only the format
+DEFAULT_QUALITY = {'png': 3, 'jpeg': 90, 'webp': 85, 'avif': 60}
+
+EXTENSIONS = {'png': ".png", 'jpeg': ".jpg", 'webp': ".webp", 'avif': ".avif"}
+MIME_TYPES = {'png': "image/png", 'jpeg': "image/jpeg", 'webp': "image/webp", 'avif': "image/avif"}
+_ALIASES = {'jpg': "jpeg", 'jpe': "jpeg"}
+
+
+def parse_profile(spec):
+    """'webp:80', 'jpeg:90:progressive', 'webp:lossless' -> options dict"""
+    parts = [p.strip().lower() for p in str(spec).split(":") if p.strip()]
+    fmt = _ALIASES.get(parts[0], parts[0]) if parts else "png"
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    options = {'format': fmt, 'quality': DEFAULT_QUALITY[fmt], 'lossless': False, 'progressive': False}
+    for part in parts[1:]:
+        if part.isdigit():
+            options['quality'] = int(part)
+        elif part in ("lossless", "progressive"):
+            options[part] = True
+        else:
+            raise ValueError(f"Unknown encoder option '{part}' in '{spec}'")
+    return options
+
+
+def profile_for(purpose):
+    """Encoder options for a purpose ('preview', 'download', 'api') or a profile string"""
+    return parse_profile(ENCODE_PROFILES.get(purpose, purpose))
+
+
+def encoder_format(path):
+    """Encoder format for a file extension, or None if the encoders don't write it"""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    fmt = _ALIASES.get(ext, ext)
+    return fmt if fmt in EXTENSIONS else None
+
+
+def format_for_path(path):
+    """Encoder format implied by a file extension (png if unknown)"""
+    return encoder_format(path) or "png"
+
+
+def avif_supported():
+    """Whether AVIF can be written by OpenCV or Pillow in this environment"""
+    if cv2.haveImageWriter(".avif"):
+        return True
+    try:
+        from PIL import features
+        return bool(features.check("avif"))
+    except Exception:
+        return False
+
+
+def _encode_avif(image, quality):
+    if hasattr(cv2, "IMWRITE_AVIF_QUALITY") and cv2.haveImageWriter(".avif"):
+        ok, buffer = cv2.imencode(".avif", image, [cv2.IMWRITE_AVIF_QUALITY, quality, cv2.IMWRITE_AVIF_SPEED, 8])
+        if ok:
+            return buffer.tobytes()
+    from PIL import Image
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.ndim == 3 else image
+    out = io.BytesIO()
+    Image.fromarray(rgb).save(out, format="AVIF", quality=quality, speed=8)
+    return out.getvalue()
+
+
+def encode(image, options):
+    """
+    Encode a BGR image.
+
+    options is a dict from parse_profile/profile_for (or a profile string).
+    Returns (bytes, format); AVIF falls back to WebP where unsupported.
+    """
+    if not isinstance(options, dict):
+        options = profile_for(options)
+    fmt, quality = options['format'], int(options['quality'])
+
+    if fmt == "avif" and not avif_supported():
+        print("⚠️ AVIF encoder not available; using WebP")
+        fmt, quality = "webp", DEFAULT_QUALITY['webp']
+
+    with time_stage("encode", image=image):
+        if fmt == "avif":
+            data = _encode_avif(image, quality)
+        else:
+            if fmt == "png":
+                params = [cv2.IMWRITE_PNG_COMPRESSION, min(9, max(0, quality))]
+            elif fmt == "jpeg":
+                params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+                if options.get('progressive'):
+                    params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+            else:
+                # OpenCV encodes WebP losslessly for quality > 100
+                params = [cv2.IMWRITE_WEBP_QUALITY, 101 if options.get('lossless') else quality]
+            ok, buffer = cv2.imencode(EXTENSIONS[fmt], image, params)
+            if not ok:
+                raise RuntimeError(f"Could not encode image as {fmt}")
+            data = buffer.tobytes()
+
+    metrics.inc("toonify_encoded_bytes_total", len(data), help_text="Bytes written by the output encoders",
+                format=fmt)
+    return data, fmt
+
+
+def write_image(image, base_path, purpose="download"):
+    """
+    Encode for a purpose and write to base_path + the format's extension.
+
+    Any extension on base_path is replaced. Returns the written path.
+    """
+    data, fmt = encode(image, profile_for(purpose))
+    path = os.path.splitext(base_path)[0] + EXTENSIONS[fmt]
+    dir_path = os.path.dirname(path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
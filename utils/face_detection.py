@@ -0,0 +1,153 @@
+"""
+Face Detection Service - Fast, cached face detection for face-only stylization
+Detection runs on a downscaled copy and boxes are mapped back to the original,
+so its cost no longer grows with the photo's resolution. Results are cached
+per input image. Backends: OpenCV Haar cascade (default) or an ONNX detector
+(UltraFace-style scores/boxes outputs) run with ONNX Runtime.
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+from utils.effect_graph import image_key
+from utils.metrics import record_cache
+from utils.runtime_config import create_onnx_session
+
+FACE_DETECTOR = os.environ.get("TOONIFY_FACE_DETECTOR", "haar").lower()
+FACE_MODEL_PATH = os.environ.get("TOONIFY_FACE_MODEL", os.path.join("anime_models", "face_detector.onnx"))
+# Longest side of the copy the Haar cascade runs on
+FACE_DETECT_MAX_SIDE = int(os.environ.get("TOONIFY_FACE_DETECT_MAX_SIDE", 640))
+FACE_MIN_CONFIDENCE = float(os.environ.get("TOONIFY_FACE_MIN_CONFIDENCE", 0.5))
+FACE_CACHE_SIZE = int(os.environ.get("TOONIFY_FACE_CACHE_SIZE", 256))
+
+# box is (x1, y1, x2, y2) in original image coordinates, confidence is 0..1
+Face = namedtuple("Face", ["box", "confidence"])
+
+
+class HaarBackend:
+    """OpenCV Haar cascade on a downscaled grayscale copy"""
+
+    name = "haar"
+
+    def __init__(self, max_side=FACE_DETECT_MAX_SIDE):
+        self.max_side = max_side
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    def detect(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        scale = min(1.0, self.max_side / max(gray.shape[:2]))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        boxes, _, weights = self.cascade.detectMultiScale3(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24), outputRejectLevels=True
+        )
+        faces = []
+        for (x, y, w, h), weight in zip(boxes, np.ravel(weights)):
+            # Stage weight of the final cascade stage, squashed to 0..1
+            confidence = float(1.0 / (1.0 + np.exp(-weight)))
+            box = tuple(int(round(v / scale)) for v in (x, y, x + w, y + h))
+            faces.append(Face(box, confidence))
+        return faces
+
+
+class OnnxBackend:
+    """
+    ONNX face detector with UltraFace-style outputs.
+
+    The model takes a 1x3xHxW RGB tensor normalized to (x - 127) / 128 and
+    returns scores (1, N, 2) and normalized corner boxes (1, N, 4).
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=FACE_MODEL_PATH, nms_threshold=0.3):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Face model not found: {model_path}")
+        self.session = create_onnx_session(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+        shape = self.session.get_inputs()[0].shape
+        self.height = shape[2] if isinstance(shape[2], int) else 240
+        self.width = shape[3] if isinstance(shape[3], int) else 320
+        self.nms_threshold = nms_threshold
+
+    def detect(self, image):
+        h, w = image.shape[:2]
+        inp = cv2.resize(image, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        inp = cv2.cvtColor(inp, cv2.COLOR_BGR2RGB).astype(np.float32)
+        inp = ((inp - 127.0) / 128.0).transpose(2, 0, 1)[None]
+        scores, boxes = self.session.run(None, {self.input_name: inp})[:2]
+
+        scores = scores[0, :, 1]
+        keep = scores >= FACE_MIN_CONFIDENCE
+        scores = scores[keep]
+        boxes = boxes[0][keep] * np.array([w, h, w, h], np.float32)
+        rects = [[float(x1), float(y1), float(x2 - x1), float(y2 - y1)] for x1, y1, x2, y2 in boxes]
+        indices = cv2.dnn.NMSBoxes(rects, scores.tolist(), FACE_MIN_CONFIDENCE, self.nms_threshold)
+
+        faces = []
+        for i in np.ravel(indices):
+            x1, y1, x2, y2 = boxes[i]
+            box = (max(int(x1), 0), max(int(y1), 0), min(int(x2), w), min(int(y2), h))
+            faces.append(Face(box, float(scores[i])))
+        return faces
+
+
+class FaceDetector:
+    """Face detection with a per-image LRU cache of results"""
+
+    def __init__(self, backend=FACE_DETECTOR, cache_size=FACE_CACHE_SIZE):
+        self.backend = self._create_backend(backend)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _create_backend(backend):
+        if backend == "onnx":
+            try:
+                detector = OnnxBackend()
+                print(f"✅ ONNX face detector loaded from {FACE_MODEL_PATH}")
+                return detector
+            except Exception as e:
+                print(f"⚠️ ONNX face detector unavailable ({e}); using Haar cascade")
+        return HaarBackend()
+
+    def detect(self, image, min_confidence=FACE_MIN_CONFIDENCE):
+        """All faces in a BGR image, most confident first"""
+        key = image_key(image)
+        with self._lock:
+            faces = self._cache.get(key)
+            if faces is not None:
+                self._cache.move_to_end(key)
+        record_cache("faces", hit=faces is not None)
+
+        if faces is None:
+            faces = sorted(self.backend.detect(image), key=lambda f: f.confidence, reverse=True)
+            with self._lock:
+                self._cache[key] = faces
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [f for f in faces if f.confidence >= min_confidence]
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_face_detector():
+    """Get the process-wide face detector (created on first use)"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = FaceDetector()
+    return _detector
+
+
+def detect_faces(image, min_confidence=FACE_MIN_CONFIDENCE):
+    """Detected faces as Face(box, confidence), most confident first"""
+    return get_face_detector().detect(image, min_confidence)
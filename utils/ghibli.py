@@ -1,31 +1,43 @@
 import cv2
 import numpy as np
-import onnxruntime as ort
+import os
 
-MODEL_PATH = "anime_models\Ghibli.onnx"
+from utils.inference_server import get_inference_server
+from utils.runtime_config import create_onnx_session
+from utils.metrics import time_stage, record_cache
+from utils.roi import regions_from_boxes, stylize_regions
+from utils.face_detection import get_face_detector
 
-session = ort.InferenceSession(
-    MODEL_PATH,
-    providers=["CPUExecutionProvider"]
-)
+MODEL_PATH = os.path.join("anime_models", "Ghibli.onnx")
 
-# Optional: Face Detection (if you want face-only editing)
-face_cascade = cv2.CascadeClassifier(
-    cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-)
+# Loaded lazily so importing this module does not require the model
+session = None
+
+
+def load_model():
+    """Load ONNX model once"""
+    global session
+    record_cache("model", hit=session is not None)
+    if session is None:
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(f"Model not found: {MODEL_PATH}")
+        session = create_onnx_session(MODEL_PATH)
+        print(f"✅ Ghibli model loaded from {MODEL_PATH}")
+    return session
+
+def detect_faces(img):
+    """Detect all faces and return their (x1, y1, x2, y2) boxes, most confident first."""
+    return [face.box for face in get_face_detector().detect(img)]
 
 
 def detect_face(img):
     """Detect face and return bounding box."""
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(
-        gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-    )
-
-    if len(faces) == 0:
+    faces = detect_faces(img)
+    if not faces:
         return None
 
-    x, y, w, h = faces[0]
+    x, y, x2, y2 = faces[0]
+    w, h = x2 - x, y2 - y
     pad = int(0.3 * h)
     x1 = max(x - pad, 0)
     y1 = max(y - pad, 0)
@@ -51,34 +63,31 @@ def postprocess(output, original_size):
 
 
 
+def _stylize(img, model):
+    """Run the model on a whole BGR image (or crop)"""
+    original_size = (img.shape[1], img.shape[0])
+    with time_stage("preprocess", "Ghibli Style", img):
+        inp = preprocess(img)
+    with time_stage("inference", "Ghibli Style", img):
+        out = get_inference_server().run("Ghibli", model, inp)
+    with time_stage("postprocess", "Ghibli Style", img):
+        return postprocess(out, original_size)
+
+
 def apply_ghibli_style(img, face_only=False):
     """
     Apply Ghibli Anime Style.
-    face_only=True  → Modify only face
+    face_only=True  → Modify only faces (every detected face, feathered in)
     face_only=False → Convert full image
     """
+    model = load_model()
 
     if not face_only:
         # Full image conversion (recommended)
-        original_size = (img.shape[1], img.shape[0])
-        inp = preprocess(img)
-        out = session.run(None, {session.get_inputs()[0].name: inp})[0]
-        output = postprocess(out, original_size)
-        return output
+        return _stylize(img, model)
 
-    # Face-only mode
-    face_box = detect_face(img)
-    if face_box is None:
+    # Face-only mode: stylize the padded face crops only
+    faces = detect_faces(img)
+    if not faces:
         return img
-
-    x1, y1, x2, y2 = face_box
-    face = img[y1:y2, x1:x2]
-    original_size = (face.shape[1], face.shape[0])
-
-    inp = preprocess(face)
-    out = session.run(None, {session.get_inputs()[0].name: inp})[0]
-    anime_face = postprocess(out, original_size)
-
-    result = img.copy()
-    result[y1:y2, x1:x2] = anime_face
-    return result
\ No newline at end of file
+    return stylize_regions(img, regions_from_boxes(img.shape, faces), lambda face: _stylize(face, model))
@@ -6,13 +6,45 @@ import cv2
 import numpy as np
 from PIL import Image
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import individual style processors
 from utils.Hayao import apply_hayao_style
 from utils.Shinkai import apply_shinkai_style
 from utils.Paprika import apply_paprika_style
-from utils.cartoon import apply_cartoon_filter
+from utils.cartoon import cartoon_smooth, cartoon_quantize, cartoon_edges, cartoon_compose
 from utils.ghibli import apply_ghibli_style
+from utils.inference_server import get_inference_server
+from utils.runtime_config import get_runtime_config
+from utils.metrics import time_stage, resolution_bucket
+from utils.memory_profiler import MEMORY_PROFILE_ENABLED, MemoryProfiler, record_memory_report
+from utils.profiling import profiled
+from utils.smoothing import edge_preserving_smooth
+from utils.effect_graph import EffectGraph, StageCache, image_key
+from utils.blending import blend_strength
+from utils.color_lut import apply_look
+from utils.roi import regions_from_boxes, regions_from_mask, stylize_regions
+from utils.face_detection import get_face_detector
+from utils.encoding import encode, encoder_format, parse_profile, profile_for
+from utils.cancellation import RenderCancelledError, submit_in_context
+
+# Longest side of "Preview all styles" thumbnails and how many render at once
+PREVIEW_MAX_SIDE = int(os.environ.get("TOONIFY_PREVIEW_MAX_SIDE", 384))
+# (never more than TOONIFY_CORES_PER_REQUEST, the share of the one slot they use)
+PREVIEW_WORKERS = int(os.environ.get("TOONIFY_PREVIEW_WORKERS", 0))
+
+# Effect parameters exposed as sliders in the editor
+EFFECT_PARAMETERS = {
+    "Classic Cartoon": {
+        'k_colors': {'label': "Colors", 'min': 2, 'max': 16, 'default': 6, 'step': 1},
+        'edge': {'label': "Outline strength", 'min': 0, 'max': 250, 'default': 30, 'step': 10},
+        'blur': {'label': "Smoothing passes", 'min': 1, 'max': 4, 'default': 1, 'step': 1},
+    },
+    "Oil Painting": {
+        'edge_low': {'label': "Edge sensitivity", 'min': 30, 'max': 200, 'default': 110, 'step': 10},
+        'edge_high': {'label': "Edge threshold", 'min': 100, 'max': 300, 'default': 210, 'step': 10},
+    },
+}
 
 class ImageProcessor:
 
@@ -20,6 +52,9 @@ class ImageProcessor:
         """Initialize image processor with available effects"""
         print("🔄 Initializing Image Processor...")
         
+        # Apply the shared OpenCV / ONNX Runtime / PyTorch threading policy
+        self.runtime_config = get_runtime_config()
+        
         # Check which ONNX models are available
         self.onnx_styles = {
             "Hayao": "anime_models/Hayao.onnx",
@@ -44,17 +79,74 @@ class ImageProcessor:
             print(f"  ⚠️ Missing Ghibli model at {ghibli_path}")
         
         print(f"✅ Image Processor initialized with {len(self.available_onnx) + (1 if self.ghibli_available else 0)} AI models")
+        
+        # Effects as a graph of memoized stages shared between styles
+        self.graph = self.build_effect_graph()
+        # Video frames are never seen twice, so they skip the stage cache
+        self.frame_graph = self.build_effect_graph(StageCache(max_mb=0))
+    
+    @classmethod
+    def build_effect_graph(cls, cache=None):
+        """Stage graph for every effect; shared stages are computed once per image"""
+        graph = EffectGraph(cache)
+        
+        # Shared building blocks
+        graph.add_stage("gray", cls._to_gray)
+        
+        # OpenCV effects
+        graph.add_stage("sketch", cls._sketch_from_gray, inputs=("gray",))
+        graph.add_stage("pencil_color", cls.pencil_color_effect)
+        graph.add_stage("oil_smooth", cls._oil_smooth)
+        graph.add_stage("oil_edges", cls._oil_edges, inputs=("gray",), defaults={'edge_low': 110, 'edge_high': 210})
+        graph.add_stage("oil_painting", cls._oil_compose, inputs=("oil_smooth", "oil_edges"))
+        graph.add_stage("cartoon_smooth", cartoon_smooth, defaults={'blur': 1})
+        graph.add_stage("cartoon_colors", cartoon_quantize, inputs=("cartoon_smooth",), defaults={'k_colors': 6})
+        graph.add_stage("cartoon_edges", cartoon_edges, inputs=("gray",), defaults={'edge': 30, 'blur': 1})
+        graph.add_stage("cartoon", cartoon_compose, inputs=("cartoon_colors", "cartoon_edges"))
+        
+        # AI styles are a single stage each
+        graph.add_stage("hayao", apply_hayao_style)
+        graph.add_stage("shinkai", apply_shinkai_style)
+        graph.add_stage("paprika", apply_paprika_style)
+        graph.add_stage("ghibli", apply_ghibli_style)
+        
+        for effect, stage in [("Hayao", "hayao"), ("Shinkai", "shinkai"), ("Paprika", "paprika"),
+                              ("Ghibli Style", "ghibli"), ("Classic Cartoon", "cartoon"),
+                              ("Sketch", "sketch"), ("Pencil Color", "pencil_color"),
+                              ("Oil Painting", "oil_painting")]:
+            graph.add_effect(effect, stage)
+        return graph
+    
+    @staticmethod
+    def _to_gray(image):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
+    @staticmethod
+    def _sketch_from_gray(img_gray):
+        img_invert = cv2.bitwise_not(img_gray)
+        img_blur = cv2.GaussianBlur(img_invert, (25, 25), 0)
+        img_blend = cv2.bitwise_not(img_blur)
+        sketch = cv2.divide(img_gray, img_blend, scale=256.0)
+        return cv2.cvtColor(sketch, cv2.COLOR_GRAY2BGR)
+    
+    @staticmethod
+    def _oil_smooth(image):
+        return edge_preserving_smooth(image, 19, 86, 88, effect="Oil Painting")
+    
+    @staticmethod
+    def _oil_edges(gray, edge_low=110, edge_high=210):
+        return cv2.Canny(gray, edge_low, edge_high)
+    
+    @staticmethod
+    def _oil_compose(smooth, edges):
+        edges = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+        return cv2.addWeighted(smooth, 1.9, edges, 0.9, 0.5)
     
     @staticmethod
     def sketch_effect(image):
         """Pencil sketch effect"""
         try:
-            img_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            img_invert = cv2.bitwise_not(img_gray)
-            img_blur = cv2.GaussianBlur(img_invert, (25, 25), 0)
-            img_blend = cv2.bitwise_not(img_blur)
-            sketch = cv2.divide(img_gray, img_blend, scale=256.0)
-            return cv2.cvtColor(sketch, cv2.COLOR_GRAY2BGR)
+            return ImageProcessor._sketch_from_gray(ImageProcessor._to_gray(image))
         except Exception as e:
             print(f"Error in sketch_effect: {e}")
             return image
@@ -75,79 +167,211 @@ class ImageProcessor:
     def oil_painting_effect(image):
         """Oil painting effect"""
         try:
-            smooth = cv2.bilateralFilter(image, 19, 86, 88)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray, 110, 210)
-            edges = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
-            return cv2.addWeighted(smooth, 1.9, edges, 0.9, 0.5)
+            edges = ImageProcessor._oil_edges(ImageProcessor._to_gray(image))
+            return ImageProcessor._oil_compose(ImageProcessor._oil_smooth(image), edges)
         except Exception as e:
             print(f"Error in oil_painting_effect: {e}")
             return image
     
-    def process_image(self, image, effect_type):
-        """Process image with specified effect"""
+    def process_image(self, image, effect_type, params=None, strength=1.0, preserve_detail=False, look=None,
+                      roi=None):
+        """
+        Process image with specified effect
+        
+        params overrides effect parameters (see EFFECT_PARAMETERS); stages
+        that don't depend on a changed parameter are served from the cache.
+        strength < 1 blends the (cached) stylized result with the original,
+        and look applies a color-grading LUT as the final step.
+        roi limits the effect to regions: "faces", a list of (x1, y1, x2, y2)
+        boxes or a mask the size of the image (see resolve_regions).
+        """
         try:
             # Convert PIL Image to OpenCV format if needed
             if isinstance(image, Image.Image):
-                image = np.array(image)
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            
-            # ONNX Anime Styles
-            if effect_type == "Hayao" and "Hayao" in self.available_onnx:
-                return apply_hayao_style(image)
-            
-            elif effect_type == "Shinkai" and "Shinkai" in self.available_onnx:
-                return apply_shinkai_style(image)
+                with time_stage("decode", effect_type, resolution=resolution_bucket(shape=image.size[::-1])):
+                    image = np.array(image)
+                    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
             
-            elif effect_type == "Paprika" and "Paprika" in self.available_onnx:
-                return apply_paprika_style(image)
-            
-            elif effect_type == "Ghibli Style" and self.ghibli_available:
-                return apply_ghibli_style(image)
-            
-            # OpenCV Effects
-            elif effect_type == "Classic Cartoon":
-                return apply_cartoon_filter(image)
-            
-            elif effect_type == "Sketch":
-                return self.sketch_effect(image)
-            
-            elif effect_type == "Pencil Color":
-                return self.pencil_color_effect(image)
-            
-            elif effect_type == "Oil Painting":
-                return self.oil_painting_effect(image)
-            
-            else:
-                print(f"⚠️ Effect '{effect_type}' not available or models missing")
-                return image
+            # Bound concurrent work so thread pools don't oversubscribe the CPU
+            with profiled("image", effect=effect_type, shape=getattr(image, "shape", None)), \
+                    self.runtime_config.processing_slot():
+                if MEMORY_PROFILE_ENABLED:
+                    with MemoryProfiler(effect_type) as profiler:
+                        with time_stage("effect", effect_type, image):
+                            result = self._apply_effect(image, effect_type, params, strength, preserve_detail, look, roi)
+                    record_memory_report(profiler.report, effect_type, image)
+                    return result
+                
+                with time_stage("effect", effect_type, image):
+                    return self._apply_effect(image, effect_type, params, strength, preserve_detail, look, roi)
                 
+        except RenderCancelledError:
+            # Cancelled or past its deadline; the caller decides what to show
+            raise
         except Exception as e:
             print(f"❌ Error processing image with {effect_type}: {e}")
             import traceback
             traceback.print_exc()
             return image
     
+    def render_frame(self, frame, effect_type, params=None, strength=1.0, preserve_detail=False, look=None):
+        """
+        Render one video frame.
+        
+        Unlike process_image this takes no processing slot (the caller holds
+        one for the whole clip) and bypasses the stage cache.
+        """
+        return self._apply_effect(frame, effect_type, params, strength, preserve_detail, look, graph=self.frame_graph)
+    
+    def _apply_effect(self, image, effect_type, params=None, strength=1.0, preserve_detail=False, look=None,
+                      roi=None, graph=None):
+        """Render a BGR image through the effect graph"""
+        if not self.is_available(effect_type):
+            print(f"⚠️ Effect '{effect_type}' not available or models missing")
+            return image
+        graph = graph or self.graph
+        if roi is None:
+            result = graph.render(image, effect_type, params)
+        else:
+            regions = self.resolve_regions(image, roi)
+            if not regions:
+                print(f"⚠️ No regions found for {effect_type}; returning the original")
+                return image
+            # Only the padded crops are rendered
+            result = stylize_regions(image, regions, lambda crop: graph.render(crop, effect_type, params))
+        if strength < 1.0 or preserve_detail:
+            with time_stage("blend", effect_type, image):
+                result = blend_strength(image, result, strength, preserve_detail)
+        if look:
+            with time_stage("color_grade", effect_type, image):
+                result = apply_look(result, look)
+        return result
+    
+    @staticmethod
+    def resolve_regions(image, roi):
+        """
+        Padded, feathered crops for a region spec.
+        
+        roi is "faces" (detected faces), a list of (x1, y1, x2, y2) boxes or
+        a mask with the image's height and width (nonzero = stylize).
+        """
+        if isinstance(roi, str):
+            if roi != "faces":
+                raise ValueError(f"Unknown region spec: {roi}")
+            with time_stage("face_detect", image=image):
+                boxes = [face.box for face in get_face_detector().detect(image)]
+            return regions_from_boxes(image.shape, boxes)
+        if isinstance(roi, np.ndarray) and roi.ndim == 2 and roi.shape == image.shape[:2]:
+            return regions_from_mask(roi)
+        return regions_from_boxes(image.shape, [tuple(int(v) for v in box) for box in roi])
+    
+    @staticmethod
+    def get_effect_parameters(effect_type):
+        """Slider specs for an effect's tunable parameters (empty if none)"""
+        return EFFECT_PARAMETERS.get(effect_type, {})
+    
+    @staticmethod
+    def default_effect_params(effect_type):
+        """Default value of every tunable parameter of an effect"""
+        return {name: spec['default'] for name, spec in EFFECT_PARAMETERS.get(effect_type, {}).items()}
+    
+    @staticmethod
+    def validate_effect_params(effect_type, params):
+        """Check client-supplied parameters against the effect's specs (raises ValueError)"""
+        if not isinstance(params, dict):
+            raise ValueError("params must be a JSON object")
+        specs = EFFECT_PARAMETERS.get(effect_type, {})
+        for name, value in params.items():
+            spec = specs.get(name)
+            if spec is None:
+                known = ", ".join(specs) or "none"
+                raise ValueError(f"Unknown parameter '{name}' for {effect_type} (known: {known})")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Parameter '{name}' must be a number")
+            # Also rejects NaN and infinities
+            if not spec['min'] <= value <= spec['max']:
+                raise ValueError(f"Parameter '{name}' must be between {spec['min']} and {spec['max']}")
+            if (value - spec['min']) % spec['step']:
+                raise ValueError(f"Parameter '{name}' must be {spec['min']} plus a multiple of {spec['step']}")
+        return params
+    
+    @staticmethod
+    def thumbnail(image, max_side=PREVIEW_MAX_SIDE):
+        """Downscale so the longest side is at most max_side"""
+        scale = max_side / max(image.shape[:2])
+        if scale >= 1:
+            return image
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    def preview_all(self, image, effects=None, max_side=PREVIEW_MAX_SIDE):
+        """
+        Render effects at thumbnail resolution concurrently.
+        
+        Yields (effect, preview) as each one finishes; preview is None if the
+        effect failed. The whole pass occupies a single processing slot.
+        """
+        effects = [e for e in (effects or self.get_available_effects()) if self.is_available(e)]
+        if not effects:
+            return
+        thumb = self.thumbnail(image, max_side)
+        key = image_key(thumb)
+        
+        def render(effect):
+            try:
+                with time_stage("preview", effect, thumb):
+                    return self.graph.render(thumb, effect, key=key)
+            except RenderCancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Preview failed for {effect}: {e}")
+                return None
+        
+        # One slot, so the pass stays within that slot's share of cores
+        workers = self.runtime_config.fan_out_workers(len(effects), PREVIEW_WORKERS)
+        with self.runtime_config.processing_slot(), ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {submit_in_context(pool, render, effect): effect for effect in effects}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    
+    def is_available(self, effect_type):
+        """Whether an effect can be rendered (AI styles need their model)"""
+        return effect_type in self.get_available_effects()
+    
     @staticmethod
-    def save_image(image, path):
-        """Save image to disk"""
+    def save_image(image, path, purpose=None):
+        """Save image to disk (format from the extension, quality from the purpose's profile)"""
         try:
             # Create directory if it doesn't exist
             dir_path = os.path.dirname(path)
             if dir_path and not os.path.exists(dir_path):
                 os.makedirs(dir_path, exist_ok=True)
             
-            # Save image
-            success = cv2.imwrite(path, image)
-            if success:
+            fmt = encoder_format(path)
+            if fmt is None:
+                # e.g. .bmp or .tiff: let OpenCV pick the writer from the extension
+                if not cv2.imwrite(path, image):
+                    raise RuntimeError(f"No writer for {path}")
                 print(f"✅ Image saved: {path}")
-            else:
-                print(f"❌ Failed to save image: {path}")
-            return success
+                return True
+            options = parse_profile(fmt)
+            if purpose:
+                profile = profile_for(purpose)
+                if profile['format'] == options['format']:
+                    options = profile
+            data, _ = encode(image, options)
+            with open(path, 'wb') as f:
+                f.write(data)
+            print(f"✅ Image saved: {path}")
+            return True
         except Exception as e:
             print(f"Error saving image: {e}")
             return False
     
+    @staticmethod
+    def get_inference_stats():
+        """Get batch size metrics from the shared inference server"""
+        return get_inference_server().get_stats()
+    
     def get_available_effects(self):
         """Get list of all available effects"""
         effects = []
@@ -0,0 +1,314 @@
+"""
+Micro-batching Inference Server
+Collects concurrent ONNX requests per (style, shape bucket) for a few
+milliseconds and runs them as a single batched session.run call
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.metrics import metrics
+from utils.cancellation import current_token
+from utils.runtime_config import get_runtime_config
+
+# Tunable knobs (can be overridden with environment variables)
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("TOONIFY_MAX_BATCH_SIZE", 4))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("TOONIFY_MAX_BATCH_WAIT_MS", 10))
+DEFAULT_BUCKET_SIZE = int(os.environ.get("TOONIFY_BATCH_BUCKET_SIZE", 64))
+# Concurrent session.run calls (batches); 0 = TOONIFY_CONCURRENT_SLOTS
+DEFAULT_MAX_CONCURRENT = int(os.environ.get("TOONIFY_INFERENCE_CONCURRENCY", 0))
+
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+
+class _PendingRequest:
+    """A single caller waiting for its slice of a batched result"""
+
+    def __init__(self, tensor, original_hw, token=None):
+        self.tensor = tensor
+        self.original_hw = original_hw
+        self.token = token
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class InferenceServer:
+    """
+    In-process batching server for NHWC AnimeGAN ONNX sessions.
+
+    At most max_concurrent session.run calls run at once. A caller that
+    finds a free runner and no queue for its (style, bucket) runs straight
+    away, unpadded. Otherwise it queues, and the first caller in the queue
+    becomes the batch leader: it waits up to max_wait_ms for more requests
+    (or until max_batch_size is reached) and for a free runner, runs one
+    batched session.run and scatters the outputs back to the waiting callers.
+    So requests batch up exactly when inference is the bottleneck.
+    """
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 bucket_size=DEFAULT_BUCKET_SIZE, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.bucket_size = max(1, int(bucket_size))
+        # Same CPU budget as the processing slots the callers lend out
+        self.max_concurrent = max(1, int(max_concurrent or get_runtime_config().concurrent_slots))
+        self._running = threading.BoundedSemaphore(self.max_concurrent)
+
+        self._cond = threading.Condition()
+        self._queues = defaultdict(list)
+        self._leaders = set()
+        self._unbatchable = set()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = defaultdict(int)
+        self._requests_served = 0
+        self._batches_run = 0
+
+    def bucket_shape(self, height, width):
+        """Round a spatial shape up to the nearest bucket multiple"""
+        b = self.bucket_size
+        return ((height + b - 1) // b) * b, ((width + b - 1) // b) * b
+
+    def _pad_to_bucket(self, tensor):
+        """Edge-pad a (1, H, W, C) tensor up to its bucket shape"""
+        h, w = tensor.shape[1:3]
+        bh, bw = self.bucket_shape(h, w)
+        if (bh, bw) != (h, w):
+            tensor = np.pad(tensor, ((0, 0), (0, bh - h), (0, bw - w), (0, 0)), mode="edge")
+        return tensor, (h, w)
+
+    def run(self, style, session, tensor):
+        """
+        Run inference for one (1, H, W, C) tensor, batched with concurrent callers.
+
+        Args:
+            style: Style name used to group requests (one session per style)
+            session: onnxruntime.InferenceSession for that style
+            tensor: Float32 NHWC tensor with batch size 1
+
+        Returns:
+            Model output (1, H', W', C) cropped back to the caller's shape
+
+        The current cancel token (utils.cancellation) is honoured while
+        queued and, for single-request batches, inside session.run. The
+        caller's processing slot is lent out meanwhile (see
+        RuntimeConfig.slot_released): with slots held for the whole render,
+        no more than concurrent_slots requests could ever meet here.
+        """
+        token = current_token()
+        with get_runtime_config().slot_released():
+            return self._run(style, session, tensor, token)
+
+    def _run(self, style, session, tensor, token):
+        if self.max_batch_size == 1 or style in self._unbatchable:
+            with self._runner(token):
+                self._record_batch(1)
+                return self._run_session(session, tensor, token)
+
+        key = (style,) + self.bucket_shape(*tensor.shape[1:3])
+        with self._cond:
+            alone = not self._queues[key] and key not in self._leaders and self._running.acquire(blocking=False)
+        if alone:
+            # A free runner and nobody to batch with: skip the padding and the batch wait
+            try:
+                self._record_batch(1)
+                return self._run_session(session, tensor, token)
+            finally:
+                self._release_runner()
+
+        padded, original_hw = self._pad_to_bucket(tensor)
+        request = _PendingRequest(padded, original_hw, token)
+
+        batch = None
+        with self._cond:
+            queue = self._queues[key]
+            queue.append(request)
+            self._record_queue_depth(style)
+            self._cond.notify_all()
+
+            while not request.done:
+                if queue and queue[0] is request and key not in self._leaders:
+                    # Become the leader for this bucket and gather a batch
+                    self._leaders.add(key)
+                    try:
+                        batch = self._gather(queue, request, token)
+                    finally:
+                        # The next leader may gather while this batch runs
+                        self._leaders.discard(key)
+                        self._record_queue_depth(style)
+                        self._cond.notify_all()
+                    break
+                # Waiters with a token wake up periodically to notice cancellation
+                self._cond.wait(0.1 if token is not None else None)
+                if token is not None and token.cancelled and request in queue:
+                    queue.remove(request)
+                    self._record_queue_depth(style)
+                    token.check()
+
+        if batch is not None:
+            try:
+                self._execute_batch(style, session, batch)
+            finally:
+                self._release_runner()
+                with self._cond:
+                    for item in batch:
+                        item.done = True
+                    self._cond.notify_all()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _gather(self, queue, request, token):
+        """Wait for more requests and a free runner, then take a batch (lock held)"""
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(queue) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        # While every runner is busy, more requests keep joining the queue
+        while not self._running.acquire(blocking=False):
+            self._cond.wait(0.05)
+            if token is not None and token.cancelled:
+                queue.remove(request)
+                token.check()
+        batch = queue[:self.max_batch_size]
+        del queue[:self.max_batch_size]
+        return batch
+
+    @contextmanager
+    def _runner(self, token):
+        """Hold one of the max_concurrent session.run permits"""
+        while not self._running.acquire(timeout=0.1):
+            if token is not None:
+                token.check()
+        try:
+            yield
+        finally:
+            self._release_runner()
+
+    def _release_runner(self):
+        self._running.release()
+        # Wake a leader waiting for a runner
+        with self._cond:
+            self._cond.notify_all()
+
+    def _execute_batch(self, style, session, batch):
+        """Run one batched session call and scatter results to callers"""
+        # Requests cancelled while queued are dropped from the batch
+        live = []
+        for item in batch:
+            try:
+                if item.token is not None:
+                    item.token.check()
+                live.append(item)
+            except Exception as e:
+                item.error = e
+        batch = live
+        if not batch:
+            return
+        try:
+            if len(batch) == 1:
+                outputs = [self._run_session(session, batch[0].tensor, batch[0].token)]
+                self._record_batch(1)
+            else:
+                stacked = np.concatenate([item.tensor for item in batch], axis=0)
+                try:
+                    output = self._run_session(session, stacked)
+                    outputs = [output[i:i + 1] for i in range(len(batch))]
+                    self._record_batch(len(batch))
+                except Exception as e:
+                    if self._is_batch_dimension_error(e):
+                        # Model exported with a fixed batch dimension of 1
+                        print(f"⚠️ {style}: batched inference unsupported ({e}), falling back to batch size 1")
+                        self._unbatchable.add(style)
+                    else:
+                        # Possibly transient (e.g. out of memory); retry one at a time
+                        print(f"⚠️ {style}: batched inference failed ({e}), retrying requests one at a time")
+                    outputs = []
+                    for item in batch:
+                        outputs.append(self._run_session(session, item.tensor))
+                        self._record_batch(1)
+
+            for item, output in zip(batch, outputs):
+                item.result = self._crop(output, item.tensor.shape[1:3], item.original_hw)
+        except Exception as e:
+            for item in batch:
+                item.error = e
+
+    @staticmethod
+    def _is_batch_dimension_error(error):
+        """True if ORT rejected the batched input's shape"""
+        message = str(error).lower()
+        return type(error).__name__ == "InvalidArgument" and ("dimension" in message or "shape" in message)
+
+    @staticmethod
+    def _run_session(session, tensor, token=None):
+        """Run the session with its first input/output, terminated if token is cancelled"""
+        input_name = session.get_inputs()[0].name
+        output_name = session.get_outputs()[0].name
+        if token is None:
+            return session.run([output_name], {input_name: tensor})[0]
+        with token.run_options() as run_options:
+            return session.run([output_name], {input_name: tensor}, run_options)[0]
+
+    @staticmethod
+    def _crop(output, padded_hw, original_hw):
+        """Crop padding away, scaling in case the model changes resolution"""
+        ph, pw = padded_hw
+        oh, ow = original_hw
+        if (ph, pw) == (oh, ow):
+            return output
+        out_h = int(round(oh * output.shape[1] / ph))
+        out_w = int(round(ow * output.shape[2] / pw))
+        return output[:, :out_h, :out_w, :]
+
+    def _record_queue_depth(self, style):
+        """Publish how many requests are waiting for this style (lock held)"""
+        depth = sum(len(q) for (s, _, _), q in self._queues.items() if s == style)
+        metrics.set_gauge("toonify_inference_queue_depth", depth,
+                          help_text="Requests waiting to be batched", style=style)
+
+    def _record_batch(self, size):
+        with self._stats_lock:
+            self._batch_sizes[size] += 1
+            self._batches_run += 1
+            self._requests_served += size
+        metrics.observe("toonify_inference_batch_size", size,
+                        help_text="Achieved inference batch size",
+                        buckets=BATCH_SIZE_BUCKETS)
+
+    def get_stats(self):
+        """Return achieved batch size metrics"""
+        with self._stats_lock:
+            avg = self._requests_served / self._batches_run if self._batches_run else 0.0
+            return {
+                'requests_served': self._requests_served,
+                'batches_run': self._batches_run,
+                'avg_batch_size': round(avg, 2),
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'max_concurrent': self.max_concurrent,
+            }
+
+
+# Shared server instance for all Streamlit sessions in this process
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_inference_server():
+    """Get the process-wide inference server (created on first use)"""
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                _server = InferenceServer()
+    return _server
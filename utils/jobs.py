@@ -0,0 +1,132 @@
+"""
+Job Queue - Background processing jobs for the HTTP API
+Jobs run on a bounded worker pool; submissions beyond the queue limit are
+rejected instead of piling up. Each job carries a cancel token with a
+deadline, so cancelled or overdue jobs stop mid-render. Finished jobs (and
+their result files) expire after a TTL.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import metrics
+from utils.cancellation import CancelToken, RenderCancelledError, cancel_scope, record_cancelled
+
+JOB_WORKERS = int(os.environ.get("TOONIFY_API_WORKERS", 2))
+# Queued + running jobs accepted before new submissions get HTTP 503
+JOB_MAX_PENDING = int(os.environ.get("TOONIFY_API_MAX_PENDING", 16))
+JOB_RESULT_TTL = int(os.environ.get("TOONIFY_API_RESULT_TTL", 3600))
+# Seconds from submission until a job is stopped, queue time included
+JOB_TIMEOUT = float(os.environ.get("TOONIFY_API_JOB_TIMEOUT", 300))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """One unit of work; func() returns the path of the result file"""
+
+    def __init__(self, func, timeout=JOB_TIMEOUT, **info):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.token = CancelToken(timeout)
+        self.info = info
+        self.status = QUEUED
+        self.error = None
+        self.result_path = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        data = {'id': self.id, 'status': self.status, 'created': self.created,
+                'started': self.started, 'finished': self.finished, **self.info}
+        if self.error:
+            data['error'] = self.error
+        if self.started and self.finished:
+            data['seconds'] = round(self.finished - self.started, 3)
+        return data
+
+
+class JobQueue:
+    """Runs jobs on a fixed worker pool and keeps their status for polling"""
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, ttl=JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="toonify-job")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, timeout=JOB_TIMEOUT, **info):
+        """Queue func() as a job stopped after timeout seconds; raises QueueFullError when at capacity"""
+        self.expire()
+        job = Job(func, timeout, **info)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"{self._pending} jobs pending")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._record_depth()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the job, or None if unknown"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in (QUEUED, RUNNING):
+            job.token.cancel()
+        return job
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            with cancel_scope(job.token):
+                # Cancelled or expired while still queued
+                job.token.check()
+                job.result_path = job.func()
+            job.status = DONE
+        except RenderCancelledError as e:
+            job.error = str(e)
+            job.status = CANCELLED
+            record_cancelled("api", job.token)
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job.func = None
+            with self._lock:
+                self._pending -= 1
+                self._record_depth()
+            metrics.inc("toonify_api_jobs_total", help_text="API jobs by final status", status=job.status)
+
+    def expire(self):
+        """Forget finished jobs older than the TTL and delete their results"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished and job.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+
+    def _record_depth(self):
+        metrics.set_gauge("toonify_api_jobs_pending", self._pending, help_text="API jobs queued or running")
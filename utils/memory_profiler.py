@@ -0,0 +1,138 @@
+"""
+Memory Profiler - Peak and retained memory per processing call
+Combines tracemalloc (Python objects and NumPy buffers) with RSS sampling
+(native allocations from OpenCV / ONNX Runtime that tracemalloc cannot see)
+"""
+import os
+import threading
+import time
+import tracemalloc
+
+from utils.metrics import metrics, resolution_bucket
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Attach the profiler to live ImageProcessor.process_image calls
+MEMORY_PROFILE_ENABLED = os.environ.get("TOONIFY_MEMORY_PROFILE", "0") == "1"
+
+# RSS sampling interval in seconds
+SAMPLE_INTERVAL = float(os.environ.get("TOONIFY_MEMORY_SAMPLE_INTERVAL", 0.005))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    if resource is not None:
+        # ru_maxrss is the high-water mark (KB on Linux), the best we can do here
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+class _RSSSampler(threading.Thread):
+    """Background thread tracking the highest RSS seen"""
+
+    def __init__(self, interval):
+        super().__init__(name="toonify-rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class MemoryProfiler:
+    """
+    Context manager reporting peak and retained memory for the enclosed block.
+
+    tracemalloc state is process-wide, so concurrent profiled calls see each
+    other's allocations; numbers are exact only when one call runs at a time.
+    """
+
+    _active = 0
+    _owns_tracing = False
+    _lock = threading.Lock()
+
+    def __init__(self, label="", sample_interval=SAMPLE_INTERVAL):
+        self.label = label
+        self.sample_interval = sample_interval
+        self.report = None
+
+    def __enter__(self):
+        with MemoryProfiler._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                MemoryProfiler._owns_tracing = True
+            MemoryProfiler._active += 1
+            tracemalloc.reset_peak()
+
+        self._py_before, _ = tracemalloc.get_traced_memory()
+        self._rss_before = current_rss()
+        self._sampler = _RSSSampler(self.sample_interval)
+        self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._sampler.stop()
+        py_after, py_peak = tracemalloc.get_traced_memory()
+        rss_after = current_rss()
+
+        with MemoryProfiler._lock:
+            MemoryProfiler._active -= 1
+            if MemoryProfiler._owns_tracing and MemoryProfiler._active == 0:
+                tracemalloc.stop()
+                MemoryProfiler._owns_tracing = False
+
+        self.report = {
+            'label': self.label,
+            'seconds': round(elapsed, 4),
+            'python_peak_mb': round((py_peak - self._py_before) / _MB, 2),
+            'python_retained_mb': round((py_after - self._py_before) / _MB, 2),
+            'rss_before_mb': round(self._rss_before / _MB, 2),
+            'rss_peak_mb': round(self._sampler.peak / _MB, 2),
+            'rss_peak_delta_mb': round((self._sampler.peak - self._rss_before) / _MB, 2),
+            'rss_retained_mb': round((rss_after - self._rss_before) / _MB, 2),
+        }
+        return False
+
+
+def record_memory_report(report, effect, image=None):
+    """Publish a profiler report to the metrics registry and the console"""
+    resolution = resolution_bucket(image)
+    buckets = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+    metrics.observe("toonify_effect_peak_memory_mb", max(report['python_peak_mb'], report['rss_peak_delta_mb']),
+                    help_text="Peak memory per effect call in MB", buckets=buckets,
+                    effect=effect, resolution=resolution)
+    metrics.observe("toonify_effect_retained_memory_mb", max(0.0, report['rss_retained_mb']),
+                    help_text="Memory still held after an effect call in MB", buckets=buckets,
+                    effect=effect, resolution=resolution)
+    print(f"🧠 {effect} ({resolution}): peak py {report['python_peak_mb']} MB, "
+          f"peak rss +{report['rss_peak_delta_mb']} MB, retained rss {report['rss_retained_mb']} MB")
@@ -0,0 +1,255 @@
+"""
+Metrics Module - Per-stage timing instrumentation
+Records stage durations per effect and resolution bucket as histograms, plus
+counters and gauges, and exposes them in Prometheus text format
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds (megapixels) for the resolution label
+RESOLUTION_BUCKETS = ((0.3, "vga"), (1.0, "1mp"), (4.0, "4mp"), (12.0, "12mp"))
+
+METRICS_HOST = os.environ.get("TOONIFY_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("TOONIFY_METRICS_PORT", 9108))
+
+
+def resolution_bucket(image=None, shape=None):
+    """Map an image (or its shape) to a coarse resolution label"""
+    if shape is None and image is not None:
+        shape = getattr(image, "shape", None)
+    if not shape:
+        return "unknown"
+    megapixels = shape[0] * shape[1] / 1_000_000
+    for limit, label in RESOLUTION_BUCKETS:
+        if megapixels <= limit:
+            return label
+    return "large"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Histogram:
+    """Cumulative-bucket histogram for one label set"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation within buckets"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        previous_bound, previous_count = 0.0, 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                in_bucket = count - previous_count
+                fraction = (target - previous_count) / in_bucket if in_bucket else 0.0
+                return previous_bound + (bound - previous_bound) * fraction
+            previous_bound, previous_count = bound, count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe in-process store for histograms, counters and gauges"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(dict)
+        self._counters = defaultdict(lambda: defaultdict(float))
+        self._gauges = defaultdict(dict)
+        self._help = {}
+
+    def observe(self, name, value, help_text="", buckets=None, **labels):
+        """Record one histogram observation"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            series = self._histograms[name]
+            if key not in series:
+                series[key] = _Histogram(buckets or self.buckets)
+            series[key].observe(value)
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        """Increment a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._counters[name][key] += amount
+
+    def set_gauge(self, name, value, help_text="", **labels):
+        """Set a gauge to an absolute value"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._gauges[name][key] = value
+
+    def add_gauge(self, name, delta, help_text="", **labels):
+        """Move a gauge up or down"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._gauges[name][key] = self._gauges[name].get(key, 0) + delta
+
+    def render_prometheus(self):
+        """Render all metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(series.items()):
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        labels = _format_labels(key + (("le", f"{bound:g}"),))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    labels = _format_labels(key + (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{labels} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, name="toonify_stage_seconds"):
+        """Per-label-set count, mean and estimated p50/p95 for one histogram"""
+        rows = []
+        with self._lock:
+            for key, hist in sorted(self._histograms.get(name, {}).items()):
+                row = dict(key)
+                row.update({
+                    'count': hist.count,
+                    'mean_ms': round(hist.total / hist.count * 1000, 1) if hist.count else 0.0,
+                    'p50_ms': round(hist.quantile(0.50) * 1000, 1),
+                    'p95_ms': round(hist.quantile(0.95) * 1000, 1),
+                })
+                rows.append(row)
+        return rows
+
+    def counters(self):
+        """Snapshot of all counters as {name: {labels: value}}"""
+        with self._lock:
+            return {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+
+    def gauges(self):
+        """Snapshot of all gauges as {name: {labels: value}}"""
+        with self._lock:
+            return {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self._gauges.items()
+            }
+
+
+metrics = MetricsRegistry()
+
+
+def observe_stage(stage, seconds, effect="", image=None, resolution=None):
+    """Record the duration of one processing stage"""
+    metrics.observe(
+        "toonify_stage_seconds", seconds,
+        help_text="Duration of processing stages in seconds",
+        stage=stage, effect=effect or "none",
+        resolution=resolution or resolution_bucket(image),
+    )
+
+
+@contextmanager
+def time_stage(stage, effect="", image=None, resolution=None):
+    """Context manager that records how long the enclosed block takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, effect, image, resolution)
+
+
+def record_cache(cache, hit):
+    """Count a cache hit or miss"""
+    name = "toonify_cache_hits_total" if hit else "toonify_cache_misses_total"
+    metrics.inc(name, help_text=f"Cache {'hits' if hit else 'misses'}", cache=cache)
+
+
+def record_payment(method, status, amount=0.0):
+    """Count a payment attempt and the revenue it produced"""
+    metrics.inc("toonify_payments_total", help_text="Payment attempts", method=method, status=status)
+    if status == "success":
+        metrics.inc("toonify_payment_amount_total", amount, help_text="Revenue in INR", method=method)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve /metrics in Prometheus text format"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the Streamlit console
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Start the metrics endpoint in a daemon thread (once per process)"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server or None
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # Remember the failure so Streamlit reruns don't retry every time
+            _server = False
+            print(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        thread = threading.Thread(target=_server.serve_forever, name="toonify-metrics", daemon=True)
+        thread.start()
+        print(f"📈 Metrics available at http://{host}:{port}/metrics")
+        return _server
@@ -0,0 +1,196 @@
+"""
+Request Profiling - Opt-in cProfile / stack-sampling hooks
+Captures a profile for every request (TOONIFY_PROFILE=1) or a sampled
+fraction of them (TOONIFY_PROFILE_SAMPLE_RATE=0.01) and stores it under
+data/profiles/ together with the request metadata
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get("TOONIFY_PROFILE_DIR", "data/profiles")
+PROFILE_ALWAYS = os.environ.get("TOONIFY_PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("TOONIFY_PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_MODE = os.environ.get("TOONIFY_PROFILE_MODE", "cprofile")  # cprofile | sampling
+PROFILE_MAX_FILES = int(os.environ.get("TOONIFY_PROFILE_MAX_FILES", 200))
+SAMPLING_INTERVAL = float(os.environ.get("TOONIFY_PROFILE_INTERVAL", 0.005))
+
+_local = threading.local()
+
+
+def profiling_enabled():
+    """Whether any request can be profiled"""
+    return PROFILE_ALWAYS or PROFILE_SAMPLE_RATE > 0
+
+
+def _should_profile():
+    if PROFILE_ALWAYS:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class _StackSampler(threading.Thread):
+    """Low-overhead sampler that records folded stacks of one thread"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="toonify-stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _write_profile(kind, metadata, duration, profiler=None, sampler=None):
+    """Persist one captured profile and its metadata"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{kind}_{uuid.uuid4().hex[:8]}"
+    record = {
+        'id': profile_id,
+        'kind': kind,
+        'mode': 'cprofile' if profiler is not None else 'sampling',
+        'duration_s': round(duration, 4),
+        'created_at': datetime.now().isoformat(),
+        'metadata': {k: str(v) for k, v in metadata.items()},
+    }
+
+    if profiler is not None:
+        prof_path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+        profiler.dump_stats(prof_path)
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(25)
+        record['profile_file'] = prof_path
+        record['top_functions'] = buffer.getvalue()
+    else:
+        folded_path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+        with open(folded_path, 'w') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        record['profile_file'] = folded_path
+        record['top_functions'] = "\n".join(
+            f"{count:6d}  {stack.split(';')[-1]}" for stack, count in sampler.stacks.most_common(25)
+        )
+
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w') as f:
+        json.dump(record, f, indent=2)
+
+    _enforce_retention()
+    return record
+
+
+def _enforce_retention():
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    try:
+        records = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".json"))
+    except OSError:
+        return
+    for old in records[:-PROFILE_MAX_FILES] if len(records) > PROFILE_MAX_FILES else []:
+        stem = old[:-len(".json")]
+        for ext in (".json", ".prof", ".folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, stem + ext))
+            except OSError:
+                pass
+
+
+@contextmanager
+def profiled(kind, **metadata):
+    """
+    Profile the enclosed block if this request is selected.
+
+    Nested calls in the same thread are folded into the outermost profile.
+    """
+    if not profiling_enabled() or getattr(_local, "active", False) or not _should_profile():
+        yield
+        return
+
+    profiler = sampler = None
+    try:
+        if PROFILE_MODE == "sampling":
+            sampler = _StackSampler(threading.get_ident(), SAMPLING_INTERVAL)
+            sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            # Python 3.12+ raises ValueError while another thread is profiling
+            profiler.enable()
+    except Exception as e:
+        print(f"⚠️ Profiling skipped for this {kind} call: {e}")
+        yield
+        return
+
+    _local.active = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        try:
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+        except Exception as e:
+            print(f"⚠️ Could not stop profiler: {e}")
+        _local.active = False
+        try:
+            record = _write_profile(kind, metadata, duration, profiler, sampler)
+            print(f"🔬 Profile captured: {record['id']} ({duration * 1000:.0f} ms)")
+        except Exception as e:
+            print(f"⚠️ Could not save profile: {e}")
+
+
+def profile_call(kind):
+    """Decorator form of profiled(); records the function name as metadata"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiling_enabled():
+                return func(*args, **kwargs)
+            with profiled(kind, function=func.__qualname__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def list_profiles(limit=20, kind=None):
+    """Captured profile records, slowest first"""
+    records = []
+    if not os.path.isdir(PROFILE_DIR):
+        return records
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), 'r') as f:
+                record = json.load(f)
+        except Exception:
+            continue
+        if kind is None or record.get('kind') == kind:
+            records.append(record)
+    records.sort(key=lambda r: r.get('duration_s', 0), reverse=True)
+    return records[:limit]
@@ -0,0 +1,113 @@
+"""
+Region-of-Interest Stylization - Run an effect only on parts of an image
+Regions come from boxes (e.g. detected faces) or a mask. Each region is
+padded for context, rendered as a crop and feathered back into the original.
+Crops are rendered concurrently, within the request's share of cores.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils.cancellation import submit_in_context
+from utils.runtime_config import get_runtime_config
+
+# Context added around each region, as a fraction of its larger side
+ROI_PADDING = float(os.environ.get("TOONIFY_ROI_PADDING", 0.3))
+
+
+def pad_box(box, shape, padding=ROI_PADDING):
+    """Grow an (x1, y1, x2, y2) box by padding * its larger side, clipped to the image"""
+    x1, y1, x2, y2 = box
+    pad = int(padding * max(x2 - x1, y2 - y1))
+    return (max(x1 - pad, 0), max(y1 - pad, 0),
+            min(x2 + pad, shape[1]), min(y2 + pad, shape[0]))
+
+
+def merge_boxes(boxes):
+    """Union overlapping boxes so every pixel is rendered at most once"""
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(b) for b in boxes]
+
+
+def boxes_to_mask(shape, boxes, padding=ROI_PADDING):
+    """
+    Coverage mask for (x1, y1, x2, y2) boxes.
+
+    Each box is grown by half the padding so the feathered edge falls in the
+    padded context rather than on the region itself.
+    """
+    mask = np.zeros(shape[:2], np.uint8)
+    for box in boxes:
+        x1, y1, x2, y2 = pad_box(box, shape, padding / 2)
+        mask[y1:y2, x1:x2] = 255
+    return mask
+
+
+def regions_from_mask(mask, padding=ROI_PADDING):
+    """
+    Split a mask into padded crops.
+
+    Returns a list of ((x1, y1, x2, y2), alpha) where alpha is the feathered
+    float32 mask of that crop.
+    """
+    mask = np.where(mask > 0, 255, 0).astype(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    boxes = [(x, y, x + w, y + h) for x, y, w, h, area in stats[1:count] if area > 0]
+    crops = merge_boxes([pad_box(box, mask.shape, padding) for box in boxes])
+
+    regions = []
+    for x1, y1, x2, y2 in crops:
+        # Feather over roughly half the padding
+        feather = max(3, int(min(x2 - x1, y2 - y1) * padding / 2)) | 1
+        alpha = cv2.GaussianBlur(mask[y1:y2, x1:x2], (feather, feather), 0).astype(np.float32) / 255.0
+        regions.append(((x1, y1, x2, y2), alpha))
+    return regions
+
+
+def regions_from_boxes(shape, boxes, padding=ROI_PADDING):
+    """Padded, feathered crops for (x1, y1, x2, y2) boxes"""
+    return regions_from_mask(boxes_to_mask(shape, boxes, padding), padding)
+
+
+def stylize_regions(image, regions, render, base=None):
+    """
+    Render each region's crop with render(crop) and feather it into a copy of image.
+
+    base (same size as image) is what the crops are composited onto instead
+    of image. Crops are rendered concurrently, at most cores_per_request at a
+    time, since the caller holds a single processing slot.
+    """
+    result = (image if base is None else base).copy()
+    if not regions:
+        return result
+
+    crops = [image[y1:y2, x1:x2] for (x1, y1, x2, y2), _ in regions]
+    with ThreadPoolExecutor(max_workers=get_runtime_config().fan_out_workers(len(crops))) as pool:
+        futures = [submit_in_context(pool, render, crop) for crop in crops]
+        stylized = [future.result() for future in futures]
+
+    for ((x1, y1, x2, y2), alpha), styl in zip(regions, stylized):
+        target = result[y1:y2, x1:x2]
+        if styl.shape[:2] != target.shape[:2]:
+            styl = cv2.resize(styl, (target.shape[1], target.shape[0]), interpolation=cv2.INTER_LINEAR)
+        if styl.ndim == 2:
+            styl = cv2.cvtColor(styl, cv2.COLOR_GRAY2BGR)
+        a = alpha[..., None]
+        blended = target.astype(np.float32) * (1.0 - a) + styl.astype(np.float32) * a
+        result[y1:y2, x1:x2] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+    return result
@@ -0,0 +1,229 @@
+"""
+Runtime Configuration - Unified threading policy
+Sizes OpenCV, ONNX Runtime and PyTorch thread pools coherently from one
+setting: cores per request x concurrent processing slots
+"""
+import json
+import os
+import platform
+import threading
+from contextlib import contextmanager
+
+import cv2
+
+from utils.metrics import metrics
+from utils.cancellation import current_token
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+
+# Written by `python -m utils.autotune`
+PROFILE_PATH = os.environ.get("TOONIFY_RUNTIME_PROFILE", "data/runtime_profile.json")
+
+
+def host_signature():
+    """Identify the machine a tuned profile was produced on"""
+    return {
+        'cpu_count': os.cpu_count() or 1,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def load_tuned_profile(path=PROFILE_PATH):
+    """Load tuned settings if they were produced on this kind of host"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            profile = json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read runtime profile {path}: {e}")
+        return None
+
+    if profile.get('host', {}).get('cpu_count') != host_signature()['cpu_count']:
+        print(f"⚠️ Ignoring runtime profile {path}: tuned on a different host")
+        return None
+    return profile.get('settings', {})
+
+
+def _env_int(name, default):
+    """Read a positive integer from the environment"""
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except (TypeError, ValueError):
+        return max(1, int(default))
+
+
+class RuntimeConfig:
+    """Threading policy shared by every effect in this process"""
+
+    def __init__(self, concurrent_slots=None, cores_per_request=None, profile=None):
+        total_cores = os.cpu_count() or 1
+
+        # Tuned defaults for this host; environment variables still win
+        profile = profile or {}
+        tuned_threads = profile.get('cores_per_request')
+        default_slots = max(1, total_cores // tuned_threads) if tuned_threads else 2
+
+        # Number of images processed at the same time
+        self.concurrent_slots = concurrent_slots or _env_int("TOONIFY_CONCURRENT_SLOTS", default_slots)
+
+        # Threads each image may use (defaults to an even split of the machine)
+        self.cores_per_request = cores_per_request or _env_int(
+            "TOONIFY_CORES_PER_REQUEST",
+            tuned_threads or max(1, total_cores // self.concurrent_slots)
+        )
+
+        self.opencv_threads = self.cores_per_request
+        self.torch_threads = self.cores_per_request
+        self.ort_intra_op_threads = self.cores_per_request
+        self.ort_inter_op_threads = profile.get('ort_inter_op_threads', 1)
+        self.ort_execution_mode = profile.get('ort_execution_mode', "sequential")
+        self.ort_graph_optimization = profile.get('ort_graph_optimization', "all")
+        self.tuned = bool(profile)
+
+        self._slots = threading.BoundedSemaphore(self.concurrent_slots)
+        # Whether the current thread holds a slot (see slot_released)
+        self._holder = threading.local()
+        self._applied = False
+        self._lock = threading.Lock()
+
+    def apply(self):
+        """Apply thread counts to OpenCV and PyTorch (idempotent)"""
+        with self._lock:
+            if self._applied:
+                return
+            cv2.setNumThreads(self.opencv_threads)
+            if TORCH_AVAILABLE:
+                torch.set_num_threads(self.torch_threads)
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    # Can only be set before any inter-op parallel work starts
+                    pass
+            self._applied = True
+            source = "tuned profile" if self.tuned else "defaults"
+            print(f"⚙️ Runtime: {self.concurrent_slots} slots x {self.cores_per_request} threads ({source})")
+
+    def session_options(self):
+        """Build ONNX Runtime session options matching this policy"""
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("ONNX Runtime not installed")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.ort_intra_op_threads
+        options.inter_op_num_threads = self.ort_inter_op_threads
+        options.execution_mode = {
+            "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+            "parallel": ort.ExecutionMode.ORT_PARALLEL,
+        }.get(self.ort_execution_mode, ort.ExecutionMode.ORT_SEQUENTIAL)
+        options.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }.get(self.ort_graph_optimization, ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+        # Idle worker threads should not busy-wait while other slots compute
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        return options
+
+    def _acquire_slot(self):
+        token = current_token()
+        metrics.add_gauge("toonify_processing_waiting", 1, help_text="Images waiting for a slot")
+        try:
+            if token is None:
+                self._slots.acquire()
+            else:
+                while not self._slots.acquire(timeout=0.1):
+                    token.check()
+        finally:
+            metrics.add_gauge("toonify_processing_waiting", -1)
+        self._holder.held = True
+        metrics.add_gauge("toonify_processing_active", 1, help_text="Images being processed")
+
+    def _release_slot(self):
+        self._holder.held = False
+        metrics.add_gauge("toonify_processing_active", -1)
+        self._slots.release()
+
+    @contextmanager
+    def processing_slot(self):
+        """Limit the number of images processed concurrently (cancellable while waiting)"""
+        self._acquire_slot()
+        try:
+            yield
+        finally:
+            if getattr(self._holder, "held", False):
+                self._release_slot()
+
+    @contextmanager
+    def slot_released(self):
+        """
+        Lend this thread's processing slot out while it waits on shared work.
+
+        Used around batched inference, which bounds its own concurrency: other
+        images can preprocess and join the batch meanwhile. A no-op on threads
+        that hold no slot (e.g. fan-out workers of a preview pass or video).
+        """
+        if not getattr(self._holder, "held", False):
+            yield
+            return
+        self._release_slot()
+        try:
+            yield
+        finally:
+            self._acquire_slot()
+
+    def fan_out_workers(self, tasks, limit=None):
+        """Worker threads for splitting one slot's work into tasks, within its core share"""
+        return max(1, min(tasks, self.cores_per_request, limit or self.cores_per_request))
+
+    def as_dict(self):
+        """Return the effective settings"""
+        return {
+            'concurrent_slots': self.concurrent_slots,
+            'cores_per_request': self.cores_per_request,
+            'opencv_threads': self.opencv_threads,
+            'torch_threads': self.torch_threads,
+            'ort_intra_op_threads': self.ort_intra_op_threads,
+            'ort_inter_op_threads': self.ort_inter_op_threads,
+            'ort_execution_mode': self.ort_execution_mode,
+            'ort_graph_optimization': self.ort_graph_optimization,
+            'tuned': self.tuned,
+        }
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_runtime_config():
+    """Get the process-wide runtime configuration (applied on first use)"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = RuntimeConfig(profile=load_tuned_profile())
+    _config.apply()
+    return _config
+
+
+def create_onnx_session(model_path):
+    """Create a CPU ONNX Runtime session using the shared threading policy"""
+    config = get_runtime_config()
+    return ort.InferenceSession(
+        model_path,
+        sess_options=config.session_options(),
+        providers=["CPUExecutionProvider"]
+    )
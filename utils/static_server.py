@@ -0,0 +1,223 @@
+"""
+Static Result Serving - Signed, expiring URLs for processed images and videos
+Result files are served by a small HTTP server next to Streamlit, so the
+browser fetches image bytes directly (with ETag revalidation, byte ranges and
+zero-copy sendfile) instead of through the Python script and websocket.
+"""
+import hashlib
+import hmac
+import mimetypes
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+STATIC_HOST = os.environ.get("TOONIFY_STATIC_HOST", "0.0.0.0")
+STATIC_PORT = int(os.environ.get("TOONIFY_STATIC_PORT", 8601))
+# Address browsers use to reach the server. Unset keeps serving through
+# Streamlit: no default address works for visitors on other machines
+STATIC_PUBLIC_URL = os.environ.get("TOONIFY_STATIC_URL", "").rstrip("/")
+# Signed URLs stay valid for between one and two TTLs
+STATIC_URL_TTL = int(os.environ.get("TOONIFY_STATIC_URL_TTL", 3600))
+# Directories whose files may be served
+STATIC_ROOTS = [r.strip() for r in os.environ.get("TOONIFY_STATIC_ROOTS", "temp,data/api_results,assets/backgrounds").split(",")
+                if r.strip()]
+# Shared by every process that signs or verifies URLs
+STATIC_SECRET_PATH = os.path.join("data", ".static_secret")
+
+_secret = None
+_secret_lock = threading.Lock()
+
+
+def _get_secret():
+    """Signing key from TOONIFY_STATIC_SECRET, or a random one persisted on first use"""
+    global _secret
+    if _secret is None:
+        with _secret_lock:
+            if _secret is None:
+                secret = os.environ.get("TOONIFY_STATIC_SECRET")
+                if not secret:
+                    if os.path.exists(STATIC_SECRET_PATH):
+                        with open(STATIC_SECRET_PATH, 'r') as f:
+                            secret = f.read().strip()
+                    else:
+                        os.makedirs(os.path.dirname(STATIC_SECRET_PATH), exist_ok=True)
+                        secret = os.urandom(32).hex()
+                        with open(STATIC_SECRET_PATH, 'w') as f:
+                            f.write(secret)
+                _secret = secret.encode()
+    return _secret
+
+
+def _signature(rel_path, expires, download_name):
+    message = f"{rel_path}\n{expires}\n{download_name}".encode()
+    return hmac.new(_get_secret(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def _relative(path):
+    return os.path.relpath(os.path.abspath(path)).replace(os.sep, "/")
+
+
+def signed_url(path, ttl=STATIC_URL_TTL, download_name=""):
+    """
+    Signed URL for a result file.
+
+    Expiry is rounded up to the next TTL boundary, so the same file gets the
+    same URL across Streamlit reruns and the browser cache keeps working.
+    download_name makes the browser save the file instead of displaying it.
+    """
+    rel_path = _relative(path)
+    expires = (int(time.time()) // ttl + 2) * ttl
+    url = f"{STATIC_PUBLIC_URL}/{quote(rel_path)}?expires={expires}&sig={_signature(rel_path, expires, download_name)}"
+    if download_name:
+        url += f"&dl={quote(download_name)}"
+    if os.path.exists(path):
+        # Files rewritten in place (e.g. re-tuned results) get a fresh URL
+        url += f"&v={os.stat(path).st_mtime_ns:x}"
+    return url
+
+
+def resolve_path(rel_path):
+    """Absolute path of a servable file, or None if outside STATIC_ROOTS or missing"""
+    path = os.path.realpath(rel_path)
+    for root in STATIC_ROOTS:
+        root = os.path.realpath(root)
+        if path.startswith(root + os.sep) and os.path.isfile(path):
+            return path
+    return None
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range; None if absent, False if unsatisfiable"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            start, end = int(start), min(int(end) if end else size - 1, size - 1)
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(size - int(end), 0), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+class _StaticHandler(BaseHTTPRequestHandler):
+    """GET/HEAD for signed result URLs"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        rel_path = unquote(url.path.lstrip("/"))
+        expires = query.get("expires", ["0"])[0]
+        download_name = query.get("dl", [""])[0]
+        expected = _signature(rel_path, expires, download_name)
+        if not hmac.compare_digest(expected, query.get("sig", [""])[0]):
+            self._empty(403)
+            return
+        if not expires.isdigit() or int(expires) < time.time():
+            self._empty(410)
+            return
+        path = resolve_path(rel_path)
+        if path is None:
+            self._empty(404)
+            return
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': formatdate(stat.st_mtime, usegmt=True),
+            'Cache-Control': f"private, max-age={max(0, int(expires) - int(time.time()))}",
+            'Accept-Ranges': "bytes",
+        }
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self._empty(304, headers)
+            return
+
+        size = stat.st_size
+        byte_range = parse_range(self.headers.get("Range"), size)
+        if self.headers.get("If-Range") not in (None, etag):
+            byte_range = None
+        if byte_range is False:
+            self._empty(416, {'Content-Range': f"bytes */{size}"})
+            return
+
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if download_name:
+            self.send_header("Content-Disposition", f"attachment; filename=\"{download_name}\"")
+        self.end_headers()
+        if send_body and size:
+            with open(path, 'rb') as f:
+                # Kernel copies file -> socket without passing through Python
+                self.connection.sendfile(f, offset=start, count=end - start + 1)
+
+    def _empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Keep image fetches out of the Streamlit console
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_static_server(host=STATIC_HOST, port=STATIC_PORT):
+    """Start the result file server in a daemon thread (once per process)"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server or None
+        if not STATIC_PUBLIC_URL:
+            # Remembered like a failed bind, so reruns don't print this again
+            _server = False
+            print("⚠️ TOONIFY_STATIC_URL not set; results are served through Streamlit")
+            return None
+        try:
+            _server = ThreadingHTTPServer((host, port), _StaticHandler)
+        except OSError as e:
+            # Remember the failure so Streamlit reruns don't retry every time
+            _server = False
+            print(f"⚠️ Static result server not started on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+        thread = threading.Thread(target=_server.serve_forever, name="toonify-static", daemon=True)
+        thread.start()
+        print(f"🗂️ Serving results at {STATIC_PUBLIC_URL}")
+        return _server
+
+
+def static_serving():
+    """Whether this process is serving result files"""
+    return bool(_server)
+
+
+def result_source(path, download_name=""):
+    """Signed URL for path if the server is running, else the path itself"""
+    return signed_url(path, download_name=download_name) if static_serving() else path
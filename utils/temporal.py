@@ -0,0 +1,69 @@
+"""
+Temporal Reuse - Propagate a stylized frame to the next one with optical flow
+Keyframes are stylized fully; frames in between reuse the previous stylized
+frame warped along dense optical flow. Pixels the flow can't explain
+(occlusions, new content) are detected photometrically so the caller can
+re-render just those regions, or start a new keyframe when too much changed.
+"""
+import os
+
+import cv2
+import numpy as np
+
+# "dis" (fast) or "farneback"
+VIDEO_FLOW_METHOD = os.environ.get("TOONIFY_VIDEO_FLOW", "dis").lower()
+# Gray-level difference after warping above which a pixel counts as occluded
+OCCLUSION_THRESHOLD = int(os.environ.get("TOONIFY_VIDEO_OCCLUSION_THRESHOLD", 24))
+# Occluded fraction above which the frame becomes a new keyframe (e.g. scene cuts)
+KEYFRAME_REFRESH_FRACTION = float(os.environ.get("TOONIFY_VIDEO_REFRESH_FRACTION", 0.25))
+# Occluded fraction below which the warp is used as-is
+MIN_REFRESH_FRACTION = 0.002
+
+
+class FlowPropagator:
+    """Warps the previous stylized frame onto the current one (single-threaded use)"""
+
+    def __init__(self, method=VIDEO_FLOW_METHOD, occlusion_threshold=OCCLUSION_THRESHOLD):
+        self.method = method
+        self.occlusion_threshold = occlusion_threshold
+        self._dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST) if method == "dis" else None
+        self._grid = None
+        self._kernel = np.ones((3, 3), np.uint8)
+
+    def flow(self, gray, prev_gray):
+        """Per-pixel offset from the current frame into the previous one"""
+        if self._dis is not None:
+            return self._dis.calc(gray, prev_gray, None)
+        return cv2.calcOpticalFlowFarneback(gray, prev_gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+
+    def _base_grid(self, h, w):
+        if self._grid is None or self._grid[0].shape != (h, w):
+            xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+            self._grid = (xs, ys)
+        return self._grid
+
+    def warp(self, prev_frame, prev_stylized, frame):
+        """
+        Warp prev_stylized onto frame.
+
+        Returns (warped, occlusion_mask); the mask is 255 where the previous
+        frame does not explain the current one.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
+        flow = self.flow(gray, prev_gray)
+
+        h, w = gray.shape
+        xs, ys = self._base_grid(h, w)
+        map_x = cv2.add(xs, flow[..., 0])
+        map_y = cv2.add(ys, flow[..., 1])
+        warped = cv2.remap(prev_stylized, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+        # Photometric check: where the warped previous frame disagrees, the flow failed
+        warped_gray = cv2.remap(prev_gray, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        mask = np.where(cv2.absdiff(gray, warped_gray) > self.occlusion_threshold, 255, 0).astype(np.uint8)
+        outside = (map_x < 0) | (map_x > w - 1) | (map_y < 0) | (map_y > h - 1)
+        mask[outside] = 255
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        return warped, mask
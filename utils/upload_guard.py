@@ -0,0 +1,132 @@
+"""
+Upload Guard - Header inspection and bounded decoding of uploaded images
+Only the image header is parsed first (format, dimensions, EXIF orientation),
+so oversized or malformed uploads are rejected before any pixels are decoded.
+Images above the per-request pixel budget are decoded at reduced resolution:
+JPEGs through libjpeg's DCT scaling (1/2, 1/4, 1/8), which never allocates the
+full-size frame, other formats by a full decode followed by a downscale, which
+is only allowed up to UPLOAD_MAX_DECODE_MEGAPIXELS.
+"""
+import io
+import os
+import warnings
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.metrics import metrics, resolution_bucket, time_stage
+
+UPLOAD_MAX_MB = float(os.environ.get("TOONIFY_UPLOAD_MAX_MB", 25))
+# Largest image handed to an effect; bigger uploads are decoded downscaled
+UPLOAD_PIXEL_BUDGET_MP = float(os.environ.get("TOONIFY_PIXEL_BUDGET_MP", 24))
+# Largest frame ever held in memory while decoding (after JPEG DCT scaling)
+UPLOAD_MAX_DECODE_MEGAPIXELS = float(os.environ.get("TOONIFY_MAX_DECODE_MP", 64))
+# Longer sides are rejected outright (also catches corrupt headers)
+UPLOAD_MAX_SIDE = int(os.environ.get("TOONIFY_UPLOAD_MAX_SIDE", 30000))
+UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP", "BMP")
+
+# format: Pillow format name; width/height as displayed (orientation applied)
+ImageInfo = namedtuple("ImageInfo", ["format", "width", "height", "orientation", "bytes"])
+
+# EXIF orientations that swap width and height
+_TRANSPOSED = (5, 6, 7, 8)
+# cv2.imdecode flags for each JPEG reduction factor
+_REDUCED_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                  4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+class UploadRejectedError(ValueError):
+    """Raised when an upload is not a supported image or exceeds the limits"""
+
+    def __init__(self, message, reason="unreadable"):
+        super().__init__(message)
+        # "empty", "bytes", "unreadable", "format", "dimensions" or "pixels"
+        self.reason = reason
+
+
+def _reject(reason, message):
+    metrics.inc("toonify_uploads_rejected_total", help_text="Uploads rejected before decoding", reason=reason)
+    raise UploadRejectedError(message, reason)
+
+
+def inspect_image(data, max_bytes=None):
+    """
+    Parse only the header of an encoded image.
+
+    Returns ImageInfo; raises UploadRejectedError for unsupported formats,
+    oversized files or implausible dimensions.
+    """
+    max_bytes = max_bytes or int(UPLOAD_MAX_MB * 1024 * 1024)
+    if not data:
+        _reject("empty", "The upload is empty")
+    if len(data) > max_bytes:
+        _reject("bytes", f"File is larger than {max_bytes / (1024 * 1024):g} MB")
+    try:
+        with warnings.catch_warnings():
+            # Pillow's own bomb warning; the limits below are checked explicitly
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as header:
+                fmt, (width, height) = header.format, header.size
+                orientation = header.getexif().get(0x0112, 1) if fmt == "JPEG" else 1
+    except Image.DecompressionBombError:
+        # Header declares more pixels than Pillow allows (~179 MP)
+        _reject("pixels", "Image has too many pixels to process")
+    except (OSError, SyntaxError, ValueError):
+        _reject("unreadable", "Not a readable JPEG, PNG, WebP or BMP image")
+    if fmt not in UPLOAD_FORMATS:
+        _reject("format", f"Unsupported image format: {fmt}")
+    if not (0 < width <= UPLOAD_MAX_SIDE and 0 < height <= UPLOAD_MAX_SIDE):
+        _reject("dimensions", f"Image dimensions {width}x{height} are outside the supported range")
+    if orientation in _TRANSPOSED:
+        width, height = height, width
+    return ImageInfo(fmt, width, height, orientation, len(data))
+
+
+def plan_decode(info, budget_mp=UPLOAD_PIXEL_BUDGET_MP, max_decode_mp=UPLOAD_MAX_DECODE_MEGAPIXELS):
+    """
+    (reduction, target_size) for decoding within the pixel budget.
+
+    reduction is the JPEG DCT scale factor (1 for other formats); target_size
+    is (width, height) to downscale to after decoding, or None if it fits.
+    Raises UploadRejectedError if even the reduced decode exceeds max_decode_mp.
+    """
+    pixels = info.width * info.height
+    budget = budget_mp * 1e6
+    reduction = 1
+    if info.format == "JPEG":
+        # Smallest factor that still decodes at least the budget, so the final
+        # resize only ever shrinks
+        while reduction < 8 and pixels / (reduction * 2) ** 2 >= budget:
+            reduction *= 2
+    if pixels / reduction ** 2 > max_decode_mp * 1e6:
+        _reject("pixels", f"Image is {pixels / 1e6:.0f} MP; the limit is {max_decode_mp * reduction ** 2:g} MP"
+                          f" for {info.format}")
+    if pixels <= budget:
+        return reduction, None
+    scale = (budget / pixels) ** 0.5
+    return reduction, (max(1, int(info.width * scale)), max(1, int(info.height * scale)))
+
+
+def decode_upload(data, budget_mp=UPLOAD_PIXEL_BUDGET_MP, max_bytes=None):
+    """
+    Inspect, then decode an uploaded image within the pixel budget.
+
+    Returns (BGR image, ImageInfo of the original); the image is oriented per
+    EXIF and at most budget_mp megapixels. Raises UploadRejectedError.
+    """
+    info = inspect_image(data, max_bytes)
+    reduction, target_size = plan_decode(info, budget_mp)
+    with time_stage("decode", resolution=resolution_bucket(shape=(info.height, info.width))):
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), _REDUCED_FLAGS[reduction])
+        if image is None:
+            _reject("unreadable", f"Could not decode the {info.format} image")
+        if target_size is not None and image.shape[1] * image.shape[0] > target_size[0] * target_size[1]:
+            image = cv2.resize(image, target_size, interpolation=cv2.INTER_AREA)
+    if reduction > 1 or target_size is not None:
+        metrics.inc("toonify_uploads_downscaled_total", help_text="Uploads decoded below their full resolution",
+                    format=info.format)
+        print(f"⚠️ Upload {info.width}x{info.height} decoded at {image.shape[1]}x{image.shape[0]}"
+              + (f" (1/{reduction} DCT scaling)" if reduction > 1 else ""))
+    return image, info
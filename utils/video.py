@@ -0,0 +1,221 @@
+"""
+Video Cartoonization - Stream a clip through any ImageProcessor effect
+Frames are decoded one at a time, rendered by a bounded pool of workers and
+written back in order as soon as they are ready, so memory depends on the
+number of frames in flight rather than on the clip's length. With a keyframe
+interval > 1 only keyframes are stylized fully and the frames in between are
+propagated along optical flow (see utils/temporal.py). Audio is not carried
+over.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from utils.metrics import time_stage, observe_stage
+from utils.cancellation import RenderCancelledError, checkpoint, submit_in_context
+from utils.roi import regions_from_mask, stylize_regions
+from utils.temporal import FlowPropagator, KEYFRAME_REFRESH_FRACTION, MIN_REFRESH_FRACTION
+
+# Frames rendered at once (0 = cores per request); a clip holds one processing
+# slot, so this is never more than TOONIFY_CORES_PER_REQUEST
+VIDEO_WORKERS = int(os.environ.get("TOONIFY_VIDEO_WORKERS", 0))
+# Frames decoded but not yet written; bounds memory (0 = twice the workers)
+VIDEO_MAX_IN_FLIGHT = int(os.environ.get("TOONIFY_VIDEO_MAX_IN_FLIGHT", 0))
+# Longest clip accepted (0 = unlimited); 900 frames is 30 s at 30 fps
+VIDEO_MAX_FRAMES = int(os.environ.get("TOONIFY_VIDEO_MAX_FRAMES", 900))
+# Stylize every Nth frame fully and propagate it to the others (1 = every frame)
+VIDEO_KEYFRAME_INTERVAL = int(os.environ.get("TOONIFY_VIDEO_KEYFRAME_INTERVAL", 1))
+# Frames (or re-rendered regions) that may fail and be kept unstyled before
+# the whole render fails
+VIDEO_MAX_FAILED_FRAMES = int(os.environ.get("TOONIFY_VIDEO_MAX_FAILED_FRAMES", 0))
+# Used when the container does not report a frame rate (e.g. some GIFs)
+DEFAULT_FPS = 12.0
+# Tried in order; H.264 plays in browsers but is not in every OpenCV build
+VIDEO_CODECS = ("avc1", "mp4v")
+
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'webm', 'gif']
+
+
+def video_info(path):
+    """Frame rate, frame count and size of a video file"""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        return {
+            'fps': fps if 0 < fps < 240 else DEFAULT_FPS,
+            'frame_count': max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        cap.release()
+
+
+def read_frames(path, max_frames=VIDEO_MAX_FRAMES):
+    """Yield BGR frames one at a time"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    try:
+        count = 0
+        while not max_frames or count < max_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            count += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def open_writer(path, fps, size):
+    """VideoWriter using the first codec this OpenCV build can encode"""
+    dir_path = os.path.dirname(path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    for codec in VIDEO_CODECS:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if writer.isOpened():
+            return writer
+        writer.release()
+    raise RuntimeError(f"No video encoder available for {path} (tried {', '.join(VIDEO_CODECS)})")
+
+
+def stylize_video(processor, input_path, output_path, effect_type, params=None, strength=1.0,
+                  preserve_detail=False, look=None, progress=None, keyframe_interval=VIDEO_KEYFRAME_INTERVAL,
+                  workers=VIDEO_WORKERS, max_in_flight=VIDEO_MAX_IN_FLIGHT, max_frames=VIDEO_MAX_FRAMES,
+                  max_failed_frames=VIDEO_MAX_FAILED_FRAMES):
+    """
+    Render a clip with an effect and write it to output_path (MP4).
+
+    Every keyframe_interval-th frame is rendered on the worker pool; frames in
+    between warp the previous output along optical flow. Regions the flow
+    can't explain are re-rendered, and a frame that changed too much (e.g. a
+    scene cut) becomes a new keyframe.
+
+    Up to max_failed_frames renders may fail; those frames are written
+    unstyled and never propagated. One more failure raises RuntimeError.
+
+    progress(done, total) is called after each written frame; total is 0 if
+    the container doesn't report a frame count. Returns a summary dict.
+    """
+    info = video_info(input_path)
+    total = min(info['frame_count'], max_frames) if max_frames else info['frame_count']
+    size = (info['width'], info['height'])
+    workers = processor.runtime_config.fan_out_workers(processor.runtime_config.cores_per_request, workers)
+    max_in_flight = max(1, max_in_flight or 2 * workers, workers)
+    keyframe_interval = max(1, int(keyframe_interval))
+    propagator = FlowPropagator() if keyframe_interval > 1 else None
+    counts = {'keyframes': 0, 'propagated': 0, 'refreshed': 0, 'failed_frames': 0}
+    failures_lock = threading.Lock()
+
+    def render_image(image):
+        """Stylized image, or None if it failed within the allowance"""
+        try:
+            return processor.render_frame(image, effect_type, params, strength, preserve_detail, look)
+        except RenderCancelledError:
+            raise
+        except Exception as e:
+            with failures_lock:
+                counts['failed_frames'] += 1
+                failed = counts['failed_frames']
+            if failed > max_failed_frames:
+                raise RuntimeError(f"Frame failed with {effect_type} ({failed} failed, {max_failed_frames} allowed): {e}") from e
+            print(f"⚠️ Frame failed with {effect_type} ({failed}/{max_failed_frames} allowed), kept unstyled: {e}")
+            return None
+
+    def render(frame):
+        """(result, styled) for a full frame"""
+        start = time.perf_counter()
+        result = render_image(frame)
+        observe_stage("video_frame", time.perf_counter() - start, effect_type, frame)
+        styled = result is not None
+        if not styled:
+            result = frame
+        if result.shape[1::-1] != size:
+            result = cv2.resize(result, size, interpolation=cv2.INTER_LINEAR)
+        if result.ndim == 2:
+            result = cv2.cvtColor(result, cv2.COLOR_GRAY2BGR)
+        return result, styled
+
+    def propagate(prev_frame, prev_result, frame):
+        """(result, styled) for a frame warped from the previous output"""
+        start = time.perf_counter()
+        warped, occluded = propagator.warp(prev_frame, prev_result, frame)
+        fraction = cv2.countNonZero(occluded) / occluded.size
+        if fraction > KEYFRAME_REFRESH_FRACTION:
+            counts['keyframes'] += 1
+            return render(frame)
+        counts['propagated'] += 1
+        styled = True
+        if fraction > MIN_REFRESH_FRACTION:
+            # Re-render only what the previous frame can't explain
+            counts['refreshed'] += 1
+
+            def render_region(crop):
+                nonlocal styled
+                result = render_image(crop)
+                if result is None:
+                    styled = False
+                    return crop
+                return result
+
+            warped = stylize_regions(frame, regions_from_mask(occluded, padding=0.1), render_region, base=warped)
+        observe_stage("video_propagate", time.perf_counter() - start, effect_type, frame)
+        return warped, styled
+
+    writer = open_writer(output_path, info['fps'], size)
+    written = 0
+    previous = None
+    start = time.perf_counter()
+    try:
+        # The whole clip occupies one processing slot, like "Preview All Styles"
+        with time_stage("video", effect_type), processor.runtime_config.processing_slot(), \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            # (frame, future) for keyframes rendering ahead, (frame, None) for propagated frames
+            pending = deque()
+
+            def write_next():
+                nonlocal written, previous
+                frame, future = pending.popleft()
+                if future is not None:
+                    result, styled = future.result()
+                elif previous is None:
+                    # Nothing stylized to warp from: render this frame fully
+                    counts['keyframes'] += 1
+                    result, styled = render(frame)
+                else:
+                    result, styled = propagate(previous[0], previous[1], frame)
+                writer.write(result)
+                # Unstyled frames are never carried forward along the flow
+                previous = (frame, result) if styled else None
+                written += 1
+                if progress:
+                    progress(written, total)
+
+            for index, frame in enumerate(read_frames(input_path, max_frames)):
+                checkpoint()
+                if index % keyframe_interval == 0:
+                    counts['keyframes'] += 1
+                    pending.append((frame, submit_in_context(pool, render, frame)))
+                else:
+                    pending.append((frame, None))
+                # Write in input order; wait for the oldest frame once the window is full
+                if len(pending) >= max_in_flight:
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        writer.release()
+
+    seconds = time.perf_counter() - start
+    failed = f", {counts['failed_frames']} failed" if counts['failed_frames'] else ""
+    print(f"✅ Video rendered with {effect_type}: {written} frames{failed} in {seconds:.1f}s -> {output_path}")
+    return {'frames': written, 'fps': info['fps'], 'width': size[0], 'height': size[1],
+            'seconds': round(seconds, 2), **counts}